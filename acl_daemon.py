@@ -0,0 +1,324 @@
+from typing import Any, Dict, List
+import os
+import sys
+import hmac
+import json
+import secrets
+import time
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+from rich.theme import Theme
+
+from nornir_orion import orion_inv
+import update_mgmt_acl
+from update_mgmt_acl import InputValidate, build_nornir_task, load_acl, run_acl
+from inventory_index import InventoryIndex
+
+
+# ----------------------------------------------------------------------------
+# User defined Variables
+# ----------------------------------------------------------------------------
+# LISTEN: Address and port of the local HTTP API, keep it on localhost as jobs are run with the device credentials. All
+# requests (except /health) need the token in an X-Auth-Token header, it is the ACL_DAEMON_TOKEN environment variable or
+# generated at startup and written to token_file (only readable by the user running the daemon)
+listen = dict(
+    address="127.0.0.1",
+    port=8180,
+    token_file=os.path.join(update_mgmt_acl.directory, ".acl_daemon_token"),
+)
+# POOL: Idle netmiko sessions are closed after idle_timeout secs, above max_sessions the least recently used are closed
+pool = dict(idle_timeout=300, max_sessions=1000, reap_interval=30)
+# MAX_JOBS: Number of finished jobs (and their results) kept for GET /jobs, older ones are removed as new jobs finish
+max_jobs = 100
+
+
+# ----------------------------------------------------------------------------
+# POOL: Netmiko sessions are kept open on the hosts between jobs, dead and idle sessions are closed
+# ----------------------------------------------------------------------------
+class ConnectionPool:
+    def __init__(
+        self,
+        nr_inv: "Nornir",
+        idle_timeout: int = 300,
+        max_sessions: int = 1000,
+        reap_interval: int = 30,
+    ) -> None:
+        self.nr_inv = nr_inv
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.reap_interval = reap_interval
+        self.last_used: Dict[str, float] = {}
+
+    def _close(self, host_name: str) -> None:
+        host = self.nr_inv.inventory.hosts[host_name]
+        try:
+            host.close_connection("netmiko")
+        # Already dropped by the device, is still removed from the host
+        except Exception:
+            host.connections.pop("netmiko", None)
+        self.last_used.pop(host_name, None)
+
+    # PREPARE: Closes sessions the device (or an idle timer in between) has dropped so the job opens new ones
+    def prepare(self, nr_inv: "Nornir") -> None:
+        for host_name, host in nr_inv.inventory.hosts.items():
+            conn = host.connections.get("netmiko")
+            if conn == None:
+                continue
+            try:
+                alive = conn.connection.is_alive()
+            except Exception:
+                alive = False
+            if alive == False:
+                self._close(host_name)
+
+    # RELEASE: Records when hosts sessions were last used and closes the least recently used above max_sessions
+    def release(self, nr_inv: "Nornir") -> None:
+        now = time.monotonic()
+        for host_name, host in nr_inv.inventory.hosts.items():
+            if "netmiko" in host.connections:
+                self.last_used[host_name] = now
+        for host_name in sorted(self.last_used, key=self.last_used.get)[
+            : max(0, len(self.last_used) - self.max_sessions)
+        ]:
+            self._close(host_name)
+
+    # REAP: Closes sessions not used by a job for idle_timeout secs
+    def reap(self) -> List[str]:
+        now = time.monotonic()
+        idle = [x for x, y in self.last_used.items() if now - y > self.idle_timeout]
+        for host_name in idle:
+            self._close(host_name)
+        return idle
+
+    def stats(self) -> Dict[str, int]:
+        return dict(
+            hosts=len(self.nr_inv.inventory.hosts), sessions=len(self.last_used)
+        )
+
+
+# ----------------------------------------------------------------------------
+# DAEMON: Inventory, rendered templates and sessions stay loaded, jobs are run one at a time as they share them
+# ----------------------------------------------------------------------------
+class AclDaemon:
+    def __init__(
+        self,
+        nr_inv: "Nornir",
+        orion: Any,
+        pool_cfg: Dict[str, int],
+        max_jobs: int = 100,
+    ) -> None:
+        my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+        self.rc = Console(theme=Theme(my_theme))
+        self.nr_inv = nr_inv
+        self.orion = orion
+        self.input_val = InputValidate(update_mgmt_acl.directory)
+        self.nr_task = build_nornir_task()
+        self.pool = ConnectionPool(nr_inv, **pool_cfg)
+        # Built once, each jobs runtime flags narrow the inventory by index before Orion filters it
+        self.index = InventoryIndex(nr_inv)
+        # Jobs share the inventory group_vars and sessions so only one runs at a time (run_lock)
+        self.run_lock = threading.Lock()
+        self.jobs_lock = threading.Lock()
+        self.jobs: Dict[int, Dict[str, Any]] = {}
+        # Only the last max_jobs finished jobs are kept so job IDs are counted rather than the number of jobs
+        self.max_jobs = max_jobs
+        self.last_id = 0
+        self.queue: "queue.Queue[int]" = queue.Queue()
+
+    # ----------------------------------------------------------------------------
+    # JOB: Same runtime flags as update_mgmt_acl.py, without -a is an audit (dry_run)
+    # ----------------------------------------------------------------------------
+    def submit(self, job_args: List[str]) -> Dict[str, Any]:
+        args = vars(self.input_val.add_arg_parser(self.orion).parse_args(job_args))
+        if args.get("filename") == None:
+            raise ValueError("the -f (input file) flag is required")
+        with self.jobs_lock:
+            self.last_id += 1
+            job_id = self.last_id
+            self.jobs[job_id] = dict(
+                id=job_id,
+                args=job_args,
+                type="audit" if args.get("apply") == True else "change",
+                status="queued",
+                submitted=time.time(),
+            )
+        self.queue.put(job_id)
+        return self.jobs[job_id]
+
+    def run_job(self, job_id: int) -> None:
+        job = self.jobs[job_id]
+        job.update(status="running", started=time.time())
+        args = vars(self.input_val.add_arg_parser(self.orion).parse_args(job["args"]))
+        with self.run_lock:
+            try:
+                acl = load_acl(self.input_val, args)
+                nr_inv = self.orion.filter_inventory(args, self.index.narrow(args))
+                self.pool.prepare(nr_inv)
+                try:
+                    rollout = run_acl(nr_inv, self.nr_task, acl, args)
+                finally:
+                    self.pool.release(nr_inv)
+                job.update(
+                    status="done",
+                    rollout=rollout,
+                    summary=dict(self.nr_task.summary),
+                )
+            # The script methods exit on input or inventory errors, is a failed job rather than stopping the daemon
+            except SystemExit:
+                job.update(status="failed", error="job exited, see daemon output")
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+        job["finished"] = time.time()
+        self.expire_jobs()
+
+    # EXPIRE: Oldest finished jobs above max_jobs are removed, queued and running jobs are always kept
+    def expire_jobs(self) -> None:
+        with self.jobs_lock:
+            finished = [x for x, y in self.jobs.items() if "finished" in y]
+            for job_id in finished[: max(0, len(finished) - self.max_jobs)]:
+                del self.jobs[job_id]
+
+    # WORKER: Runs queued jobs in order
+    def worker(self) -> None:
+        while True:
+            self.run_job(self.queue.get())
+
+    # REAPER: Idle sessions are only closed between jobs (holds the job lock)
+    def reaper(self) -> None:
+        while True:
+            time.sleep(self.pool.reap_interval)
+            with self.run_lock:
+                idle = self.pool.reap()
+            if len(idle) != 0:
+                self.rc.print(
+                    f"[dark_blue]Closed {len(idle)} idle sessions[/dark_blue]"
+                )
+
+    def start(self) -> None:
+        threading.Thread(target=self.worker, daemon=True).start()
+        threading.Thread(target=self.reaper, daemon=True).start()
+
+
+# ----------------------------------------------------------------------------
+# API: POST /jobs {"args": [...]}, GET /jobs, GET /jobs/<id> and GET /health
+# ----------------------------------------------------------------------------
+# TOKEN: Shared token of the API, a generated token is written to token_file with 0600 permissions
+def api_token(token_file: str) -> str:
+    token = os.environ.get("ACL_DAEMON_TOKEN")
+    if token:
+        return token
+    token = secrets.token_urlsafe(32)
+    fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # An existing file keeps its mode when opened
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "w") as file_content:
+        file_content.write(token)
+    return token
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    daemon: AclDaemon = None
+    token: str = None
+
+    # AUTH: Custom header (and JSON body) means a browser cant send a job cross-site without a CORS preflight
+    def _authorised(self) -> bool:
+        sent = self.headers.get("X-Auth-Token", "")
+        if self.token == None:
+            return False
+        return hmac.compare_digest(sent.encode(), self.token.encode())
+
+    def _send(self, code: int, body: Any) -> None:
+        data = json.dumps(body, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send(200, self.daemon.pool.stats())
+        elif not self._authorised():
+            self._send(401, dict(error="missing or invalid X-Auth-Token"))
+        elif path == "/jobs":
+            self._send(200, list(self.daemon.jobs.values()))
+        elif path.startswith("/jobs/") and path[6:].isdigit():
+            job = self.daemon.jobs.get(int(path[6:]))
+            self._send(200 if job else 404, job or dict(error="job not found"))
+        else:
+            self._send(404, dict(error="not found"))
+
+    def do_POST(self) -> None:
+        if not self._authorised():
+            return self._send(401, dict(error="missing or invalid X-Auth-Token"))
+        elif self.path.rstrip("/") != "/jobs":
+            return self._send(404, dict(error="not found"))
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type != "application/json":
+            return self._send(415, dict(error="Content-Type must be application/json"))
+        try:
+            body = json.loads(
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            )
+            if not isinstance(body.get("args"), list):
+                raise ValueError("'args' must be a list of runtime flags")
+            self._send(202, self.daemon.submit([str(x) for x in body["args"]]))
+        # argparse exits on invalid flags
+        except SystemExit:
+            self._send(400, dict(error=f"invalid runtime flags {body['args']}"))
+        except (ValueError, AttributeError) as e:
+            self._send(400, dict(error=str(e)))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        self.daemon.rc.print(
+            f"[dark_blue]API:[/dark_blue] {format % args}", highlight=False
+        )
+
+
+# ----------------------------------------------------------------------------
+# ENGINE: Loads the inventory and credentials once then serves jobs
+# ----------------------------------------------------------------------------
+def main(inv_settings: str, no_orion: bool = update_mgmt_acl.no_orion):
+    orion = orion_inv.OrionInventory()
+    inv_validate = orion_inv.LoadValInventorySettings()
+
+    # 1. Only the inventory (credentials) flags are used at startup, job flags are sent with each job
+    tmp_args = InputValidate(update_mgmt_acl.directory).add_arg_parser(orion)
+    args = vars(tmp_args.parse_args())
+    inv_settings = inv_validate.load_inv_settings(args, inv_settings)
+
+    # 2. Loads the full inventory (each job filters it) and adds the device credentials
+    if no_orion == False:
+        orion.test_npm_creds(inv_settings["npm"])
+        nr_inv = orion.load_inventory(inv_settings["npm"], inv_settings["groups"])
+    elif no_orion == True:
+        nr_inv = orion.load_static_inventory(
+            "inventory/hosts.yml", "inventory/groups.yml"
+        )
+    nr_inv = orion.inventory_defaults(nr_inv, inv_settings["device"])
+
+    # 3. Runs the job worker and idle session reaper and serves the API
+    acl_daemon = AclDaemon(nr_inv, orion, pool, max_jobs)
+    acl_daemon.start()
+    ApiHandler.daemon = acl_daemon
+    ApiHandler.token = api_token(listen["token_file"])
+    token_from = os.environ.get("ACL_DAEMON_TOKEN") and "ACL_DAEMON_TOKEN"
+    server = ThreadingHTTPServer((listen["address"], listen["port"]), ApiHandler)
+    acl_daemon.rc.print(
+        f"[dark_blue][b]Listening on http://{listen['address']}:{listen['port']}[/b] "
+        f"({len(nr_inv.inventory.hosts)} hosts, API token from {token_from or listen['token_file']})[/dark_blue]"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        nr_inv.close_connections()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main("inv_settings.yml")
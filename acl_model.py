@@ -0,0 +1,274 @@
+from typing import Any, Dict, List
+import ipaddress
+
+# Netmask and wildcard (hostmask) of each prefix length, saves building IPv4Interface objects for every ACE
+NETMASK = [str(ipaddress.IPv4Network(f"0.0.0.0/{x}").netmask) for x in range(33)]
+HOSTMASK = [str(ipaddress.IPv4Network(f"0.0.0.0/{x}").hostmask) for x in range(33)]
+
+
+# NUM: ASCII digits only (isdigit alone allows unicode digits)
+def _is_num(value: str, max_len: int) -> bool:
+    return value.isascii() and value.isdigit() and len(value) <= max_len
+
+
+# ----------------------------------------------------------------------------
+# ACE: Parsed once, address and prefix length are stored as integers (any and remarks keep the string value)
+# ----------------------------------------------------------------------------
+class Ace:
+    __slots__ = ("action", "network", "prefixlen", "value")
+
+    def __init__(self, action: str, value: str) -> None:
+        self.action = action
+        self.network, self.prefixlen, self.value = (None, None, str(value))
+        if action != "remark" and self.value != "any":
+            self._parse(self.value)
+
+    # PARSE: Fast path for x.x.x.x or x.x.x.x/x, anything else (such as x.x.x.x/mask) uses ipaddress
+    def _parse(self, value: str) -> None:
+        ip, _, prefixlen = value.partition("/")
+        octets = ip.split(".")
+        prefixlen = prefixlen or "32"
+        if (
+            len(octets) == 4
+            and all(_is_num(x, 3) and int(x) <= 255 for x in octets)
+            and _is_num(prefixlen, 2)
+            and int(prefixlen) <= 32
+        ):
+            self.network = (
+                (int(octets[0]) << 24)
+                | (int(octets[1]) << 16)
+                | (int(octets[2]) << 8)
+                | int(octets[3])
+            )
+            self.prefixlen = int(prefixlen)
+        else:
+            try:
+                interface = ipaddress.IPv4Interface(value)
+                self.network = int(interface.ip)
+                self.prefixlen = interface.network.prefixlen
+            # Not a valid address (validate_file will have already reported it) so is kept as is
+            except ValueError:
+                pass
+
+    # SUPERNETS: Keys (network bits, prefix length) of all networks containing this ACE, any is (0, 0)
+    def supernets(self) -> List[tuple]:
+        if self.value == "any":
+            return [(0, 0)]
+        return [
+            (self.network >> (32 - x) if x else 0, x) for x in range(self.prefixlen + 1)
+        ]
+
+    def network_obj(self) -> ipaddress.IPv4Network:
+        if self.value == "any":
+            return ipaddress.IPv4Network("0.0.0.0/0")
+        return ipaddress.IPv4Network((self.network, self.prefixlen), strict=False)
+
+    # ----------------------------------------------------------------------------
+    # VIEWS: Address formats used by the different platforms templates
+    # ----------------------------------------------------------------------------
+    def ip(self) -> str:
+        net = self.network
+        return f"{net >> 24}.{(net >> 16) & 255}.{(net >> 8) & 255}.{net & 255}"
+
+    # PREFIX: x.x.x.x/x (NXOS)
+    def prefix(self) -> str:
+        if self.network == None:
+            return self.value
+        return f"{self.ip()}/{self.prefixlen}"
+
+    # MASK: x.x.x.x with subnet mask (ASA)
+    def mask(self) -> str:
+        if self.network == None:
+            return self.value
+        return f"{self.ip()} {NETMASK[self.prefixlen]}"
+
+    # WCARD: x.x.x.x with wildcard mask or host x.x.x.x (IOS/IOS-XE)
+    def wcard(self) -> str:
+        if self.network == None:
+            return self.value
+        elif self.prefixlen == 32:
+            return f"host {self.ip()}"
+        return f"{self.ip()} {HOSTMASK[self.prefixlen]}"
+
+
+# ----------------------------------------------------------------------------
+# MODEL: ACL names and parsed ACEs, the wcard, mask and prefix ACL_VARs are only created when first used
+# ----------------------------------------------------------------------------
+class AclModel(dict):
+    views = ["wcard", "mask", "prefix"]
+
+    def __init__(self, acl_vars: Dict[str, Any]) -> None:
+        super().__init__()
+        self.acls: List[tuple] = []
+        for each_acl in acl_vars["acl"]:
+            aces = []
+            for each_ace in each_acl["ace"]:
+                action, value = next(iter(each_ace.items()))
+                aces.append(Ace(action, value))
+            self.acls.append((each_acl["name"], aces))
+        self["name"] = [x[0] for x in self.acls]
+        # Per site (Infra_Location) and per host ACLs whose ACEs are prepended to the ACL of the same name
+        self.overlays: Dict[str, Dict[str, List]] = dict(site={}, host={})
+        self.overlays.update(acl_vars.get("overlay") or {})
+        self.effective_cache: Dict[tuple, "AclModel"] = {}
+
+    # VIEW: Builds the ACL_VARs in the format used by the template (list of ACLs with ACE dicts)
+    def view(self, view: str) -> Dict[str, List]:
+        acl_vars: Dict[str, List] = dict(acl=[])
+        for acl_name, aces in self.acls:
+            acl_vars["acl"].append(
+                dict(
+                    name=acl_name,
+                    ace=[{x.action: getattr(x, view)()} for x in aces],
+                )
+            )
+        return acl_vars
+
+    # LAZY: Only platforms in the inventory ask for their view, once created it is kept
+    def __missing__(self, key: str) -> Dict[str, List]:
+        if key not in self.views:
+            raise KeyError(key)
+        self[key] = self.view(key)
+        return self[key]
+
+    # ----------------------------------------------------------------------------
+    # OVERLAY: Hosts effective ACLs are the site then host overlay ACEs followed by the base ACEs
+    # ----------------------------------------------------------------------------
+    # KEY: Site and host (None if they have no overlay) so hosts with the same overlays share an effective model
+    def overlay_key(self, site: str, host: str) -> tuple:
+        return (
+            site if site in self.overlays["site"] else None,
+            host if host in self.overlays["host"] else None,
+        )
+
+    # EFFECTIVE: Model (created once per key) of the base ACLs with any overlay ACEs prepended, no overlays is the base
+    def effective(self, site: str, host: str) -> "AclModel":
+        key = self.overlay_key(site, host)
+        if key == (None, None):
+            return self
+        if key not in self.effective_cache:
+            extra: Dict[str, List[Ace]] = {}
+            overlay_acls = self.overlays["site"].get(key[0], []) + self.overlays[
+                "host"
+            ].get(key[1], [])
+            for acl_name, aces in AclModel(dict(acl=overlay_acls)).acls:
+                extra.setdefault(acl_name, []).extend(aces)
+            model = AclModel(dict(acl=[]))
+            model.acls = [(x, extra.get(x, []) + y) for x, y in self.acls]
+            model["name"] = self["name"]
+            self.effective_cache[key] = model
+        return self.effective_cache[key]
+
+    # EQ: Compares as if all views had been created
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, dict):
+            for each_view in self.views:
+                self[each_view]
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other: Any) -> bool:
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    # ----------------------------------------------------------------------------
+    # OPTIMISE: Removes ACEs that can never match or make no difference and merges adjacent prefixes
+    # ----------------------------------------------------------------------------
+    # SHADOWED: An ACE covered by an earlier ACE (any action) never matches
+    def _shadowed(self, aces: List[Ace], msg: List[str]) -> List[Ace]:
+        seen: Dict[tuple, Ace] = {}
+        kept = []
+        for each_ace in aces:
+            if each_ace.action != "remark":
+                cover = next((seen[x] for x in each_ace.supernets() if x in seen), None)
+                if cover != None:
+                    msg.append(
+                        f"{each_ace.action} {each_ace.prefix()} (shadowed by {cover.action} {cover.prefix()})"
+                    )
+                    continue
+                seen[each_ace.supernets()[-1]] = each_ace
+            kept.append(each_ace)
+        return kept
+
+    # REDUNDANT: If the next ACE that overlaps this ACE covers it and has the same action the ACE makes no difference
+    def _redundant(self, aces: List[Ace], msg: List[str]) -> List[Ace]:
+        # Nearest later ACE with this exact prefix and nearest later ACE inside this prefix (smaller)
+        nearest_cover: Dict[tuple, int] = {}
+        nearest_inside: Dict[tuple, int] = {}
+        kept = []
+        for idx in range(len(aces) - 1, -1, -1):
+            each_ace = aces[idx]
+            if each_ace.action != "remark":
+                supernets = each_ace.supernets()
+                covers = [nearest_cover[x] for x in supernets if x in nearest_cover]
+                cover = min(covers) if covers else None
+                inside = nearest_inside.get(supernets[-1])
+                if (
+                    cover != None
+                    and aces[cover].action == each_ace.action
+                    and (inside == None or inside > cover)
+                ):
+                    msg.append(
+                        f"{each_ace.action} {each_ace.prefix()} (redundant as followed by {aces[cover].action} "
+                        f"{aces[cover].prefix()})"
+                    )
+                    continue
+                nearest_cover[supernets[-1]] = idx
+                for each_supernet in supernets[:-1]:
+                    nearest_inside[each_supernet] = idx
+            kept.append(each_ace)
+        return kept[::-1]
+
+    # AGGREGATE: Runs of ACEs (no remarks between) with the same action can be reordered so adjacent prefixes merged
+    def _aggregate(self, aces: List[Ace], msg: List[str]) -> List[Ace]:
+        kept, run = ([], [])
+        for each_ace in aces + [Ace("remark", "")]:
+            if len(run) != 0 and (
+                each_ace.action == "remark" or each_ace.action != run[0].action
+            ):
+                networks = list(
+                    ipaddress.collapse_addresses(x.network_obj() for x in run)
+                )
+                if len(networks) < len(run):
+                    merged = [
+                        Ace(run[0].action, "any" if x.prefixlen == 0 else str(x))
+                        for x in networks
+                    ]
+                    msg.append(
+                        f"{run[0].action} {', '.join(x.prefix() for x in run)} (merged into "
+                        f"{', '.join(x.prefix() for x in merged)})"
+                    )
+                    run = merged
+                kept.extend(run)
+                run = []
+            if each_ace.action == "remark":
+                kept.append(each_ace)
+            else:
+                run.append(each_ace)
+        return kept[:-1]
+
+    # ENGINE: Repeats until nothing changes (merging can make other ACEs redundant), returns what was removed
+    def optimise(self) -> Dict[str, List[str]]:
+        removed: Dict[str, List[str]] = {}
+        for idx, (acl_name, aces) in enumerate(self.acls):
+            msg: List[str] = []
+            # Invalid addresses cant be compared so the ACL is left as is
+            if any(
+                x.action != "remark" and x.network == None and x.value != "any"
+                for x in aces
+            ):
+                continue
+            while True:
+                num_msg = len(msg)
+                aces = self._shadowed(aces, msg)
+                aces = self._redundant(aces, msg)
+                aces = self._aggregate(aces, msg)
+                if len(msg) == num_msg:
+                    break
+            self.acls[idx] = (acl_name, aces)
+            removed[acl_name] = msg
+        # Any views (and effective overlay models) already created are out of date
+        for each_view in self.views:
+            self.pop(each_view, None)
+        self.effective_cache.clear()
+        return removed
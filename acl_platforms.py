@@ -0,0 +1,66 @@
+# PLATFORMS: Inventory groups of each platform (os_type), the ACL_VAR view its template uses and its cmds. The marker
+# cmd output only changes when the device config changes (last config change time or config checksum), on IOS and NXOS
+# it is a scan of the running config so the change cache that uses it is opt-in.
+# The checkpoint cmds save the running config on-box before a change so a rollback is the one rollback cmd. The push_file
+# strategy copies the config to file_system as dest_file and merges it into the running config with copy_cmd. The session
+# cmds turn off paging of the asyncio runner sessions (netmiko does this itself)
+PLATFORMS = {
+    "ios/iosxe": dict(
+        groups=["ios", "iosxe"],
+        view="wcard",
+        marker_cmd="show run | in ^! Last configuration change",
+        show_cmd="show run | sec access-list extended {}_",
+        batch_show_cmd="show run | sec ip access-list extended",
+        del_cmd="no ip access-list extended {}",
+        session_cmds=["terminal length 0", "terminal width 511"],
+        checkpoint_cmd=["copy running-config flash:mgmt_acl_rollback.cfg"],
+        rollback_cmd="configure replace flash:mgmt_acl_rollback.cfg force",
+        push_file=dict(
+            file_system="flash:",
+            dest_file="mgmt_acl_push.cfg",
+            copy_cmd="copy flash:/mgmt_acl_push.cfg running-config",
+        ),
+    ),
+    "nxos": dict(
+        groups=["nxos"],
+        view="prefix",
+        marker_cmd="show run | in 'Running configuration last done'",
+        show_cmd="show run | sec 'ip access-list {}'",
+        batch_show_cmd="show run | sec 'ip access-list'",
+        del_cmd="no ip access-list {}",
+        session_cmds=["terminal length 0", "terminal width 511"],
+        checkpoint_cmd=[
+            "no checkpoint mgmt_acl_rollback",
+            "checkpoint mgmt_acl_rollback",
+        ],
+        rollback_cmd="rollback running-config checkpoint mgmt_acl_rollback",
+        push_file=dict(
+            file_system="bootflash:",
+            dest_file="mgmt_acl_push.cfg",
+            copy_cmd="copy bootflash:/mgmt_acl_push.cfg running-config",
+        ),
+    ),
+    # ASA ACLs are the ssh and http cmds (not per ACL), del cmds are created from the backup and rollback is line by line
+    "asa": dict(
+        groups=["asa"],
+        view="mask",
+        marker_cmd="show checksum",
+        show_cmd=["show run ssh", "show run http"],
+        batch_show_cmd=None,
+        del_cmd=None,
+        session_cmds=["terminal pager 0"],
+        checkpoint_cmd=None,
+        rollback_cmd=None,
+        push_file=dict(
+            file_system="disk0:",
+            dest_file="mgmt_acl_push.cfg",
+            copy_cmd="copy /noconfirm disk0:/mgmt_acl_push.cfg running-config",
+        ),
+    ),
+}
+# Platform (os_type) of each inventory group
+GROUP_PLATFORM = {
+    each_grp: os_type
+    for os_type, platform in PLATFORMS.items()
+    for each_grp in platform["groups"]
+}
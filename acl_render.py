@@ -0,0 +1,71 @@
+from typing import Any, Dict
+import os
+import json
+import hashlib
+import threading
+
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    StrictUndefined,
+)
+
+
+# ----------------------------------------------------------------------------
+# RENDER: Template compiled once (same jinja settings as nornir-jinja2) with rendered config memoised across runs
+# ----------------------------------------------------------------------------
+class AclRender:
+    def __init__(
+        self,
+        path: str = "templates/",
+        template: str = "cfg_acl_tmpl.j2",
+        cache_dir: str = None,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.memo: Dict[str, str] = {}
+        bytecode_cache = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(path),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            bytecode_cache=bytecode_cache,
+        )
+        self.template = self.env.get_template(template)
+        # A changed template (source) must not use config rendered by the old one
+        source = self.env.loader.get_source(self.env, template)[0]
+        self.tmpl_hash = hashlib.sha256(source.encode()).hexdigest()
+
+    # KEY: Hash of the template, platform and ACL_VARs the config was rendered from
+    def _key(self, os_type: str, acl_vars: Dict[str, Any]) -> str:
+        state = json.dumps([self.tmpl_hash, os_type, acl_vars], sort_keys=True)
+        return hashlib.sha256(state.encode()).hexdigest()
+
+    # ----------------------------------------------------------------------------
+    # ENGINE: Uses the memoised config (in memory or on disk), otherwise renders and saves it
+    # ----------------------------------------------------------------------------
+    def render(self, os_type: str, acl_vars: Dict[str, Any]) -> str:
+        key = self._key(os_type, acl_vars)
+        with self.lock:
+            if key in self.memo:
+                return self.memo[key]
+        cache_file = (
+            os.path.join(self.cache_dir, key + ".cfg") if self.cache_dir else None
+        )
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, "r") as file_content:
+                config = file_content.read()
+        else:
+            config = self.template.render(os_type=os_type, acl_vars=acl_vars)
+            # Temp file first so an interrupted run doesnt leave half a config
+            if cache_file:
+                with open(cache_file + ".tmp", "w") as file_content:
+                    file_content.write(config)
+                os.replace(cache_file + ".tmp", cache_file)
+        with self.lock:
+            self.memo[key] = config
+        return config
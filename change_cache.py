@@ -0,0 +1,52 @@
+from typing import Dict, List
+import os
+import json
+import hashlib
+import threading
+
+
+# ----------------------------------------------------------------------------
+# CACHE: On-disk record of hosts that were in-sync, keyed by the device change marker and rendered config
+# ----------------------------------------------------------------------------
+class ChangeCache:
+    def __init__(self, cache_file: str) -> None:
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.cache: Dict[str, str] = {}
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r") as file_content:
+                    self.cache = json.load(file_content)
+            # A corrupt cache just means all hosts are checked again
+            except ValueError:
+                self.cache = {}
+
+    # HASH: Combines the change marker (last config change time or checksum) and the rendered ACLs
+    def _hash(self, marker: str, config: List[str]) -> str:
+        marker = "\n".join(each_line.strip() for each_line in marker.splitlines())
+        state = marker.strip() + "\n\n" + "\n\n".join(config)
+        return hashlib.sha256(state.encode()).hexdigest()
+
+    # IN_SYNC: True if the host was in-sync last time and neither its config or the rendered ACLs have changed
+    def in_sync(self, host: str, marker: str, config: List[str]) -> bool:
+        # No marker means cant tell if device config has changed
+        if len(marker.strip()) == 0:
+            return False
+        with self.lock:
+            return self.cache.get(host) == self._hash(marker, config)
+
+    # UPDATE: Records a host as in-sync, or removes it if it is not
+    def update(self, host: str, marker: str, config: List[str], in_sync: bool) -> None:
+        with self.lock:
+            if in_sync == True and len(marker.strip()) != 0:
+                self.cache[host] = self._hash(marker, config)
+            else:
+                self.cache.pop(host, None)
+
+    # SAVE: Writes to a temp file first so an interrupted save doesnt corrupt the cache
+    def save(self) -> None:
+        with self.lock:
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w") as file_content:
+                json.dump(self.cache, file_content, indent=2, sort_keys=True)
+            os.replace(tmp_file, self.cache_file)
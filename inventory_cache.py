@@ -0,0 +1,219 @@
+from typing import Any, Dict, List
+import os
+import json
+import time
+import hashlib
+import concurrent.futures
+
+import yaml
+from rich.console import Console
+from rich.theme import Theme
+
+# Credentials are never written to the cache, they are added to the defaults at runtime
+SECRET_KEYS = ["username", "password", "secret"]
+# Node columns (as well as the NPM select) that make up a nodes checksum, IPAddress is the hosts hostname
+NODE_COLUMNS = [
+    "Nodes.IPAddress",
+    "Nodes.Caption",
+    "Nodes.SysName",
+    "Nodes.MachineType",
+]
+# More changed nodes than this (size of the NodeID IN clause) are a full NPM load rather than merged into the cache
+MAX_CHANGED_NODES = 500
+
+
+# ----------------------------------------------------------------------------
+# CACHE: Orion inventory saved as SimpleInventory files, used whilst within the TTL or the NPM nodes are unchanged
+# ----------------------------------------------------------------------------
+class InventoryCache:
+    def __init__(self, cache_dir: str, ttl: int = 3600, npm_timeout: int = 10) -> None:
+        my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+        self.rc = Console(theme=Theme(my_theme))
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.npm_timeout = npm_timeout
+        self.host_file = os.path.join(cache_dir, "hosts.yml")
+        self.group_file = os.path.join(cache_dir, "groups.yml")
+        self.meta_file = os.path.join(cache_dir, "meta.json")
+
+    # SETTINGS: A change to the NPM query or group filters means the cached inventory is no longer valid
+    def _settings_hash(self, npm: Dict[str, Any], groups: List[Dict[str, Any]]) -> str:
+        state = json.dumps(
+            [npm.get("server"), npm.get("select"), npm.get("where"), groups],
+            sort_keys=True,
+        )
+        return hashlib.sha256(state.encode()).hexdigest()
+
+    def _load_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_file, "r") as file_content:
+                return json.load(file_content)
+        # No cache yet or a corrupt one just means the inventory is loaded from NPM
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, meta: Dict[str, Any]) -> None:
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, "w") as file_content:
+            json.dump(meta, file_content, indent=2)
+        os.replace(tmp_file, self.meta_file)
+
+    # ----------------------------------------------------------------------------
+    # DELTA: Query of only the columns the inventory is built from, each NodeID with its IP and a checksum of the columns
+    # ----------------------------------------------------------------------------
+    def delta_check(self, npm: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        from orionsdk import SwisClient
+
+        swis = SwisClient(
+            npm["server"], npm["user"], npm.get("pword"), verify=npm.get("ssl_verify")
+        )
+        columns = ", ".join(["Nodes.NodeID"] + NODE_COLUMNS + npm.get("select", []))
+        query = f"SELECT {columns} FROM Orion.Nodes AS Nodes WHERE {npm['where']}"
+        nodes = {}
+        for row in swis.query(query)["results"]:
+            node_id = str(row.pop("NodeID"))
+            state = json.dumps(row, sort_keys=True, default=str)
+            nodes[node_id] = dict(
+                ip=row.get("IPAddress"),
+                checksum=hashlib.sha256(state.encode()).hexdigest(),
+            )
+        return nodes
+
+    # TIMEOUT: A slow or unreachable NPM is treated the same as a failed query
+    def _delta_timeout(self, npm: Dict[str, Any]) -> Dict[str, Any]:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        try:
+            return executor.submit(self.delta_check, npm).result(
+                timeout=self.npm_timeout
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+    # ----------------------------------------------------------------------------
+    # SAVE: Hosts and groups in SimpleInventory format without any credentials
+    # ----------------------------------------------------------------------------
+    def _strip(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        clean = {}
+        for key, value in obj.items():
+            if key in SECRET_KEYS or key == "name" or value in [None, {}, []]:
+                continue
+            elif isinstance(value, dict) and key != "data":
+                value = self._strip(value)
+                if len(value) == 0:
+                    continue
+            clean[key] = value
+        return clean
+
+    def _write(self, inv_file: str, inventory: Dict[str, Any]) -> None:
+        with open(inv_file + ".tmp", "w") as file_content:
+            yaml.dump(
+                inventory, file_content, default_flow_style=False, sort_keys=False
+            )
+        os.replace(inv_file + ".tmp", inv_file)
+
+    def save(self, nr_inv: "Nornir", nodes: Dict[str, Any], settings: str) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for inv_file, inv_objs in [
+            (self.host_file, nr_inv.inventory.hosts),
+            (self.group_file, nr_inv.inventory.groups),
+        ]:
+            self._write(
+                inv_file, {x: self._strip(y.dict()) for x, y in inv_objs.items()}
+            )
+        self._save_meta(dict(synced=time.time(), nodes=nodes, settings=settings))
+
+    # ----------------------------------------------------------------------------
+    # MERGE: Hosts of removed or changed nodes (matched on IP) are replaced by an NPM load of only the changed NodeIDs
+    # ----------------------------------------------------------------------------
+    def merge(
+        self,
+        orion: Any,
+        npm: Dict[str, Any],
+        groups: List[Dict[str, Any]],
+        nodes: Dict[str, Any],
+        cached_nodes: Dict[str, Any],
+    ) -> bool:
+        changed = [x for x, y in nodes.items() if cached_nodes.get(x) != y]
+        removed = [x for x in cached_nodes if x not in nodes]
+        old_ips = [y["ip"] for x, y in cached_nodes.items() if x in changed + removed]
+        all_ips = [x["ip"] for x in cached_nodes.values()]
+        # IPs shared by nodes cant be matched to a single host so are a full load, as are too many changes
+        if len(changed) > MAX_CHANGED_NODES or any(
+            all_ips.count(x) > 1 for x in old_ips
+        ):
+            return False
+        with open(self.host_file, "r") as file_content:
+            hosts = yaml.safe_load(file_content) or {}
+        with open(self.group_file, "r") as file_content:
+            inv_groups = yaml.safe_load(file_content) or {}
+        new_hosts = {}
+        if len(changed) != 0:
+            orion.test_npm_creds(npm)
+            node_ids = ", ".join(changed)
+            where = f"({npm['where']}) AND Nodes.NodeID IN ({node_ids})"
+            nr_inv = orion.load_inventory(dict(npm, where=where), groups)
+            new_hosts = {
+                x: self._strip(y.dict()) for x, y in nr_inv.inventory.hosts.items()
+            }
+            for grp_name, grp in nr_inv.inventory.groups.items():
+                inv_groups.setdefault(grp_name, self._strip(grp.dict()))
+        # Changed hosts keep their place so the inventory order (waves and output) is the same as a full load
+        merged = {}
+        for host_name, host in hosts.items():
+            if host.get("hostname") not in old_ips:
+                merged[host_name] = host
+            elif host_name in new_hosts:
+                merged[host_name] = new_hosts.pop(host_name)
+        hosts = dict(merged, **new_hosts)
+        self._write(self.host_file, hosts)
+        self._write(self.group_file, inv_groups)
+        self._save_meta(dict(self._load_meta(), synced=time.time(), nodes=nodes))
+        self.rc.print(
+            f"[dark_blue]Updated cached Orion inventory ({len(changed)} changed and "
+            f"{len(removed)} removed NPM nodes)[/dark_blue]"
+        )
+        return True
+
+    # ----------------------------------------------------------------------------
+    # ENGINE: Cache within TTL, else cache if the NPM nodes are unchanged (or NPM is slow/down), else the changed
+    # nodes are merged into the cache or if that is not possible a full NPM load
+    # ----------------------------------------------------------------------------
+    def load(
+        self, orion: Any, npm: Dict[str, Any], groups: List[Dict[str, Any]]
+    ) -> "Nornir":
+        settings = self._settings_hash(npm, groups)
+        meta = self._load_meta()
+        cached = (
+            meta.get("settings") == settings
+            and os.path.exists(self.host_file)
+            and os.path.exists(self.group_file)
+        )
+        age = time.time() - meta.get("synced", 0)
+        if cached and age < self.ttl:
+            self.rc.print(
+                f"[dark_blue]Using cached Orion inventory ({int(age)} secs old)[/dark_blue]"
+            )
+            return orion.load_static_inventory(self.host_file, self.group_file)
+        try:
+            nodes = self._delta_timeout(npm)
+        except Exception as e:
+            if cached == False:
+                raise
+            self.rc.print(
+                f":warning: [b]NpmError:[/b] Using cached Orion inventory ({int(age)} secs old) as NPM failed "
+                f"or took more than {self.npm_timeout} secs: {type(e).__name__} {e}"
+            )
+            return orion.load_static_inventory(self.host_file, self.group_file)
+        # Unchanged nodes dont restart the TTL, so each run after it checks the nodes until something changes
+        if cached and nodes == meta.get("nodes"):
+            self.rc.print(
+                "[dark_blue]Using cached Orion inventory (NPM nodes unchanged)[/dark_blue]"
+            )
+            return orion.load_static_inventory(self.host_file, self.group_file)
+        if cached and meta.get("nodes") != None:
+            if self.merge(orion, npm, groups, nodes, meta["nodes"]):
+                return orion.load_static_inventory(self.host_file, self.group_file)
+        orion.test_npm_creds(npm)
+        nr_inv = orion.load_inventory(npm, groups)
+        self.save(nr_inv, nodes, settings)
+        return nr_inv
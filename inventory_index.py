@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Set
+from collections import defaultdict
+
+from nornir.core import Nornir
+from nornir.core.inventory import Hosts, Inventory
+
+# FILTERS: Runtime flag (argparse dest) and the host attribute it filters on, hostname flags match the name or IP
+FILTERS = dict(
+    hostname="name",
+    group="groups",
+    location="Infra_Location",
+    logical="Infra_Logical_Location",
+    type="type",
+    version="IOSVersion",
+)
+# Groups a group filter also matches (-g asa includes ftd)
+GROUP_ALIASES = {"asa": ["ftd"]}
+
+
+# ----------------------------------------------------------------------------
+# INDEX: Inverted indexes (attribute value to host names) and a trigram index of host names, built once per inventory.
+# Filters only narrow to the hosts that could match, orion.filter_inventory still applies the exact filters
+# ----------------------------------------------------------------------------
+class InventoryIndex:
+    def __init__(self, nr_inv: "Nornir") -> None:
+        self.nr_inv = nr_inv
+        # Inventory order is kept so waves and output are the same as an unindexed run
+        self.order = {x: idx for idx, x in enumerate(nr_inv.inventory.hosts)}
+        self.attrs: Dict[str, Dict[str, Set[str]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        self.names: Dict[str, Set[str]] = defaultdict(set)
+        # Only built on the first hostname filter (a one-off run may not filter on hostname)
+        self.trigrams: Dict[str, Set[str]] = None
+        for host_name, host in nr_inv.inventory.hosts.items():
+            for each_name in [host_name, host.hostname]:
+                if each_name:
+                    self.names[str(each_name).lower()].add(host_name)
+            for each_grp in host.groups:
+                self.attrs["groups"][each_grp.name.lower()].add(host_name)
+            # Host data first as host.get (inherited from groups) is slow over thousands of hosts
+            data = host.data
+            for attr in FILTERS.values():
+                if attr in ["name", "groups"]:
+                    continue
+                value = data[attr] if attr in data else host.get(attr)
+                if value != None:
+                    self.attrs[attr][str(value).lower()].add(host_name)
+
+    def _trigrams(self, value: str) -> Set[str]:
+        return {value[x : x + 3] for x in range(len(value) - 2)}
+
+    # TERMS: Flag values as a list of lowercase terms (space separated values are split, any of them can match)
+    def _terms(self, value: Any) -> List[str]:
+        if isinstance(value, (list, tuple)):
+            value = " ".join(str(x) for x in value)
+        return str(value).lower().split()
+
+    # NAME: Trigram posting lists are intersected to find the names that could contain the term, then checked
+    def _lookup_name(self, terms: List[str]) -> Set[str]:
+        if self.trigrams == None:
+            self.trigrams = defaultdict(set)
+            for each_name in self.names:
+                for each_trigram in self._trigrams(each_name):
+                    self.trigrams[each_trigram].add(each_name)
+        hosts: Set[str] = set()
+        for each_term in terms:
+            if len(each_term) < 3:
+                names = self.names.keys()
+            else:
+                names = set.intersection(
+                    *[self.trigrams.get(x, set()) for x in self._trigrams(each_term)]
+                )
+            for each_name in names:
+                if each_term in each_name:
+                    hosts.update(self.names[each_name])
+        return hosts
+
+    # ATTR: Hosts with a value (distinct values, not hosts, are scanned) containing any of the terms
+    def _lookup_attr(self, attr: str, terms: List[str]) -> Set[str]:
+        if attr == "groups":
+            terms = terms + [y for x in terms for y in GROUP_ALIASES.get(x, [])]
+        hosts: Set[str] = set()
+        for value, host_names in self.attrs[attr].items():
+            if any(x in value for x in terms):
+                hosts.update(host_names)
+        return hosts
+
+    # ----------------------------------------------------------------------------
+    # ENGINE: Intersection of the hosts matched by each flag (None if no filter flags are used)
+    # ----------------------------------------------------------------------------
+    def candidates(self, args: Dict[str, Any]) -> Set[str]:
+        hosts = None
+        for flag, attr in FILTERS.items():
+            terms = self._terms(args.get(flag) or "")
+            if len(terms) == 0:
+                continue
+            elif attr == "name":
+                matched = self._lookup_name(terms)
+            else:
+                matched = self._lookup_attr(attr, terms)
+            hosts = matched if hosts == None else hosts & matched
+        return hosts
+
+    # NARROW: Same as nr_inv.filter (shares config, runner and processors) of the candidates, all hosts if no filter flags
+    def narrow(self, args: Dict[str, Any]) -> "Nornir":
+        hosts = self.candidates(args)
+        if hosts == None:
+            return self.nr_inv
+        inv = self.nr_inv.inventory
+        new_nr = Nornir(**self.nr_inv.__dict__)
+        new_nr.inventory = Inventory(
+            hosts=Hosts({x: inv.hosts[x] for x in sorted(hosts, key=self.order.get)}),
+            groups=inv.groups,
+            defaults=inv.defaults,
+        )
+        return new_nr
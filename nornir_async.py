@@ -0,0 +1,595 @@
+from typing import Any, Callable, Dict, List
+import re
+import os
+import time
+import random
+import asyncio
+import inspect
+import logging
+import tempfile
+import traceback
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncssh
+from nornir.core.task import AggregatedResult, MultiResult, Result, Task
+from nornir.core.inventory import Host
+from nornir.core.exceptions import NornirSubTaskError
+
+from acl_platforms import PLATFORMS
+from nornir_processors import NO_DIFF
+from nornir_tasks import CMD_ERROR, CMD_PROMPT, CMD_QUESTION, PUSH_ERROR, NornirTask
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------------
+# CLI: One asyncssh shell session per host, the prompt is learnt at login and cmd echo and prompt are stripped
+# ----------------------------------------------------------------------------
+class AsyncCli:
+    def __init__(
+        self,
+        host: Host,
+        connect_timeout: float = 30,
+        read_timeout: float = 60,
+        connects: asyncio.Semaphore = None,
+    ) -> None:
+        self.host = host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Shared by all sessions of a run to limit the SSH handshakes in progress, None is no limit
+        self.connects = connects if connects != None else contextlib.nullcontext()
+        self.conn, self.process = (None, None)
+        self.prompt, self.exec_prompt = (None, None)
+
+    def _connect_args(self, timeout: float = None) -> Dict[str, Any]:
+        return dict(
+            host=self.host.hostname,
+            port=self.host.port or 22,
+            username=self.host.username,
+            password=self.host.password,
+            known_hosts=None,
+            connect_timeout=timeout or self.connect_timeout,
+        )
+
+    # CONNECT: Handshakes (key exchange and auth are CPU heavy on devices and AAA) wait for a slot so that thousands
+    # started together dont all time out, connect_timeout starts once it has a slot
+    async def _connect(self, timeout: float = None) -> "asyncssh.SSHClientConnection":
+        async with self.connects:
+            return await asyncssh.connect(**self._connect_args(timeout))
+
+    # READ: Output until it ends in the pattern, a device that goes quiet for read_timeout secs raises a timeout
+    async def _read(self, pattern: Any, read_timeout: float = None) -> str:
+        output = ""
+        while not re.search(pattern, output):
+            data = await asyncio.wait_for(
+                self.process.stdout.read(65536), read_timeout or self.read_timeout
+            )
+            if data == "":
+                raise ConnectionError(f"{self.host.name} closed the session")
+            output += data.replace("\r", "")
+        return output
+
+    # OPEN: Logs in (enable if in user mode), learns the prompt and turns off paging
+    async def open(self) -> str:
+        self.conn = await self._connect()
+        self.process = await self.conn.create_process(
+            term_type="vt100", encoding="utf-8", errors="ignore"
+        )
+        prompt = (await self._read(r"[>#]\s*$")).strip().splitlines()[-1]
+        if prompt.endswith(">"):
+            extras = self.host.get_connection_parameters("netmiko").extras or {}
+            self.process.stdin.write("enable\n")
+            await self._read(r"assword:\s*$")
+            self.process.stdin.write(f"{extras.get('secret') or self.host.password}\n")
+            prompt = (await self._read(r"#\s*$")).strip().splitlines()[-1]
+        self.prompt = re.compile(re.escape(prompt[:-1]) + r"[^\n]*[>#]\s*$")
+        self.exec_prompt = re.compile(re.escape(prompt) + r"\s*$")
+        for each_cmd in PLATFORMS[self.host["os_type"]]["session_cmds"]:
+            await self.send_command(each_cmd)
+        return prompt
+
+    # CMD: Output of a cmd without the echo and prompt, expect_string is for cmds that end in a question
+    async def send_command(
+        self, cmd: str, expect_string: str = None, read_timeout: float = None
+    ) -> str:
+        cmd = cmd.rstrip("\n")
+        self.process.stdin.write(cmd + "\n")
+        output = await self._read(expect_string or self.prompt, read_timeout)
+        lines = output.split("\n")
+        if len(lines) > 1 and lines[0].strip() == cmd.strip():
+            del lines[0]
+        if self.prompt.search(lines[-1]):
+            del lines[-1]
+        return "\n".join(lines)
+
+    # CONFIG: Line by line waits for the prompt after each cmd, bulk sends them all and waits for the exec prompt
+    async def send_config(self, config: List[str], bulk: bool = False) -> str:
+        output = await self.send_command("configure terminal")
+        if bulk == True:
+            self.process.stdin.write("\n".join(config + ["end"]) + "\n")
+            output += await self._read(self.exec_prompt)
+        else:
+            for each_cmd in config + ["end"]:
+                output += f"\n{each_cmd}\n" + await self.send_command(each_cmd)
+        return output
+
+    # SCP: File copied over its own connection (the CLI session stays open)
+    async def scp(self, source_file: str, dest_file: str) -> None:
+        async with await self._connect() as conn:
+            await asyncssh.scp(source_file, (conn, dest_file))
+
+    # LOGIN: New connection that is closed as soon as it has authenticated
+    async def login(self, timeout: float) -> None:
+        conn = await self._connect(timeout)
+        conn.close()
+        await conn.wait_closed()
+
+    async def close(self) -> None:
+        if self.conn != None:
+            self.conn.close()
+            try:
+                await self.conn.wait_closed()
+            except Exception:
+                pass
+            self.conn, self.process = (None, None)
+
+
+# ----------------------------------------------------------------------------
+# TASK: Nornir Task that awaits coroutine tasks (sync tasks are called as normal), all subtasks share the hosts session
+# ----------------------------------------------------------------------------
+class AsyncTask(Task):
+    def __init__(
+        self,
+        task: Callable[..., Any],
+        nornir: "Nornir",
+        global_dry_run: bool,
+        processors: "Processors",
+        name: str = None,
+        severity_level: int = logging.INFO,
+        parent_task: "Task" = None,
+        cli: AsyncCli = None,
+        **kwargs: str,
+    ):
+        super().__init__(
+            task,
+            nornir,
+            global_dry_run,
+            processors,
+            name,
+            severity_level,
+            parent_task,
+            **kwargs,
+        )
+        self.cli = cli
+
+    # START: Same as Task.start (processor hooks, exceptions are a failed result) with the task awaited
+    async def start(self, host: Host) -> MultiResult:
+        self.host = host
+        if self.parent_task != None:
+            self.processors.subtask_instance_started(self, host)
+        else:
+            self.processors.task_instance_started(self, host)
+        try:
+            logger.debug("Host %r: running task %r", self.host.name, self.name)
+            r = self.task(self, **self.params)
+            if inspect.isawaitable(r):
+                r = await r
+            if not isinstance(r, Result):
+                r = Result(host=host, result=r)
+        except NornirSubTaskError as e:
+            tb = traceback.format_exc()
+            logger.error(
+                "Host %r: task %r failed with traceback:\n%s",
+                self.host.name,
+                self.name,
+                tb,
+            )
+            r = Result(host, exception=e, result=str(e), failed=True)
+        except Exception as e:
+            tb = traceback.format_exc()
+            logger.error(
+                "Host %r: task %r failed with traceback:\n%s",
+                self.host.name,
+                self.name,
+                tb,
+            )
+            r = Result(host, exception=e, result=tb, failed=True)
+        r.name = self.name
+        if r.severity_level == logging.INFO:
+            r.severity_level = logging.ERROR if r.failed else self.severity_level
+        self.results.insert(0, r)
+        if self.parent_task != None:
+            self.processors.subtask_instance_completed(self, host, self.results)
+        else:
+            self.processors.task_instance_completed(self, host, self.results)
+        return self.results
+
+    # RUN: Same as Task.run, a failed subtask raises NornirSubTaskError
+    async def run(self, task: Callable[..., Any], **kwargs: Any) -> MultiResult:
+        if "severity_level" not in kwargs:
+            kwargs["severity_level"] = self.severity_level
+        run_task = AsyncTask(
+            task,
+            self.nornir,
+            global_dry_run=self.global_dry_run,
+            processors=self.processors,
+            parent_task=self,
+            cli=self.cli,
+            **kwargs,
+        )
+        r = await run_task.start(self.host)
+        self.results.append(r[0] if len(r) == 1 else r)
+        if r.failed:
+            raise NornirSubTaskError(task=run_task, result=r)
+        return r
+
+
+# ----------------------------------------------------------------------------
+# ENGINE: task_engine on asyncio, the same phases (task names and results) as NornirTask over the asyncssh session.
+# Backup parsing, diff and config formatting are the NornirTask methods
+# ----------------------------------------------------------------------------
+class AsyncTaskEngine:
+    def __init__(self, nr_task: NornirTask) -> None:
+        self.nr_task = nr_task
+        self.push_strategies = dict(
+            line=self.push_line, bulk=self.push_bulk, file=self.push_file
+        )
+
+    # ----------------------------------------------------------------------------
+    # TRANSPORT: Session is opened by the first cmd so the connect is timed within the phase that needed it
+    # ----------------------------------------------------------------------------
+    async def async_connect(self, task: AsyncTask) -> Result:
+        return Result(host=task.host, result=await task.cli.open())
+
+    async def _open(self, task: AsyncTask) -> AsyncCli:
+        if task.cli.process == None:
+            await task.run(task=self.async_connect, severity_level=logging.DEBUG)
+        return task.cli
+
+    async def async_send_command(
+        self,
+        task: AsyncTask,
+        command_string: str,
+        expect_string: str = None,
+        read_timeout: float = None,
+    ) -> Result:
+        cli = await self._open(task)
+        output = await cli.send_command(command_string, expect_string, read_timeout)
+        return Result(host=task.host, result=output)
+
+    async def async_send_config(
+        self, task: AsyncTask, config_commands: List[str], bulk: bool = False
+    ) -> Result:
+        cli = await self._open(task)
+        output = await cli.send_config(config_commands, bulk)
+        return Result(host=task.host, changed=True, result=output)
+
+    # ----------------------------------------------------------------------------
+    # BACKUP and VERIFY: Show cmds over the session, ACLs compared locally (nornir-validate is run in a thread)
+    # ----------------------------------------------------------------------------
+    async def backup_acl(self, task: AsyncTask, show_cmd: List) -> str:
+        for each_cmd in show_cmd:
+            await task.run(
+                task=self.async_send_command,
+                command_string=each_cmd,
+                severity_level=logging.DEBUG,
+            )
+        return "Backing up current ACL configurations"
+
+    async def verify_acl(self, task: AsyncTask) -> Result:
+        show_output = []
+        for each_cmd in task.host["show_cmd"]:
+            show_output.append(
+                (
+                    await task.run(
+                        task=self.async_send_command,
+                        command_string=each_cmd,
+                        severity_level=logging.DEBUG,
+                    )
+                ).result
+            )
+        report = self.nr_task.compliance_report(
+            self.nr_task.acl_state(task, show_output), task.host["config"]
+        )
+        return Result(host=task.host, failed=not report["complies"], result=report)
+
+    # ----------------------------------------------------------------------------
+    # PROBE: SSH login test from a new connection, same deadline, retries and jitter as NornirTask.ssh_probe
+    # ----------------------------------------------------------------------------
+    async def ssh_probe(self, task: AsyncTask) -> Result:
+        cfg = self.nr_task.ssh_probe_cfg
+        start = time.monotonic()
+        deadline = start + cfg["timeout"]
+        attempt, error = 0, "deadline exceeded"
+        while attempt <= cfg["retries"]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            attempt += 1
+            # Waiting for a login slot counts towards the deadline, not just the connect
+            try:
+                await asyncio.wait_for(task.cli.login(remaining), remaining)
+                return Result(
+                    host=task.host,
+                    result=dict(
+                        ssh=True,
+                        attempts=attempt,
+                        latency=round(time.monotonic() - start, 3),
+                    ),
+                )
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt <= cfg["retries"]:
+                jitter = random.uniform(0, cfg["jitter"])
+                await asyncio.sleep(max(min(jitter, deadline - time.monotonic()), 0))
+        return Result(
+            host=task.host,
+            result=dict(
+                ssh=False,
+                attempts=attempt,
+                latency=round(time.monotonic() - start, 3),
+                error=error,
+            ),
+        )
+
+    # ----------------------------------------------------------------------------
+    # APPLY: Checkpoint, push, SSH login test and rollback, same as NornirTask.apply_acl
+    # ----------------------------------------------------------------------------
+    async def _send_answered(self, task: AsyncTask, cmd: str) -> str:
+        output = (
+            await task.run(
+                task=self.async_send_command,
+                command_string=cmd,
+                expect_string=CMD_PROMPT,
+                severity_level=logging.DEBUG,
+            )
+        ).result
+        answers = 0
+        while re.search(CMD_QUESTION, output) and answers < 3:
+            output = (
+                await task.run(
+                    task=self.async_send_command,
+                    command_string="\n",
+                    expect_string=CMD_PROMPT,
+                    severity_level=logging.DEBUG,
+                )
+            ).result
+            answers += 1
+        return output
+
+    async def checkpoint_acl(self, task: AsyncTask) -> Result:
+        for each_cmd in task.host["checkpoint_cmd"]:
+            output = await self._send_answered(task, each_cmd)
+        saved = re.search(CMD_ERROR, output, re.I | re.M) == None
+        return Result(host=task.host, result=dict(checkpoint=saved, output=output))
+
+    async def rollback_acl(
+        self, task: AsyncTask, backup_config: List, checkpoint: bool
+    ) -> Result:
+        if checkpoint == True:
+            try:
+                output = (
+                    await task.run(
+                        task=self.async_send_command,
+                        command_string=task.host["rollback_cmd"],
+                        read_timeout=120,
+                        severity_level=logging.DEBUG,
+                    )
+                ).result
+                if re.search(CMD_ERROR, output, re.I | re.M) == None:
+                    return Result(host=task.host, result="checkpoint")
+            except Exception:
+                pass
+        await task.run(
+            task=self.async_send_config,
+            config_commands=backup_config,
+            severity_level=logging.DEBUG,
+        )
+        return Result(host=task.host, result="backup_config")
+
+    async def push_line(self, task: AsyncTask, config: List) -> Result:
+        output = (
+            await task.run(
+                task=self.async_send_config,
+                config_commands=config,
+                severity_level=logging.DEBUG,
+            )
+        ).result
+        return Result(host=task.host, result=output)
+
+    async def push_bulk(self, task: AsyncTask, config: List) -> Result:
+        output = (
+            await task.run(
+                task=self.async_send_config,
+                config_commands=config,
+                bulk=True,
+                severity_level=logging.DEBUG,
+            )
+        ).result
+        failed = re.search(PUSH_ERROR, output, re.M) != None
+        return Result(host=task.host, failed=failed, result=output)
+
+    async def push_file(self, task: AsyncTask, config: List) -> Result:
+        push_file = task.host["push_file"]
+        with tempfile.NamedTemporaryFile("w", suffix=".cfg", delete=False) as tmp:
+            tmp.write("\n".join(config + ["end"]) + "\n")
+        try:
+            await task.cli.scp(
+                tmp.name, f"{push_file['file_system']}/{push_file['dest_file']}"
+            )
+        finally:
+            os.remove(tmp.name)
+        output = await self._send_answered(task, push_file["copy_cmd"])
+        failed = re.search(PUSH_ERROR, output, re.M) != None
+        return Result(host=task.host, failed=failed, result=output)
+
+    async def apply_acl(
+        self, task: AsyncTask, acl_config: List, backup_config: List
+    ) -> Result:
+        strategy = task.host.get("push_strategy") or self.nr_task.push_strategy
+        if strategy not in self.push_strategies:
+            return Result(
+                host=task.host,
+                failed=True,
+                result=f"❌  Unknown push_strategy '{strategy}', must be one of {', '.join(self.push_strategies)}",
+            )
+        checkpoint = False
+        if (
+            self.nr_task.use_checkpoint(task.host)
+            and task.host["checkpoint_cmd"] != None
+        ):
+            checkpoint = (
+                await task.run(task=self.checkpoint_acl, severity_level=logging.DEBUG)
+            ).result["checkpoint"]
+        try:
+            await task.run(
+                name="push_config",
+                task=self.push_strategies[strategy],
+                config=acl_config,
+                severity_level=logging.DEBUG,
+            )
+            pushed = True
+        except NornirSubTaskError:
+            pushed = False
+        if pushed == True:
+            probe = await task.run(
+                name="SSH login test", task=self.ssh_probe, severity_level=logging.DEBUG
+            )
+        if pushed == True and probe.result["ssh"] == True:
+            return Result(
+                host=task.host, changed=True, result="✅  ACLs successfully updated"
+            )
+        else:
+            await task.run(
+                task=self.rollback_acl,
+                backup_config=backup_config,
+                checkpoint=checkpoint,
+                severity_level=logging.DEBUG,
+            )
+            reason = "it broke SSH access" if pushed == True else "the push failed"
+            return Result(
+                host=task.host,
+                failed=True,
+                result=f"❌  ACL update rolled back as {reason}",
+            )
+
+    # ----------------------------------------------------------------------------
+    # TASK_ENGINE: Same steps as NornirTask.task_engine (cache, backup, diff, apply and validate)
+    # ----------------------------------------------------------------------------
+    async def task_engine(self, task: AsyncTask, dry_run: bool) -> Result:
+        nr_task = self.nr_task
+        if nr_task.change_cache != None:
+            marker = (
+                await task.run(
+                    name="Config change marker",
+                    task=self.async_send_command,
+                    command_string=task.host["marker_cmd"],
+                    severity_level=logging.DEBUG,
+                )
+            ).result
+            if nr_task.change_cache.in_sync(
+                task.host.name, marker, task.host["config"]
+            ):
+                return Result(
+                    host=task.host,
+                    result=f"{NO_DIFF} (unchanged since last run)",
+                )
+        result = await task.run(task=self.backup_acl, show_cmd=task.host["show_cmd"])
+        backup_acl_config = nr_task.acl_state(task, [x.result for x in result[1:]])
+        acl_diff = await task.run(
+            name="ACL differences (- remove, + add)",
+            task=nr_task.get_difference,
+            sw_acl=backup_acl_config,
+            tmpl_acl=task.host["config"],
+        )
+        if nr_task.change_cache != None:
+            nr_task.change_cache.update(
+                task.host.name, marker, task.host["config"], acl_diff.result == NO_DIFF
+            )
+        if dry_run == False and acl_diff.result != NO_DIFF:
+            acl_config, backup_config = nr_task.change_config(task, backup_acl_config)
+            await task.run(
+                task=self.apply_acl,
+                acl_config=acl_config,
+                backup_config=backup_config,
+            )
+            if nr_task.verify == "local":
+                await task.run(task=self.verify_acl)
+            # nornir-validate opens its own netmiko connection so is a normal (threaded) subtask, the connection is
+            # closed after it as nothing else in the run uses it (thousands would otherwise stay open)
+            else:
+                from nornir_validate.nr_val import validate_task
+
+                try:
+                    await asyncio.to_thread(
+                        Task.run, task, validate_task, input_data=task.host["acl_val"]
+                    )
+                finally:
+                    await asyncio.to_thread(task.host.close_connections)
+
+
+# ----------------------------------------------------------------------------
+# RUNNER: All hosts in one event loop (up to max_sessions at once and max_connects of them logging in), tasks without
+# an async version use threads
+# ----------------------------------------------------------------------------
+class AsyncioRunner:
+    def __init__(
+        self,
+        nr_task: NornirTask,
+        max_sessions: int = 1000,
+        max_connects: int = 100,
+        connect_timeout: float = 30,
+        read_timeout: float = 60,
+        num_workers: int = 20,
+    ) -> None:
+        self.engine = AsyncTaskEngine(nr_task)
+        # Async version of the tasks (by name) that run on the event loop
+        self.tasks = dict(task_engine=self.engine.task_engine)
+        self.max_sessions = max_sessions
+        self.max_connects = max_connects
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.num_workers = num_workers
+
+    async def _run_host(
+        self,
+        task: Task,
+        host: Host,
+        sessions: asyncio.Semaphore,
+        connects: asyncio.Semaphore,
+    ) -> MultiResult:
+        async with sessions:
+            cli = AsyncCli(host, self.connect_timeout, self.read_timeout, connects)
+            host_task = AsyncTask(
+                self.tasks[task.name],
+                task.nornir,
+                task.global_dry_run,
+                task.processors,
+                name=task.name,
+                severity_level=task.severity_level,
+                cli=cli,
+                **task.params,
+            )
+            try:
+                return await host_task.start(host)
+            finally:
+                await cli.close()
+
+    async def _run(self, task: Task, hosts: List[Host]) -> List[MultiResult]:
+        sessions = asyncio.Semaphore(self.max_sessions)
+        connects = asyncio.Semaphore(self.max_connects)
+        return await asyncio.gather(
+            *[self._run_host(task, x, sessions, connects) for x in hosts]
+        )
+
+    def run(self, task: Task, hosts: List[Host]) -> AggregatedResult:
+        result = AggregatedResult(task.name)
+        if task.name in self.tasks:
+            host_results = asyncio.run(self._run(task, hosts))
+        else:
+            with ThreadPoolExecutor(self.num_workers) as pool:
+                host_results = list(pool.map(lambda x: task.copy().start(x), hosts))
+        for host, host_result in zip(hosts, host_results):
+            result[host.name] = host_result
+        return result
@@ -0,0 +1,487 @@
+from typing import Any, Dict, List
+import os
+import json
+import math
+import hashlib
+import time
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from rich.console import Console
+from rich.table import Table
+from rich.markup import escape
+from nornir.core.inventory import Host
+from nornir.core.task import AggregatedResult, MultiResult, Task
+
+NO_DIFF = "✅  No differences between configurations"
+
+
+# OUTCOME: Failed, in-sync (no diff) or changed (or would be changed if dry_run)
+def host_outcome(result: MultiResult) -> str:
+    if result.failed == True:
+        return "failed"
+    for each_result in result:
+        if str(each_result.result).startswith(NO_DIFF):
+            return "in_sync"
+    return "changed"
+
+
+# ----------------------------------------------------------------------------
+# STREAM: Prints each hosts outcome as soon as the host finishes and writes it as a JSON line to the results file
+# ----------------------------------------------------------------------------
+class StreamResult:
+    def __init__(self, rc: Console, task_name: str, results_file: str = None) -> None:
+        self.rc = rc
+        # Only the main task (not its subtasks or other tasks run with the same nornir object) is streamed
+        self.task_name = task_name
+        self.results_file = results_file
+        self.lock = threading.Lock()
+        self.summary: Dict[str, List[str]] = dict(in_sync=[], changed=[], failed=[])
+        self.file_content = None
+
+    def outcome(self, result: MultiResult) -> str:
+        return host_outcome(result)
+
+    # RECORD: JSON serialisable record of the host and all its (sub)task results
+    def record(self, host: Host, result: MultiResult) -> Dict[str, Any]:
+        return dict(
+            time=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            host=host.name,
+            outcome=self.outcome(result),
+            failed=result.failed,
+            changed=result.changed,
+            results=[
+                dict(
+                    name=x.name,
+                    failed=x.failed,
+                    changed=x.changed,
+                    result=x.result
+                    if isinstance(x.result, (dict, list))
+                    else str(x.result),
+                    exception=str(x.exception) if x.exception != None else None,
+                )
+                for x in result
+            ],
+        )
+
+    # PRINT: Host header and any INFO (or failed) subtask results, multi-line results (diff) are indented
+    def print_host(self, host: Host, result: MultiResult, outcome: str) -> None:
+        style = dict(failed="red", in_sync="green", changed="dark_orange")[outcome]
+        self.rc.print(f"[{style}][b]{host.name}[/b] ({outcome})[/{style}]")
+        for each_result in result:
+            if each_result.result == None:
+                continue
+            elif each_result.severity_level < logging.INFO and not each_result.failed:
+                continue
+            lines = str(each_result.result).splitlines() or [""]
+            self.rc.print(
+                f"  [i]{each_result.name}:[/i] {escape(lines[0])}", highlight=False
+            )
+            for each_line in lines[1:]:
+                self.rc.print(f"    {escape(each_line)}", highlight=False)
+
+    # ----------------------------------------------------------------------------
+    # PROCESSOR: Nornir processor interface, only task_instance_completed of the main task does anything
+    # ----------------------------------------------------------------------------
+    def task_started(self, task: Task) -> None:
+        with self.lock:
+            if (
+                task.name == self.task_name
+                and self.results_file
+                and not self.file_content
+            ):
+                self.file_content = open(self.results_file, "a")
+
+    def task_completed(self, task: Task, result: AggregatedResult) -> None:
+        with self.lock:
+            if task.name == self.task_name and self.file_content:
+                self.file_content.close()
+                self.file_content = None
+
+    def task_instance_started(self, task: Task, host: Host) -> None:
+        pass
+
+    def task_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        if task.name != self.task_name:
+            return
+        outcome = self.outcome(result)
+        with self.lock:
+            self.summary[outcome].append(host.name)
+            self.print_host(host, result, outcome)
+            if self.file_content:
+                self.file_content.write(
+                    json.dumps(self.record(host, result), default=str) + "\n"
+                )
+                self.file_content.flush()
+
+    def subtask_instance_started(self, task: Task, host: Host) -> None:
+        pass
+
+    def subtask_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        pass
+
+    # ----------------------------------------------------------------------------
+    # SUMMARY: Number of hosts in each outcome and the names of failed hosts
+    # ----------------------------------------------------------------------------
+    def print_summary(self, dry_run: bool) -> None:
+        changed = "would change" if dry_run == True else "changed"
+        self.rc.print(
+            f"[dark_blue][b]Summary:[/b] {sum(len(x) for x in self.summary.values())} hosts, "
+            f"{len(self.summary['in_sync'])} in-sync, {len(self.summary['changed'])} {changed}, "
+            f"{len(self.summary['failed'])} failed[/dark_blue]"
+        )
+        if len(self.summary["failed"]) != 0:
+            self.rc.print(
+                f":x: [b]Failed:[/b] [i]{', '.join(self.summary['failed'])}[/i]"
+            )
+        if self.results_file:
+            self.rc.print(
+                f"[dark_blue]Results written to [i]{self.results_file}[/i][/dark_blue]"
+            )
+
+
+# ----------------------------------------------------------------------------
+# METRICS: Per-host and per-phase durations and bytes, exported as a Prometheus textfile and OpenTelemetry style spans
+# ----------------------------------------------------------------------------
+# Subtasks of task_engine that are timed as a phase (any subtasks within them count towards that phase)
+PHASES = {
+    "Config change marker": "marker",
+    "backup_acl": "backup",
+    "ACL differences (- remove, + add)": "diff",
+    "apply_acl": "apply",
+    "checkpoint_acl": "checkpoint",
+    "rollback_acl": "rollback",
+    "SSH login test": "ssh_probe",
+    "validate_task": "validate",
+    "verify_acl": "validate",
+    "netmiko_connect": "connect",
+    "async_connect": "connect",
+}
+NETMIKO_TASKS = ["netmiko_send_command", "netmiko_send_config"]
+# Asyncio runner transport tasks, bytes are counted the same as netmiko (the connection is opened by the task in
+# netmiko_connect or async_connect, never by a processor)
+ASYNC_TASKS = ["async_send_command", "async_send_config"]
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+class PhaseMetrics:
+    def __init__(
+        self,
+        rc: Console,
+        task_name: str,
+        prom_file: str = None,
+        spans_file: str = None,
+    ) -> None:
+        self.rc = rc
+        self.task_name = task_name
+        self.prom_file = prom_file
+        self.spans_file = spans_file
+        self.lock = threading.Lock()
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Dict[str, Any]] = []
+        # Open spans (by task object) and the phase span each host is currently in (a host runs in one thread)
+        self.open_spans: Dict[int, Dict[str, Any]] = {}
+        self.host_phase: Dict[str, List[Dict[str, Any]]] = {}
+
+    # GROUP: Platform of the host (os_type group_var), otherwise its first group
+    def _group(self, host: Host) -> str:
+        try:
+            return host["os_type"]
+        except KeyError:
+            return host.groups[0].name if len(host.groups) != 0 else "none"
+
+    def _start_span(
+        self, name: str, host: Host, parent: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        return dict(
+            traceId=self.trace_id,
+            spanId=os.urandom(8).hex(),
+            parentSpanId=parent["spanId"] if parent else None,
+            name=name,
+            startTimeUnixNano=time.time_ns(),
+            endTimeUnixNano=None,
+            attributes={
+                "host": host.name,
+                "group": self._group(host),
+                "bytes_sent": 0,
+                "bytes_received": 0,
+            },
+        )
+
+    def _end_span(self, span: Dict[str, Any], failed: bool) -> None:
+        span["endTimeUnixNano"] = time.time_ns()
+        span["attributes"]["failed"] = failed
+        with self.lock:
+            self.spans.append(span)
+
+    # BYTES: Cmds sent and output received by netmiko (or asyncio runner) tasks, counted against the host and phase they are in
+    def _count_bytes(self, task: Task, host: Host, result: MultiResult) -> None:
+        sent = task.params.get("command_string") or "\n".join(
+            task.params.get("config_commands") or []
+        )
+        received = str(result[0].result) if len(result) != 0 else ""
+        for each_span in self.host_phase[host.name]:
+            each_span["attributes"]["bytes_sent"] += len(sent.encode())
+            each_span["attributes"]["bytes_received"] += len(received.encode())
+
+    # ----------------------------------------------------------------------------
+    # PROCESSOR: The main task is the host span, phases and connect are its child spans
+    # ----------------------------------------------------------------------------
+    def task_started(self, task: Task) -> None:
+        pass
+
+    def task_completed(self, task: Task, result: AggregatedResult) -> None:
+        pass
+
+    def task_instance_started(self, task: Task, host: Host) -> None:
+        if task.name == self.task_name:
+            span = self._start_span(task.name, host)
+            self.open_spans[id(task)] = span
+            self.host_phase[host.name] = [span]
+
+    def task_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        if task.name == self.task_name and id(task) in self.open_spans:
+            self._end_span(self.open_spans.pop(id(task)), result.failed)
+            self.host_phase.pop(host.name, None)
+
+    def subtask_instance_started(self, task: Task, host: Host) -> None:
+        # Errors in a processor would stop the host, metrics are never worth that
+        try:
+            if host.name not in self.host_phase:
+                return
+            if task.name in PHASES:
+                span = self._start_span(
+                    PHASES[task.name], host, self.host_phase[host.name][-1]
+                )
+                self.open_spans[id(task)] = span
+                self.host_phase[host.name].append(span)
+        except Exception:
+            pass
+
+    def subtask_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        try:
+            if host.name not in self.host_phase:
+                return
+            if task.name in NETMIKO_TASKS + ASYNC_TASKS:
+                self._count_bytes(task, host, result)
+            if id(task) in self.open_spans:
+                self._end_span(self.open_spans.pop(id(task)), result.failed)
+                self.host_phase[host.name].pop()
+        except Exception:
+            pass
+
+    # ----------------------------------------------------------------------------
+    # STATS: Percentiles (nearest rank) of each phase duration and total bytes per platform group
+    # ----------------------------------------------------------------------------
+    def _percentile(self, values: List[float], quantile: float) -> float:
+        values = sorted(values)
+        return values[max(0, math.ceil(quantile * len(values)) - 1)]
+
+    def stats(self) -> Dict[tuple, Dict[str, Any]]:
+        durations: Dict[tuple, List[float]] = defaultdict(list)
+        bytes_cnt: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+        with self.lock:
+            spans = list(self.spans)
+        for each_span in spans:
+            phase = (
+                "total" if each_span["name"] == self.task_name else each_span["name"]
+            )
+            key = (each_span["attributes"]["group"], phase)
+            durations[key].append(
+                (each_span["endTimeUnixNano"] - each_span["startTimeUnixNano"]) / 1e9
+            )
+            bytes_cnt[key][0] += each_span["attributes"]["bytes_sent"]
+            bytes_cnt[key][1] += each_span["attributes"]["bytes_received"]
+        stats = {}
+        for key, values in sorted(durations.items()):
+            stats[key] = dict(
+                count=len(values),
+                sum=sum(values),
+                max=max(values),
+                quantiles={x: self._percentile(values, x) for x in QUANTILES},
+                bytes_sent=bytes_cnt[key][0],
+                bytes_received=bytes_cnt[key][1],
+            )
+        return stats
+
+    # ----------------------------------------------------------------------------
+    # EXPORT: Prometheus textfile (node_exporter textfile collector format) and OpenTelemetry style spans (JSONL)
+    # ----------------------------------------------------------------------------
+    def prometheus(self, stats: Dict[tuple, Dict[str, Any]]) -> str:
+        lines = [
+            "# HELP acl_phase_duration_seconds Time taken by each phase of the ACL update per host",
+            "# TYPE acl_phase_duration_seconds summary",
+        ]
+        for (group, phase), each_stat in stats.items():
+            labels = f'group="{group}",phase="{phase}"'
+            for quantile, value in each_stat["quantiles"].items():
+                lines.append(
+                    f'acl_phase_duration_seconds{{{labels},quantile="{quantile}"}} {value:.6f}'
+                )
+            lines.append(
+                f"acl_phase_duration_seconds_sum{{{labels}}} {each_stat['sum']:.6f}"
+            )
+            lines.append(
+                f"acl_phase_duration_seconds_count{{{labels}}} {each_stat['count']}"
+            )
+        lines.extend(
+            [
+                "# HELP acl_phase_bytes Bytes sent and received by each phase of the ACL update",
+                "# TYPE acl_phase_bytes gauge",
+            ]
+        )
+        for (group, phase), each_stat in stats.items():
+            labels = f'group="{group}",phase="{phase}"'
+            lines.append(
+                f'acl_phase_bytes{{{labels},direction="sent"}} {each_stat["bytes_sent"]}'
+            )
+            lines.append(
+                f'acl_phase_bytes{{{labels},direction="received"}} {each_stat["bytes_received"]}'
+            )
+        return "\n".join(lines) + "\n"
+
+    # WRITE: Temp file first so the textfile collector never reads a half written file
+    def export(self) -> Dict[tuple, Dict[str, Any]]:
+        stats = self.stats()
+        if self.prom_file:
+            with open(self.prom_file + ".tmp", "w") as file_content:
+                file_content.write(self.prometheus(stats))
+            os.replace(self.prom_file + ".tmp", self.prom_file)
+        if self.spans_file:
+            with self.lock:
+                spans = list(self.spans)
+            with open(self.spans_file, "a") as file_content:
+                for each_span in spans:
+                    file_content.write(json.dumps(each_span) + "\n")
+        return stats
+
+    # PRINT: Table of p50/p90/max duration of each phase per platform group
+    def print_stats(self, stats: Dict[tuple, Dict[str, Any]]) -> None:
+        table = Table(title="Phase timings (secs)", title_justify="left")
+        for each_col in [
+            "Group",
+            "Phase",
+            "Hosts",
+            "p50",
+            "p90",
+            "Max",
+            "Sent",
+            "Received",
+        ]:
+            table.add_column(each_col)
+        for (group, phase), each_stat in stats.items():
+            table.add_row(
+                group,
+                phase,
+                str(each_stat["count"]),
+                f"{each_stat['quantiles'][0.5]:.2f}",
+                f"{each_stat['quantiles'][0.9]:.2f}",
+                f"{each_stat['max']:.2f}",
+                str(each_stat["bytes_sent"]),
+                str(each_stat["bytes_received"]),
+            )
+        self.rc.print(table)
+
+
+# ----------------------------------------------------------------------------
+# JOURNAL: Append-only record of each hosts completed phases and outcome so an interrupted run can be resumed
+# ----------------------------------------------------------------------------
+class RunJournal:
+    def __init__(self, journal_file: str, task_name: str) -> None:
+        self.journal_file = journal_file
+        self.task_name = task_name
+        self.lock = threading.Lock()
+        self.file_content = None
+
+    # KEY: A host is only completed if its rendered ACLs and the dry_run mode are the same as when it was journaled
+    def host_key(self, host: Host, dry_run: bool) -> str:
+        state = json.dumps([dry_run, host.get("acl_name"), host.get("config")])
+        return hashlib.sha256(state.encode()).hexdigest()
+
+    # LOAD: Last outcome record of each host, a line cut short by the interruption is ignored
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        outcomes: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.journal_file):
+            return outcomes
+        with open(self.journal_file, "r") as file_content:
+            for each_line in file_content:
+                try:
+                    record = json.loads(each_line)
+                except ValueError:
+                    continue
+                if "outcome" in record:
+                    outcomes[record["host"]] = record
+        return outcomes
+
+    # COMPLETED: Hosts that finished (in-sync or changed) with the same rendered ACLs and dry_run mode
+    def completed(self, nr_inv: "Nornir", dry_run: bool) -> List[str]:
+        outcomes = self.load()
+        completed = []
+        for host_name, host in nr_inv.inventory.hosts.items():
+            record = outcomes.get(host_name, {})
+            if record.get("outcome") in ["in_sync", "changed"]:
+                if record.get("key") == self.host_key(host, dry_run):
+                    completed.append(host_name)
+        return completed
+
+    # NEW: A run that is not being resumed starts a new journal
+    def new_run(self) -> None:
+        with open(self.journal_file, "w"):
+            pass
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        record["time"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self.lock:
+            if self.file_content:
+                self.file_content.write(json.dumps(record) + "\n")
+                self.file_content.flush()
+
+    # ----------------------------------------------------------------------------
+    # PROCESSOR: Records each phase a host completes and the hosts outcome when it finishes
+    # ----------------------------------------------------------------------------
+    def task_started(self, task: Task) -> None:
+        with self.lock:
+            if task.name == self.task_name and not self.file_content:
+                self.file_content = open(self.journal_file, "a")
+
+    def task_completed(self, task: Task, result: AggregatedResult) -> None:
+        with self.lock:
+            if task.name == self.task_name and self.file_content:
+                self.file_content.close()
+                self.file_content = None
+
+    def task_instance_started(self, task: Task, host: Host) -> None:
+        pass
+
+    def task_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        if task.name == self.task_name:
+            self._write(
+                dict(
+                    host=host.name,
+                    outcome=host_outcome(result),
+                    key=self.host_key(host, task.params.get("dry_run")),
+                )
+            )
+
+    def subtask_instance_started(self, task: Task, host: Host) -> None:
+        pass
+
+    def subtask_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        if task.name in PHASES:
+            self._write(
+                dict(host=host.name, phase=PHASES[task.name], failed=result.failed)
+            )
@@ -0,0 +1,161 @@
+from typing import Any, Dict, List
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+from nornir.core.task import AggregatedResult, MultiResult, Task
+from nornir.core.inventory import Host
+from nornir.core.plugins.runners import RunnersPluginRegister
+from netmiko.exceptions import (
+    NetmikoAuthenticationException,
+    NetmikoTimeoutException,
+)
+
+# Exceptions that mean the devices or AAA servers are struggling rather than the task being wrong
+CONGESTION_EXCEPTIONS = (
+    NetmikoTimeoutException,
+    NetmikoAuthenticationException,
+    paramiko.AuthenticationException,
+    paramiko.SSHException,
+    socket.timeout,
+)
+# Subtask that opens the device connection, its result latency (secs) is the connect time of the host
+CONNECT_TASKS = ["netmiko_connect"]
+
+
+# ----------------------------------------------------------------------------
+# ADAPTIVE: Threaded runner that changes the number of in-flight hosts (AIMD) based on how the devices respond
+# ----------------------------------------------------------------------------
+class AdaptiveRunner:
+    def __init__(
+        self,
+        min_workers: int = 5,
+        max_workers: int = 100,
+        start_workers: int = 10,
+        backoff: float = 0.5,
+        slow_factor: float = 3.0,
+        slow_min: float = 1.0,
+    ) -> None:
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.backoff = backoff
+        # A host is slow if its connect takes longer than slow_factor x the average (EWMA) connect time and slow_min
+        # secs, the whole host run time is not used as it is how much work the host had (changes or in-sync)
+        self.slow_factor = slow_factor
+        self.slow_min = slow_min
+        self.concurrency = float(max(min(start_workers, max_workers), min_workers))
+        self.in_flight, self.completed, self.congested = (0, 0, 0)
+        self.avg_connect = None
+        self.last_backoff = 0.0
+        self.start_time = None
+        self.cond = threading.Condition()
+
+    # ----------------------------------------------------------------------------
+    # SIGNALS: Congestion is a timeout/auth exception in any of the results or a slow connect
+    # ----------------------------------------------------------------------------
+    # EXCEPTIONS: Subtask results are nested MultiResults so walks them to get all exceptions
+    def _get_exceptions(self, result: MultiResult) -> List[BaseException]:
+        exceptions = []
+        for each_result in result:
+            if isinstance(each_result, MultiResult):
+                exceptions.extend(self._get_exceptions(each_result))
+            elif each_result.exception != None:
+                exceptions.append(each_result.exception)
+        return exceptions
+
+    # CONNECT: Connect time of the host, None if the task didnt open a connection (already open or not a device task)
+    def _get_connect(self, result: MultiResult) -> float:
+        for each_result in result:
+            if isinstance(each_result, MultiResult):
+                latency = self._get_connect(each_result)
+                if latency != None:
+                    return latency
+            elif each_result.name in CONNECT_TASKS and not each_result.failed:
+                if isinstance(each_result.result, dict):
+                    return each_result.result.get("latency")
+        return None
+
+    def _is_congested(self, result: MultiResult, connect: float) -> bool:
+        for each_exception in self._get_exceptions(result):
+            if isinstance(each_exception, CONGESTION_EXCEPTIONS):
+                return True
+        if (
+            connect != None
+            and self.avg_connect != None
+            and connect > self.slow_factor * self.avg_connect
+            and connect > self.slow_min
+        ):
+            return True
+        return False
+
+    # AIMD: Multiplicative decrease (once per window of hosts) on congestion, otherwise additive increase
+    def _adjust(self, result: MultiResult, started: float) -> None:
+        connect = self._get_connect(result)
+        with self.cond:
+            self.in_flight -= 1
+            self.completed += 1
+            if self._is_congested(result, connect):
+                self.congested += 1
+                # Only hosts started after the last back off count, stops one slow batch collapsing concurrency
+                if started > self.last_backoff:
+                    self.concurrency = max(
+                        self.min_workers, self.concurrency * self.backoff
+                    )
+                    self.last_backoff = time.monotonic()
+            else:
+                self.concurrency = min(self.max_workers, self.concurrency + 1)
+                if connect == None:
+                    pass
+                elif self.avg_connect == None:
+                    self.avg_connect = connect
+                else:
+                    self.avg_connect = 0.8 * self.avg_connect + 0.2 * connect
+            self.cond.notify_all()
+
+    # HOST: Runs the task against a host and feeds the outcome back into the concurrency controller
+    def _run_host(self, task: Task, host: Host) -> MultiResult:
+        started = time.monotonic()
+        result = None
+        try:
+            result = task.start(host)
+        finally:
+            self._adjust(result or MultiResult(task.name), started)
+        return result
+
+    # ----------------------------------------------------------------------------
+    # STATS: Current concurrency and throughput (hosts completed per minute)
+    # ----------------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.start_time if self.start_time else 0
+        return dict(
+            concurrency=int(self.concurrency),
+            in_flight=self.in_flight,
+            completed=self.completed,
+            congested=self.congested,
+            throughput=round(self.completed / elapsed * 60, 1) if elapsed else 0.0,
+        )
+
+    # ----------------------------------------------------------------------------
+    # RUN: Only submits a host once the number of in-flight hosts is below the current concurrency
+    # ----------------------------------------------------------------------------
+    def run(self, task: Task, hosts: List[Host]) -> AggregatedResult:
+        result = AggregatedResult(task.name)
+        futures = []
+        self.start_time = self.start_time or time.monotonic()
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            for host in hosts:
+                with self.cond:
+                    while self.in_flight >= int(self.concurrency):
+                        self.cond.wait()
+                    self.in_flight += 1
+                futures.append(pool.submit(self._run_host, task.copy(), host))
+
+        for future in futures:
+            worker_result = future.result()
+            result[worker_result.host.name] = worker_result
+        return result
+
+
+RunnersPluginRegister.register("adaptive", AdaptiveRunner)
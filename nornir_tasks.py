@@ -1,30 +1,111 @@
 from typing import Any, Dict, List
+import re
+import os
 import sys
+import time
+import random
 import socket
+import tempfile
 import logging
+import bisect
 import difflib
 import ipaddress
+from collections import defaultdict
+
+import paramiko
 
 from rich.console import Console
 from rich.theme import Theme
 from nornir_rich.functions import print_result
+from nornir.core import Nornir
 from nornir.core.filter import F
+from nornir.core.inventory import Host, Hosts, Inventory
 from nornir.core.task import Task, Result
-from nornir_jinja2.plugins.tasks import template_file
-from nornir_netmiko.tasks import netmiko_send_command, netmiko_send_config
+from nornir.core.exceptions import NornirSubTaskError
+from nornir_netmiko.tasks import (
+    netmiko_file_transfer,
+    netmiko_send_command,
+    netmiko_send_config,
+)
+
+from change_cache import ChangeCache
+from acl_render import AclRender
+from acl_model import AclModel
+from nornir_processors import PhaseMetrics, RunJournal, StreamResult
+from acl_platforms import GROUP_PLATFORM, PLATFORMS
+
 
-from nornir_validate.nr_val import validate_task
+# OVERLAY_SITE_KEY: Host inventory data (Orion location) that site overlays in the input file are keyed on
+OVERLAY_SITE_KEY = "Infra_Location"
+# CHECKPOINT: Checkpoint cmd output ending in a question (IOS copy destination filename or overwrite) or the prompt,
+# and checkpoint or rollback output that means the cmd failed
+CMD_QUESTION = r"(\?|\[confirm\])\s*$"
+CMD_PROMPT = r"(\?|\[confirm\]|#)\s*$"
+CMD_ERROR = r"^\s*%|error|fail|abort|invalid"
+# PUSH: Config push output that means a line was rejected (IOS/NXOS '% Invalid input', ASA 'ERROR:')
+PUSH_ERROR = r"^\s*%|^ERROR:"
 
 
 class NornirTask:
-    def __init__(self):
+    def __init__(
+        self,
+        ssh_probe: Dict[str, Any] = None,
+        batch_backup: bool = False,
+        rollout: Dict[str, Any] = None,
+        change_cache: str = None,
+        delta_apply: bool = False,
+        render_cache: str = None,
+        results_file: str = None,
+        metrics: Dict[str, str] = None,
+        journal_file: str = None,
+        verify: str = "nornir_validate",
+        checkpoint: bool = False,
+        push_strategy: str = "line",
+    ):
         my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
         self.rc = Console(theme=Theme(my_theme))
+        # Template compiled once, rendered config memoised (and its bytecode cached) in render_cache across runs
+        self.render = AclRender(cache_dir=render_cache)
+        # Skips backup and diff of hosts whose change marker and rendered ACLs are same as last in-sync run
+        self.change_cache = ChangeCache(change_cache) if change_cache else None
+        # Canary and wave sizes of hosts changed at a time and failure rate (0-1) of a wave that halts the rollout
+        self.rollout = dict(waves=[], halt_rate=0.2)
+        self.rollout.update(rollout or {})
+        # Only pushes the changed ACEs (IOS/IOS-XE and NXOS) rather than deleting and re-adding the whole ACL
+        self.delta_apply = delta_apply
+        # One show cmd per platform (rather than per ACL) for the backup, output is split locally
+        self.batch_backup = batch_backup
+        # Deadline (secs) for the post-change SSH login test, number of retries and max jitter (secs) between them
+        self.ssh_probe_cfg = dict(timeout=10, retries=2, jitter=1)
+        self.ssh_probe_cfg.update(ssh_probe or {})
+        # JSONL file each hosts results are appended to as the host finishes
+        self.results_file = results_file
+        # Prometheus textfile and spans file the per-phase timings are exported to, None disables the timings
+        self.metrics = metrics
+        # Each hosts completed phases and outcome are appended to journal_file so an interrupted run can be resumed
+        self.journal = RunJournal(journal_file, "task_engine") if journal_file else None
+        # Post-change validation, 'local' checks the ACLs from one show over the same session or 'nornir_validate'
+        self.verify = verify
+        # On-box checkpoint (IOS/IOS-XE running config copied to flash, NXOS checkpoint) so rollback is one cmd,
+        # groups can opt-in (or out) with checkpoint in their group data
+        self.checkpoint = checkpoint
+        # How configs are pushed, groups can set their own (push_strategy group data), see push_line, bulk and file
+        self.push_strategy = push_strategy
+        self.push_strategies = dict(
+            line=self.push_line, bulk=self.push_bulk, file=self.push_file
+        )
+        # Hosts in each outcome (in_sync, changed, failed) of the last config_engine run
+        self.summary: Dict[str, List[str]] = {}
+        # Per-platform inventories of the last inventory partitioned
+        self.platform_cache: Dict[str, Any] = {}
 
     # ----------------------------------------------------------------------------
     # TMPL: Nornir task to renders the template and ACL_VAR input to produce the config
     # ----------------------------------------------------------------------------
     def template_config(self, task: Task, os_type: str, acl: Dict[str, Any]) -> Result:
+        # Only imported if used, configs are rendered in-process by AclRender
+        from nornir_jinja2.plugins.tasks import template_file
+
         task.run(
             task=template_file,
             name=f"Generating {os_type.upper()} configuration",
@@ -34,6 +115,19 @@ class NornirTask:
             acl_vars=acl,
         )
 
+    # ----------------------------------------------------------------------------
+    # CONNECT: Opens the netmiko connection (unless already open, such as daemon warm sessions) so it is timed as its
+    # own phase, latency is None if it was already open
+    # ----------------------------------------------------------------------------
+    def netmiko_connect(self, task: Task) -> Result:
+        if "netmiko" in task.host.connections:
+            return Result(host=task.host, result=dict(latency=None))
+        start = time.monotonic()
+        task.host.get_connection("netmiko", task.nornir.config)
+        return Result(
+            host=task.host, result=dict(latency=round(time.monotonic() - start, 3))
+        )
+
     # ----------------------------------------------------------------------------
     # BACKUP: Gets backup of ACLs, summary message rather than the result is printed
     # ----------------------------------------------------------------------------
@@ -51,20 +145,44 @@ class NornirTask:
     # ----------------------------------------------------------------------------
     # SHOW_DEL: Creates the show and delete ACLs (except for ASA del as needs to be done once got backup)
     def show_del_cmd(self, os_type, acl_name):
-        show_cmds, del_cmds = ([] for i in range(2))
-        if os_type == "asa":
-            show_cmds = ["show run ssh", "show run http"]
-            del_cmds = None
-        elif os_type == "ios/iosxe":
-            for each_name in acl_name:
-                show_cmds.append(f"show run | sec access-list extended {each_name}_")
-                del_cmds.append(f"no ip access-list extended {each_name}")
-        elif os_type == "nxos":
-            for each_name in acl_name:
-                show_cmds.append(f"show run | sec 'ip access-list {each_name}'")
-                del_cmds.append(f"no ip access-list {each_name}")
+        platform = PLATFORMS[os_type]
+        if isinstance(platform["show_cmd"], list):
+            show_cmds = list(platform["show_cmd"])
+        else:
+            show_cmds = [platform["show_cmd"].format(x) for x in acl_name]
+        if self.batch_backup == True and platform["batch_show_cmd"] != None:
+            show_cmds = [platform["batch_show_cmd"]]
+        del_cmds = None
+        if platform["del_cmd"] != None:
+            del_cmds = [platform["del_cmd"].format(x) for x in acl_name]
         return {"show": show_cmds, "del": del_cmds}
 
+    # SPLIT: Splits batched backup output of all ACLs into a list of ACLs (in acl_name order, '' if ACL doesnt exist)
+    def split_acl(self, backup_output: str, acl_name: List) -> List:
+        acls: Dict[str, List] = {}
+        each_name = None
+        for each_line in backup_output.splitlines():
+            if len(each_line.strip()) == 0:
+                continue
+            # ACL name is the last word of the non-indented 'ip access-list' lines
+            elif not each_line.startswith(" "):
+                each_name = None
+                if "access-list" in each_line and each_line.split()[-1] in acl_name:
+                    each_name = each_line.split()[-1]
+                    acls[each_name] = [each_line]
+            elif each_name != None:
+                acls[each_name].append(each_line)
+        return ["\n".join(acls.get(each_name, [])) for each_name in acl_name]
+
+    # STATE: Show cmd outputs as a list of ACLs, ASA needs to remove non access based info from ssh and http cmds and
+    # batched backup returns all ACLs in one output so needs splitting into a list of ACLs
+    def acl_state(self, task: Task, show_output: List[str]) -> List[str]:
+        if task.host.dict()["groups"][0] == "asa":
+            return self.format_asa(show_output)
+        elif self.batch_backup == True:
+            return self.split_acl(show_output[0], task.host["acl_name"])
+        return show_output
+
     # FMT_ASA: Removes all now access lines from the SSH and HTTP cmds
     def format_asa(self, backup_acl_config):
         tmp_backup_acl_config = []
@@ -96,13 +214,106 @@ class NornirTask:
 
     # CFG: Joins delete cmds to config or backup_config ready to apply
     def format_config(self, task, config1, config2):
-        # ASA needs to create delete command list from backup config
+        # ASA needs to create delete command list from the config being replaced (not kept as differs per direction)
         if task.host["delete_cmd"] == None:
-            task.host["delete_cmd"] = self.asa_del(config1).copy()
-        config = task.host["delete_cmd"].copy()
+            config = self.asa_del(config1)
+        else:
+            config = task.host["delete_cmd"].copy()
         config.extend(self.list_of_cmds(config2))
         return config
 
+    # ----------------------------------------------------------------------------
+    # DELTA: Only removes and inserts the changed ACEs (using sequence numbers) rather than recreating the ACL
+    # ----------------------------------------------------------------------------
+    # SEQ: Sequence numbers for the ACEs inserted in the gap between two kept ACEs (None if is not enough room)
+    def _insert_seq(self, prev_seq: int, next_seq: int, num_ace: int) -> List[int]:
+        if next_seq == None:
+            return [prev_seq + (10 * x) for x in range(1, num_ace + 1)]
+        step = (next_seq - prev_seq) // (num_ace + 1)
+        if step == 0:
+            return None
+        return [prev_seq + (step * x) for x in range(1, num_ace + 1)]
+
+    # ACE_CMDS: Cmds to change sw_acl into tmpl_acl once the ACL is resequenced (10, 20, etc), None if not possible
+    def delta_cmds(self, os_type: str, sw_acl: str, tmpl_acl: str) -> List[str]:
+        sw_lines = sw_acl.strip().replace("   ", " ").replace(" \n", "\n").splitlines()
+        tmpl_lines = tmpl_acl.strip().splitlines()
+        # ACL doesnt exist on the device (or is being removed) so needs creating from scratch
+        if len(sw_lines) == 0 or len(tmpl_lines) == 0:
+            return None
+        acl_name = tmpl_lines[0].split()[-1]
+        sw_aces = [self.normalise_ace(x) for x in sw_lines[1:]]
+        tmpl_aces = [self.normalise_ace(x) for x in tmpl_lines[1:]]
+        if sw_aces == tmpl_aces:
+            return []
+        # NXOS sequences all entries (including remarks), IOS only permit and deny
+        if os_type == "nxos":
+            if not all(x.split()[0].isdigit() for x in sw_lines[1:]):
+                return None
+            sequenced = [True] * len(sw_aces)
+            cmds = [f"resequence ip access-list {acl_name} 10 10", tmpl_lines[0]]
+        else:
+            sequenced = [not x.startswith("remark") for x in sw_aces]
+            cmds = [f"ip access-list resequence {acl_name} 10 10", tmpl_lines[0]]
+        sw_seq, seq = ([], 0)
+        for each_sequenced in sequenced:
+            seq += 10 if each_sequenced else 0
+            sw_seq.append(seq if each_sequenced else None)
+
+        matched = self.align_aces(sw_aces, tmpl_aces)
+        sw_matched = dict(matched)
+        removed = [x for x in range(len(sw_aces)) if x not in sw_matched]
+        added = sorted(set(range(len(tmpl_aces))) - set(x[1] for x in matched))
+        # IOS remarks cant be sequenced and belong to the next ACE, so changes to or next to them need the full ACL
+        if os_type != "nxos":
+            for each_pos in removed:
+                if sequenced[each_pos] == False or (
+                    each_pos != 0 and sequenced[each_pos - 1] == False
+                ):
+                    return None
+            for each_pos in added:
+                if tmpl_aces[each_pos].startswith("remark") or (
+                    each_pos != 0 and tmpl_aces[each_pos - 1].startswith("remark")
+                ):
+                    return None
+        for each_pos in removed:
+            cmds.append(f" no {sw_seq[each_pos]}")
+        # Inserted ACEs go between the sequence numbers of the kept (matched) ACEs either side of them
+        tmpl_to_sw = {tmpl_pos: sw_pos for sw_pos, tmpl_pos in matched}
+        prev_seq, gap = (0, [])
+        for tmpl_pos in range(len(tmpl_aces) + 1):
+            sw_pos = tmpl_to_sw.get(tmpl_pos)
+            if tmpl_pos < len(tmpl_aces) and sw_pos == None:
+                gap.append(tmpl_pos)
+                continue
+            if tmpl_pos < len(tmpl_aces) and sw_seq[sw_pos] == None:
+                continue
+            if len(gap) != 0:
+                next_seq = sw_seq[sw_pos] if tmpl_pos < len(tmpl_aces) else None
+                gap_seq = self._insert_seq(prev_seq, next_seq, len(gap))
+                if gap_seq == None:
+                    return None
+                for each_seq, each_pos in zip(gap_seq, gap):
+                    cmds.append(f" {each_seq} {tmpl_aces[each_pos]}")
+                gap = []
+            if tmpl_pos < len(tmpl_aces):
+                prev_seq = sw_seq[sw_pos]
+        return cmds
+
+    # DELTA_CFG: Joins the delta cmds of each ACL, if not possible for an ACL it is deleted and re-added
+    def format_delta_config(self, task, config1, config2):
+        config = []
+        for del_cmd, each_acl1, each_acl2 in zip(
+            task.host["delete_cmd"], config1, config2
+        ):
+            delta = self.delta_cmds(task.host["os_type"], each_acl1, each_acl2)
+            if delta == None:
+                config.append(del_cmd)
+                config.extend(self.list_of_cmds([each_acl2]))
+            else:
+                config.extend(delta)
+        return config
+
     # ----------------------------------------------------------------------------
     # GENERATE: Creates config, show cmds, delete cmds and adds validate input data
     # ----------------------------------------------------------------------------
@@ -114,29 +325,159 @@ class NornirTask:
         acl: Dict[str, Any],
         val_acl: Dict[str, Any],
     ) -> None:
-        nr_inv = nr_inv.filter(F(name=list(nr_inv.inventory.hosts.keys())[0]))
-        config = nr_inv.run(
-            task=self.template_config,
-            os_type=os_type,
-            acl=acl,
-        )
+        # Rendered in-process (compiled template and memoised config) rather than a Nornir run against the first host
+        config = self.render.render(os_type, acl)
+        host = nr_inv.inventory.hosts[list(nr_inv.inventory.hosts.keys())[0]]
         # Prints the per-group config (what was rendered by template)
-        print_result(config, vars=["result"])
+        print_result(
+            Result(
+                host=host,
+                result=config,
+                name=f"Generating {os_type.upper()} configuration",
+            ),
+            vars=["result"],
+        )
         # Creates host_vars for config (list of each ACL) and commands for show and delete ACLs
         for grp in os_type.split("/"):
-            nr_inv.inventory.groups[grp]["config"] = (
-                config[list(config.keys())[0]][1].result.rstrip().split("\n\n")
-            )
+            nr_inv.inventory.groups[grp]["config"] = config.rstrip().split("\n\n")
             cmds = self.show_del_cmd(os_type, acl_name)
+            nr_inv.inventory.groups[grp]["os_type"] = os_type
+            nr_inv.inventory.groups[grp]["acl_name"] = acl_name
+            nr_inv.inventory.groups[grp]["marker_cmd"] = PLATFORMS[os_type][
+                "marker_cmd"
+            ]
             nr_inv.inventory.groups[grp]["show_cmd"] = cmds["show"]
             nr_inv.inventory.groups[grp]["delete_cmd"] = cmds["del"]
+            for each_cmd in ["checkpoint_cmd", "rollback_cmd", "push_file"]:
+                nr_inv.inventory.groups[grp][each_cmd] = PLATFORMS[os_type][each_cmd]
             # VAL: Adds prefix ACL to be used for the nornir-validate file
             nr_inv.inventory.groups[grp]["acl_val"] = {"groups": {grp: val_acl}}
 
+    # OVERLAY: Hosts with site or host overlays get their own config (host_var overrides the group_var), rendered once
+    # per distinct set of effective ACL_VARs so hosts at the same site share a render
+    def generate_overlay_config(
+        self, nr_inv: "Nornir", os_type: str, acl: Dict[str, Any]
+    ) -> None:
+        configs: Dict[tuple, List[str]] = {}
+        num_hosts = 0
+        for host in nr_inv.inventory.hosts.values():
+            # Removes the previous runs overlay (daemon keeps the inventory) so hosts without one use the group_var
+            host.data.pop("config", None)
+            host.data.pop("acl_val", None)
+            # Only the parsed input file (AclModel) can have overlays
+            if not isinstance(acl, AclModel):
+                continue
+            key = acl.overlay_key(host.get(OVERLAY_SITE_KEY), host.name)
+            if key == (None, None):
+                continue
+            effective = acl.effective(*key)
+            if key not in configs:
+                config = self.render.render(
+                    os_type, effective[PLATFORMS[os_type]["view"]]
+                )
+                configs[key] = config.rstrip().split("\n\n")
+            host.data["config"] = configs[key]
+            host.data["acl_val"] = {
+                "groups": {host.groups[0].name: effective["prefix"]}
+            }
+            num_hosts += 1
+        if num_hosts != 0:
+            self.rc.print(
+                f"[dark_blue][b]{os_type.upper()} overlays:[/b] {len(configs)} configurations rendered for "
+                f"{num_hosts} hosts with site or host overlays[/dark_blue]"
+            )
+
     # ----------------------------------------------------------------------------
     # DIFF: Finds the differences between current device ACLs and templated ACLs (- is removed, + is added)
     # ----------------------------------------------------------------------------
-    def get_difference(self, task: Task, sw_acl: List, tmpl_acl: List) -> Result:
+    # ACE: Normalises an ACE (removes sequence number and extra whitespace) so only real differences are found
+    def normalise_ace(self, ace: str) -> str:
+        ace_words = ace.split()
+        if len(ace_words) != 0 and ace_words[0].isdigit():
+            del ace_words[0]
+        return " ".join(ace_words)
+
+    # LIS: Longest increasing run of template positions (patience sorting), are the ACEs still in the same order
+    def _longest_in_order(self, pairs: List[tuple]) -> List[tuple]:
+        tails, tails_idx, prev = ([], [], [None] * len(pairs))
+        for idx, (sw_pos, tmpl_pos) in enumerate(pairs):
+            pile = bisect.bisect_left(tails, tmpl_pos)
+            if pile == len(tails):
+                tails.append(tmpl_pos)
+                tails_idx.append(idx)
+            else:
+                tails[pile] = tmpl_pos
+                tails_idx[pile] = idx
+            prev[idx] = tails_idx[pile - 1] if pile != 0 else None
+        in_order, idx = ([], tails_idx[-1] if tails_idx else None)
+        while idx != None:
+            in_order.append(pairs[idx])
+            idx = prev[idx]
+        return in_order[::-1]
+
+    # ALIGN: Matches ACEs using those unique to both ACLs as anchors (hashing), then fills the gaps between them
+    def align_aces(self, sw_aces: List[str], tmpl_aces: List[str]) -> List[tuple]:
+        matched: List[tuple] = []
+        gaps = [(0, len(sw_aces), 0, len(tmpl_aces))]
+        while gaps:
+            sw_start, sw_end, tmpl_start, tmpl_end = gaps.pop()
+            # Common ACEs at the start and end of the gap are matches
+            while (
+                sw_start < sw_end
+                and tmpl_start < tmpl_end
+                and sw_aces[sw_start] == tmpl_aces[tmpl_start]
+            ):
+                matched.append((sw_start, tmpl_start))
+                sw_start, tmpl_start = (sw_start + 1, tmpl_start + 1)
+            while (
+                sw_start < sw_end
+                and tmpl_start < tmpl_end
+                and sw_aces[sw_end - 1] == tmpl_aces[tmpl_end - 1]
+            ):
+                matched.append((sw_end - 1, tmpl_end - 1))
+                sw_end, tmpl_end = (sw_end - 1, tmpl_end - 1)
+            if sw_start == sw_end or tmpl_start == tmpl_end:
+                continue
+            # Anchors are ACEs that appear once in each ACL, only those still in the same order are kept
+            sw_count, tmpl_count = (defaultdict(list) for i in range(2))
+            for pos in range(sw_start, sw_end):
+                sw_count[sw_aces[pos]].append(pos)
+            for pos in range(tmpl_start, tmpl_end):
+                tmpl_count[tmpl_aces[pos]].append(pos)
+            pairs = [
+                (sw_pos[0], tmpl_count[ace][0])
+                for ace, sw_pos in sw_count.items()
+                if len(sw_pos) == 1 and len(tmpl_count.get(ace, [])) == 1
+            ]
+            anchors = self._longest_in_order(sorted(pairs))
+            if len(anchors) != 0:
+                matched.extend(anchors)
+                bounds = (
+                    [(sw_start - 1, tmpl_start - 1)] + anchors + [(sw_end, tmpl_end)]
+                )
+                for (sw_a, tmpl_a), (sw_b, tmpl_b) in zip(bounds, bounds[1:]):
+                    gaps.append((sw_a + 1, sw_b, tmpl_a + 1, tmpl_b))
+            # No unique ACEs (only duplicates such as remarks) so small gaps use a full sequence match
+            elif (sw_end - sw_start) * (tmpl_end - tmpl_start) <= 10000:
+                align = difflib.SequenceMatcher(
+                    None,
+                    sw_aces[sw_start:sw_end],
+                    tmpl_aces[tmpl_start:tmpl_end],
+                    False,
+                )
+                for sw_pos, tmpl_pos, size in align.get_matching_blocks():
+                    for offset in range(size):
+                        matched.append(
+                            (sw_start + sw_pos + offset, tmpl_start + tmpl_pos + offset)
+                        )
+        return sorted(matched)
+
+    # LINES: Device ACL lines with the extra spaces (after deny in ACLs) removed so are printed the same as template
+    def _sw_lines(self, sw_acl: str) -> List[str]:
+        return sw_acl.lstrip().replace("   ", " ").replace(" \n", "\n").splitlines()
+
+    # DIFF: Anything not matched is removed from the device ACL or added from the template ACL
+    def diff_acl(self, sw_acl: List, tmpl_acl: List) -> List[str]:
         acl_diff: List = []
 
         for each_sw_acl, each_tmpl_acl in zip(sw_acl, tmpl_acl):
@@ -145,27 +486,32 @@ class NornirTask:
                 tmp_diff_list = [each_tmpl_acl.splitlines()[0]]
             else:  # ASAs dont have ACL name
                 tmp_diff_list = [""]
-            # Creates a list of common elements between and differences between the ACLs (replace removes '  ' after deny in ACLs)
-            diff = difflib.ndiff(
-                each_sw_acl.lstrip()
-                .replace("   ", " ")
-                .replace(" \n", "\n")
-                .splitlines(),
-                each_tmpl_acl.lstrip().splitlines(),
-            )
-            diff = list(diff)
+            sw_lines = self._sw_lines(each_sw_acl)
+            tmpl_lines = each_tmpl_acl.lstrip().splitlines()
+            sw_aces = [self.normalise_ace(x) for x in sw_lines]
+            tmpl_aces = [self.normalise_ace(x) for x in tmpl_lines]
+            if sw_aces == tmpl_aces:
+                continue
+            # A moved ACE is not in order so is removed and re-added (ACE order matters in an ACL)
+            matched = self.align_aces(sw_aces, tmpl_aces)
+            sw_matched = set(x[0] for x in matched)
+            tmpl_matched = set(x[1] for x in matched)
+            removed = [
+                "- " + x for pos, x in enumerate(sw_lines) if pos not in sw_matched
+            ]
+            added = [
+                "+ " + x for pos, x in enumerate(tmpl_lines) if pos not in tmpl_matched
+            ]
             # Removes duplicate if ACL does not already exist
-            if "+ " + "".join(tmp_diff_list) == diff[0]:
+            if len(removed) == 0 and "+ " + "".join(tmp_diff_list) == added[0]:
                 del tmp_diff_list[0]
-            # Only takes the differences (- or +, separate loops so can group them) and removes new lines (n)
-            for each_diff in diff:
-                if each_diff.startswith("- "):
-                    tmp_diff_list.append(each_diff.replace("\n", ""))
-            for each_diff in diff:
-                if each_diff.startswith("+ "):
-                    tmp_diff_list.append(each_diff.replace("\n", ""))
+            tmp_diff_list.extend(removed + added)
             if len(tmp_diff_list) != 1:
                 acl_diff.append(("\n").join(tmp_diff_list) + "\n")
+        return acl_diff
+
+    def get_difference(self, task: Task, sw_acl: List, tmpl_acl: List) -> Result:
+        acl_diff = self.diff_acl(sw_acl, tmpl_acl)
         if len(acl_diff) == 0:
             return Result(
                 host=task.host, result="✅  No differences between configurations"
@@ -173,69 +519,312 @@ class NornirTask:
         elif len(acl_diff) != 0:
             return Result(host=task.host, result="\n".join(acl_diff))
 
+    # ----------------------------------------------------------------------------
+    # PROBE: Tests SSH login (banner and auth) from a second session whilst the config session is still open
+    # ----------------------------------------------------------------------------
+    # LOGIN: Opens a new SSH transport and authenticates, socket and transport are always closed
+    def _ssh_login(self, host: "Host", timeout: float) -> None:
+        sock = socket.create_connection(
+            (host.hostname, host.port or 22), timeout=timeout
+        )
+        try:
+            transport = paramiko.Transport(sock)
+            try:
+                transport.banner_timeout = timeout
+                transport.auth_timeout = timeout
+                transport.start_client(timeout=timeout)
+                transport.auth_password(host.username, host.password)
+                if not transport.is_authenticated():
+                    raise paramiko.AuthenticationException("Authentication failed")
+            finally:
+                transport.close()
+        finally:
+            sock.close()
+
+    # SSH: Retries the login (with random jitter) until it works, retries are used up or the deadline is hit
+    def ssh_probe(self, task: Task) -> Result:
+        start = time.monotonic()
+        deadline = start + self.ssh_probe_cfg["timeout"]
+        attempt, error = 0, "deadline exceeded"
+        while attempt <= self.ssh_probe_cfg["retries"]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            attempt += 1
+            try:
+                self._ssh_login(task.host, remaining)
+                return Result(
+                    host=task.host,
+                    result=dict(
+                        ssh=True,
+                        attempts=attempt,
+                        latency=round(time.monotonic() - start, 3),
+                    ),
+                )
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt <= self.ssh_probe_cfg["retries"]:
+                jitter = random.uniform(0, self.ssh_probe_cfg["jitter"])
+                time.sleep(max(min(jitter, deadline - time.monotonic()), 0))
+        return Result(
+            host=task.host,
+            result=dict(
+                ssh=False,
+                attempts=attempt,
+                latency=round(time.monotonic() - start, 3),
+                error=error,
+            ),
+        )
+
     # ----------------------------------------------------------------------------
     # APPLY: Applies config, possible rollback is dependant on if it fails.
     # ----------------------------------------------------------------------------
-    def apply_acl(self, task: Task, acl_config: List, backup_config: List) -> Result:
-        # Manually open the connection, all tasks are run under this open connection so can rollback in same conn
+    # CHECKPOINT: Saves the running config on-box, questions (IOS copy) are answered with the default. Only the last
+    # cmd output is checked as the first NXOS cmd removes the last runs checkpoint (errors if there isnt one)
+    def _send_answered(self, task: Task, cmd: str) -> str:
+        output = task.run(
+            task=netmiko_send_command,
+            command_string=cmd,
+            expect_string=CMD_PROMPT,
+            severity_level=logging.DEBUG,
+        ).result
+        answers = 0
+        while re.search(CMD_QUESTION, output) and answers < 3:
+            output = task.run(
+                task=netmiko_send_command,
+                command_string="\n",
+                expect_string=CMD_PROMPT,
+                severity_level=logging.DEBUG,
+            ).result
+            answers += 1
+        return output
+
+    # OPT-IN: Groups can enable (or disable) the checkpoint with checkpoint in their group data
+    def use_checkpoint(self, host: "Host") -> bool:
+        checkpoint = host.get("checkpoint")
+        return self.checkpoint if checkpoint == None else checkpoint == True
+
+    def checkpoint_acl(self, task: Task) -> Result:
+        for each_cmd in task.host["checkpoint_cmd"]:
+            output = self._send_answered(task, each_cmd)
+        saved = re.search(CMD_ERROR, output, re.I | re.M) == None
+        return Result(host=task.host, result=dict(checkpoint=saved, output=output))
+
+    # ROLLBACK: One cmd back to the checkpoint, if that fails (or there is no checkpoint) the backup config is applied
+    def rollback_acl(self, task: Task, backup_config: List, checkpoint: bool) -> Result:
+        if checkpoint == True:
+            try:
+                output = task.run(
+                    task=netmiko_send_command,
+                    command_string=task.host["rollback_cmd"],
+                    read_timeout=120,
+                    severity_level=logging.DEBUG,
+                ).result
+                if re.search(CMD_ERROR, output, re.I | re.M) == None:
+                    return Result(host=task.host, result="checkpoint")
+            except Exception:
+                pass
         task.run(
             task=netmiko_send_config,
             dry_run=False,
-            config_commands=acl_config,
+            config_commands=backup_config,
             severity_level=logging.DEBUG,
         )
-        # Test if can still connect over SSH, if cant rollback the change
+        return Result(host=task.host, result="backup_config")
+
+    # ----------------------------------------------------------------------------
+    # PUSH: Strategies to push the config, line by line (each line echo verified), bulk paste or file copy
+    # ----------------------------------------------------------------------------
+    # LINE: Each cmd is sent and its echo waited for before the next (netmiko default)
+    def push_line(self, task: Task, config: List) -> Result:
+        output = task.run(
+            task=netmiko_send_config,
+            dry_run=False,
+            config_commands=config,
+            severity_level=logging.DEBUG,
+        ).result
+        return Result(host=task.host, result=output)
+
+    # BULK: All cmds pasted without waiting for each echo, the whole output is checked for rejected lines at the end
+    def push_bulk(self, task: Task, config: List) -> Result:
+        output = task.run(
+            task=netmiko_send_config,
+            dry_run=False,
+            config_commands=config,
+            cmd_verify=False,
+            severity_level=logging.DEBUG,
+        ).result
+        failed = re.search(PUSH_ERROR, output, re.M) != None
+        return Result(host=task.host, failed=failed, result=output)
+
+    # FILE: Config copied (SCP) to the device file system and merged into the running config with one copy cmd
+    def push_file(self, task: Task, config: List) -> Result:
+        push_file = task.host["push_file"]
+        with tempfile.NamedTemporaryFile("w", suffix=".cfg", delete=False) as tmp:
+            tmp.write("\n".join(config + ["end"]) + "\n")
+        try:
+            task.run(
+                task=netmiko_file_transfer,
+                source_file=tmp.name,
+                dest_file=push_file["dest_file"],
+                file_system=push_file["file_system"],
+                direction="put",
+                overwrite_file=True,
+                verify_file=False,
+                severity_level=logging.DEBUG,
+            )
+        finally:
+            os.remove(tmp.name)
+        output = self._send_answered(task, push_file["copy_cmd"])
+        failed = re.search(PUSH_ERROR, output, re.M) != None
+        return Result(host=task.host, failed=failed, result=output)
+
+    def apply_acl(self, task: Task, acl_config: List, backup_config: List) -> Result:
+        strategy = task.host.get("push_strategy") or self.push_strategy
+        if strategy not in self.push_strategies:
+            return Result(
+                host=task.host,
+                failed=True,
+                result=f"❌  Unknown push_strategy '{strategy}', must be one of {', '.join(self.push_strategies)}",
+            )
+        # A checkpoint the device rejects (no flash space, no privilege) falls back to the rollback config
+        checkpoint = False
+        if self.use_checkpoint(task.host) and task.host["checkpoint_cmd"] != None:
+            checkpoint = task.run(
+                task=self.checkpoint_acl, severity_level=logging.DEBUG
+            ).result["checkpoint"]
+        # Manually open the connection, all tasks are run under this open connection so can rollback in same conn.
+        # Lines rejected by a bulk or file push are rolled back the same as losing SSH access
         try:
-            test_ssh = socket.socket()
-            test_ssh.connect((task.host.hostname, 22))
+            task.run(
+                name="push_config",
+                task=self.push_strategies[strategy],
+                config=acl_config,
+                severity_level=logging.DEBUG,
+            )
+            pushed = True
+        except NornirSubTaskError:
+            pushed = False
+        # Test if can still login over SSH (from a new session), if cant rollback the change
+        if pushed == True:
+            probe = task.run(
+                name="SSH login test", task=self.ssh_probe, severity_level=logging.DEBUG
+            )
+        if pushed == True and probe.result["ssh"] == True:
             return Result(
                 host=task.host, changed=True, result="✅  ACLs successfully updated"
             )
-        except:
+        else:
             task.run(
-                task=netmiko_send_config,
-                dry_run=False,
-                config_commands=backup_config,
+                task=self.rollback_acl,
+                backup_config=backup_config,
+                checkpoint=checkpoint,
                 severity_level=logging.DEBUG,
             )
+            reason = "it broke SSH access" if pushed == True else "the push failed"
             return Result(
                 host=task.host,
                 failed=True,
-                result="❌  ACL update rolled back as it broke SSH access",
+                result=f"❌  ACL update rolled back as {reason}",
             )
 
     # ----------------------------------------------------------------------------
-    # 1. TMPL_ENGINE: Engine to create device configs from templates
+    # VERIFY: Checks the applied ACLs locally from one show of them over the same session (rather than nornir-validate)
     # ----------------------------------------------------------------------------
-    def generate_acl_engine(self, nr_inv: "Nornir", acl: Dict[str, Any]) -> "Nornir":
-        # Get all the members (hosts) of each group
-        iosxe_nr = nr_inv.filter(F(groups__any=["ios", "iosxe"]))
-        nxos_nr = nr_inv.filter(F(groups__any=["nxos"]))
-        asa_nr = nr_inv.filter(F(groups__any=["asa"]))
-
-        # 1a. IOS: Create config (runs against first host in group), print to screen and assign as a group_var
-        if len(iosxe_nr.inventory.hosts) != 0:
-            self.generate_acl_config(
-                iosxe_nr, "ios/iosxe", acl["name"], acl["wcard"], acl["prefix"]
+    # REPORT: ACEs (normalised the same as the diff) missing from or extra on the device, an ACE out of order is both
+    def compliance_report(self, sw_acl: List, tmpl_acl: List) -> Dict[str, Any]:
+        report: Dict[str, Any] = dict(complies=True, acl={})
+        for each_sw_acl, each_tmpl_acl in zip(sw_acl, tmpl_acl):
+            tmpl_lines = each_tmpl_acl.lstrip().splitlines()
+            # ACL name, ASAs dont have ACLs so is the ssh or http cmd
+            if "access-list" in tmpl_lines[0]:
+                acl_name, tmpl_lines = (tmpl_lines[0].split()[-1], tmpl_lines[1:])
+            else:
+                acl_name = tmpl_lines[0].split()[0] if tmpl_lines else ""
+            sw_aces = [
+                self.normalise_ace(x)
+                for x in self._sw_lines(each_sw_acl)
+                if "access-list" not in x
+            ]
+            tmpl_aces = [self.normalise_ace(x) for x in tmpl_lines]
+            matched = self.align_aces(sw_aces, tmpl_aces)
+            sw_matched = set(x[0] for x in matched)
+            tmpl_matched = set(x[1] for x in matched)
+            missing = [x for pos, x in enumerate(tmpl_aces) if pos not in tmpl_matched]
+            extra = [x for pos, x in enumerate(sw_aces) if pos not in sw_matched]
+            complies = len(missing) == 0 and len(extra) == 0
+            report["acl"][acl_name] = dict(
+                complies=complies, missing=missing, extra=extra
             )
-        # 1b. NXOS: Create config (runs against first host in group), print to screen and assign as a group_var
-        if len(nxos_nr.inventory.hosts) != 0:
-            self.generate_acl_config(
-                nxos_nr, "nxos", acl["name"], acl["prefix"], acl["prefix"]
+            report["complies"] = report["complies"] and complies
+        return report
+
+    def verify_acl(self, task: Task) -> Result:
+        show_output = []
+        for each_cmd in task.host["show_cmd"]:
+            show_output.append(
+                task.run(
+                    task=netmiko_send_command,
+                    command_string=each_cmd,
+                    severity_level=logging.DEBUG,
+                ).result
             )
-        # 1c. ASA: Create config (runs against first host in group), print to screen and assign as a group_var
-        if len(asa_nr.inventory.hosts) != 0:
-            self.generate_acl_config(
-                asa_nr, "asa", acl["name"], acl["mask"], acl["prefix"]
+        report = self.compliance_report(
+            self.acl_state(task, show_output), task.host["config"]
+        )
+        return Result(host=task.host, failed=not report["complies"], result=report)
+
+    # ----------------------------------------------------------------------------
+    # 1. TMPL_ENGINE: Engine to create device configs from templates
+    # ----------------------------------------------------------------------------
+    # PARTITION: One pass over the inventory putting each host in the platform of its groups, cached per inventory
+    def partition_inventory(self, nr_inv: "Nornir") -> Dict[str, "Nornir"]:
+        # Holds the hosts object (rather than its id) so it cant be reused by another inventory
+        cached = self.platform_cache
+        if cached.get("hosts") is nr_inv.inventory.hosts:
+            if cached["num_hosts"] == len(nr_inv.inventory.hosts):
+                return cached["nr_inv"]
+        buckets: Dict[str, Dict[str, Host]] = {x: {} for x in PLATFORMS}
+        for name, host in nr_inv.inventory.hosts.items():
+            for each_grp in host.groups:
+                if each_grp.name in GROUP_PLATFORM:
+                    buckets[GROUP_PLATFORM[each_grp.name]][name] = host
+        # Same as nr_inv.filter (shares config, runner and processors) without a filter scan per platform
+        platform_nr = {}
+        for os_type, hosts in buckets.items():
+            platform_nr[os_type] = Nornir(**nr_inv.__dict__)
+            platform_nr[os_type].inventory = Inventory(
+                hosts=Hosts(hosts),
+                groups=nr_inv.inventory.groups,
+                defaults=nr_inv.inventory.defaults,
             )
-        # 1d. FAILFAST: If no config generated is nothing to configure on devices
-        if (
-            len(iosxe_nr.inventory.hosts) == 0
-            and len(nxos_nr.inventory.hosts) == 0
-            and len(asa_nr.inventory.hosts) == 0
-        ):
+        self.platform_cache = dict(
+            hosts=nr_inv.inventory.hosts,
+            num_hosts=len(nr_inv.inventory.hosts),
+            nr_inv=platform_nr,
+        )
+        return platform_nr
+
+    def generate_acl_engine(self, nr_inv: "Nornir", acl: Dict[str, Any]) -> "Nornir":
+        # 1a. Get all the members (hosts) of each platform
+        platform_nr = self.partition_inventory(nr_inv)
+        # 1b. Create config (once per platform), print to screen and assign as a group_var
+        for os_type, each_nr in platform_nr.items():
+            if len(each_nr.inventory.hosts) != 0:
+                self.generate_acl_config(
+                    each_nr,
+                    os_type,
+                    acl["name"],
+                    acl[PLATFORMS[os_type]["view"]],
+                    acl["prefix"],
+                )
+                self.generate_overlay_config(each_nr, os_type, acl)
+        # 1c. FAILFAST: If no config generated is nothing to configure on devices
+        if all(len(x.inventory.hosts) == 0 for x in platform_nr.values()):
+            groups = list(GROUP_PLATFORM.keys())
             self.rc.print(
-                ":x: Error: No config generated as are no objects in groups [i]ios, iosxe, nxos[/i] or [i]asa[/i]"
+                f":x: Error: No config generated as are no objects in groups [i]{', '.join(groups[:-1])}[/i] or "
+                f"[i]{groups[-1]}[/i]"
             )
             sys.exit(1)
         else:
@@ -244,16 +833,44 @@ class NornirTask:
     # ----------------------------------------------------------------------------
     # 2. TASK_ENGINE: Engine to call and run nornir sub-tasks
     # ----------------------------------------------------------------------------
+    # CHANGE: ACL and rollback config from the backup, only changed ACEs (ASA doesnt use sequence numbers so always full
+    # cfg) or delete cmds before the ACLs (ASA changes delete cmds as no ACLs)
+    def change_config(self, task: Task, backup_acl_config: List) -> tuple:
+        if self.delta_apply == True and task.host["delete_cmd"] != None:
+            acl_config = self.format_delta_config(
+                task, backup_acl_config, task.host["config"]
+            )
+            backup_config = self.format_delta_config(
+                task, task.host["config"], backup_acl_config
+            )
+        else:
+            acl_config = self.format_config(
+                task, backup_acl_config, task.host["config"]
+            )
+            backup_config = self.format_config(
+                task, task.host["config"], backup_acl_config
+            )
+        return (acl_config, backup_config)
+
     def task_engine(self, task: Task, dry_run: bool) -> Result:
+        task.run(task=self.netmiko_connect, severity_level=logging.DEBUG)
+        # 2. CACHE: Skips backup and diff if device config and rendered ACLs are unchanged since last in-sync
+        if self.change_cache != None:
+            marker = task.run(
+                name="Config change marker",
+                task=netmiko_send_command,
+                command_string=task.host["marker_cmd"],
+                severity_level=logging.DEBUG,
+            ).result
+            if self.change_cache.in_sync(task.host.name, marker, task.host["config"]):
+                return Result(
+                    host=task.host,
+                    result="✅  No differences between configurations (unchanged since last run)",
+                )
         # 2a. BACKUP: Gathers a backup of the current ACL configuration (ASA doesn't use ACLs so change cmd)
         result = task.run(task=self.backup_acl, show_cmd=task.host["show_cmd"])
         # Creates a list with each element being an ACL
-        backup_acl_config = []
-        for each_acl in result[1:]:
-            backup_acl_config.append(each_acl.result)
-        # ASA needs to remove non access based info from ssh and http cmds
-        if task.host.dict()["groups"][0] == "asa":
-            backup_acl_config = self.format_asa(backup_acl_config)
+        backup_acl_config = self.acl_state(task, [x.result for x in result[1:]])
 
         # 2b. DIFF: Splits into a list of ACLs and uses them to gather differences
         acl_diff = task.run(
@@ -262,31 +879,107 @@ class NornirTask:
             sw_acl=backup_acl_config,
             tmpl_acl=task.host["config"],
         )
+        # Only hosts with no differences are cached as changes need checking on the next run
+        if self.change_cache != None:
+            self.change_cache.update(
+                task.host.name,
+                marker,
+                task.host["config"],
+                acl_diff.result == "✅  No differences between configurations",
+            )
 
         # 2c. APPLY: If Not a dry run and are differences apply the config
         if (
             dry_run == False
             and acl_diff.result != "✅  No differences between configurations"
         ):
-            # Adds delete cmds before acl and backup cfg (ASA changes delete cmds as no ACLs)
-            acl_config = self.format_config(
-                task, backup_acl_config, task.host["config"]
-            )
-            backup_config = self.format_config(
-                task, task.host["config"], backup_acl_config
-            )
+            acl_config, backup_config = self.change_config(task, backup_acl_config)
             task.run(
                 task=self.apply_acl,
                 acl_config=acl_config,
                 backup_config=backup_config,
             )
-            # 2d. VALIDATE: Runs nornir-validate to validate the ACL
-            task.run(task=validate_task, input_data=task.host["acl_val"])
+            # 2d. VALIDATE: Checks the ACLs locally over the same session or runs nornir-validate (imported when used)
+            if self.verify == "local":
+                task.run(task=self.verify_acl)
+            else:
+                from nornir_validate.nr_val import validate_task
+
+                task.run(task=validate_task, input_data=task.host["acl_val"])
+
+    # ----------------------------------------------------------------------------
+    # WAVES: Staged rollout, changes a canary and then growing waves of hosts and halts if too many fail
+    # ----------------------------------------------------------------------------
+    # SPLIT: Splits hosts into waves of the specified sizes, any remaining hosts are the last wave
+    def get_waves(self, hosts: List[str], waves: List[int]) -> List[List[str]]:
+        host_waves, start = ([], 0)
+        for each_size in waves:
+            if start >= len(hosts):
+                break
+            host_waves.append(hosts[start : start + each_size])
+            start += each_size
+        if start < len(hosts):
+            host_waves.append(hosts[start:])
+        return host_waves
+
+    # FAILED: Hosts whose change was rolled back or failed validation (connection errors are not counted)
+    def failed_change_hosts(self, result: "AggregatedResult") -> List[str]:
+        failed_hosts = []
+        for host, multi_result in result.items():
+            for each_result in multi_result:
+                if each_result.name in ["apply_acl", "validate_task", "verify_acl"]:
+                    if each_result.failed == True:
+                        failed_hosts.append(host)
+                        break
+        return failed_hosts
+
+    # ENGINE: Runs each wave and stops the rollout if the failure rate of a wave is above the halt_rate
+    def wave_engine(self, nr_inv: "Nornir", dry_run: bool) -> Dict[str, Any]:
+        waves = self.get_waves(
+            list(nr_inv.inventory.hosts.keys()), self.rollout["waves"]
+        )
+        completed: List[int] = []
+        for wave_num, each_wave in enumerate(waves, 1):
+            self.rc.print(
+                f"[dark_blue][b]Wave {wave_num}/{len(waves)}:[/b] Running against {len(each_wave)} hosts[/dark_blue]"
+            )
+            result = nr_inv.filter(F(name__in=each_wave)).run(
+                task=self.task_engine, dry_run=dry_run
+            )
+            failed_hosts = self.failed_change_hosts(result)
+            completed.append(wave_num)
+            if len(failed_hosts) / len(each_wave) > self.rollout["halt_rate"]:
+                not_run = sum(len(x) for x in waves[wave_num:])
+                self.rc.print(
+                    f":x: [b]RolloutHalted:[/b] Wave {wave_num} had {len(failed_hosts)}/{len(each_wave)} hosts rolled back or "
+                    f"fail validation [i]({', '.join(failed_hosts)})[/i], {not_run} hosts have not been changed"
+                )
+                return dict(completed=completed, halted=True, failed=failed_hosts)
+            self.rc.print(
+                f":white_check_mark: Wave {wave_num}/{len(waves)} completed with {len(failed_hosts)} failed changes"
+            )
+        return dict(completed=completed, halted=False, failed=[])
 
     # ----------------------------------------------------------------------------
     # 3. CFG ENGINE: Engine to run main-task to apply config
     # ----------------------------------------------------------------------------
-    def config_engine(self, nr_inv: "Nornir", dry_run: bool) -> Result:
+    # RESUME: Only hosts not completed in the journaled run (unfinished, failed or their ACLs have since changed)
+    def resume_hosts(self, nr_inv: "Nornir", dry_run: bool) -> "Nornir":
+        if self.journal == None:
+            self.rc.print(
+                ":x: Error: Cannot resume as the journal is disabled (journal_file is None)"
+            )
+            sys.exit(1)
+        completed = set(self.journal.completed(nr_inv, dry_run))
+        self.rc.print(
+            f"[dark_blue][b]Resuming:[/b] Skipping {len(completed)} hosts completed in the last run, "
+            f"{len(nr_inv.inventory.hosts) - len(completed)} hosts remaining[/dark_blue]"
+        )
+        return nr_inv.filter(filter_func=lambda host: host.name not in completed)
+
+    def config_engine(
+        self, nr_inv: "Nornir", dry_run: bool, resume: bool = False
+    ) -> Result:
         if dry_run == True:
             self.rc.print(
                 "[dark_blue][b] **** ⚠️  DRY_RUN=TRUE:[/b] This is the configuration that would have been applied [b]****[/b][/dark_blue]"
@@ -295,5 +988,46 @@ class NornirTask:
             self.rc.print(
                 "[dark_blue][b] **** ⚠️  DRY_RUN=FALSE:[/b] If there are ACL differences the configuration will be applied [b]****[/b][/dark_blue]"
             )
-        result = nr_inv.run(task=self.task_engine, dry_run=dry_run)
-        print_result(result, vars=["result"])
+        # Each hosts outcome is printed (and written to results_file) as soon as it finishes
+        stream = StreamResult(self.rc, "task_engine", self.results_file)
+        processors = [stream]
+        # Times each phase (connect, backup, diff, apply, etc) per host and the bytes sent/received
+        if self.metrics != None:
+            metrics = PhaseMetrics(self.rc, "task_engine", **self.metrics)
+            processors.append(metrics)
+        # Only applies are journaled so a dry run never wipes the resume state of a failed apply. Resumed runs keep
+        # appending to the journal, otherwise an apply starts a new journal
+        if self.journal != None and resume == True:
+            nr_inv = self.resume_hosts(nr_inv, dry_run)
+        if self.journal != None and dry_run == False:
+            if resume == False:
+                self.journal.new_run()
+            processors.append(self.journal)
+        nr_inv = nr_inv.with_processors(list(nr_inv.processors) + processors)
+        # Only stage the rollout if config is being applied, dry_run is run against all hosts at once
+        if dry_run == False and len(self.rollout["waves"]) != 0:
+            rollout = self.wave_engine(nr_inv, dry_run)
+        else:
+            rollout = None
+            nr_inv.run(task=self.task_engine, dry_run=dry_run)
+        stream.print_summary(dry_run)
+        self.summary = stream.summary
+        if self.metrics != None:
+            metrics.print_stats(metrics.export())
+        self.runner_stats(nr_inv)
+        self.save_cache()
+        return rollout
+
+    # CACHE: Saves the in-sync hosts change markers for the next run
+    def save_cache(self) -> None:
+        if self.change_cache != None:
+            self.change_cache.save()
+
+    # STATS: Adaptive runner reports the concurrency it settled on and the throughput achieved
+    def runner_stats(self, nr_inv: "Nornir") -> None:
+        if hasattr(nr_inv.runner, "stats"):
+            stats = nr_inv.runner.stats()
+            self.rc.print(
+                f"[dark_blue][b]Runner:[/b] {stats['completed']} hosts at {stats['throughput']} hosts/min, "
+                f"concurrency {stats['concurrency']} ({stats['congested']} hosts slow or timed out)[/dark_blue]"
+            )
@@ -0,0 +1,188 @@
+# End-to-end benchmark of config_engine against the device emulator, reports devices per minute.
+# Run from the repo root: python -m test.benchmark_emulator --ios 500 --nxos 250 --asa 250 --latency 0.05 -a
+# Time per push strategy: python -m test.benchmark_emulator --ios 20 --nxos 10 --asa 10 --aces 500 --push line bulk file
+# Asyncio runner (asyncssh sessions, workers is max_sessions): python -m test.benchmark_emulator --ios 2000 --asyncio
+from typing import Any, Dict, List
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from rich.console import Console
+from nornir import InitNornir
+
+from acl_model import AclModel
+from nornir_tasks import NornirTask
+from nornir_runner import AdaptiveRunner
+from .device_emulator import DeviceEmulator
+
+test_inventory = os.path.join(os.path.dirname(__file__), "test_inventory")
+repo_dir = os.path.dirname(os.path.dirname(__file__))
+
+
+# ----------------------------------------------------------------------------
+# VARS: Starting device config and ACLs (always permit localhost so the emulator doesnt lock the benchmark out)
+# ----------------------------------------------------------------------------
+def acl_input(num_aces: int, seed: int) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    aces = [{"remark": "BENCHMARK"}, {"permit": "127.0.0.0/8"}]
+    # Unique networks as devices (ASA) dont keep duplicate ACEs
+    for each_net in rnd.sample(range(65536), num_aces):
+        aces.append({"permit": f"10.{each_net // 256}.{each_net % 256}.0/24"})
+    aces.append({"deny": "any"})
+    return dict(
+        acl=[
+            dict(name="SSH_ACCESS", ace=aces),
+            dict(name="SNMP_ACCESS", ace=aces[1:]),
+        ]
+    )
+
+
+def base_config(emulator: DeviceEmulator) -> None:
+    emulator.load_config(
+        "ios",
+        [
+            "ip access-list extended SSH_ACCESS",
+            " permit ip 127.0.0.0 0.255.255.255 any",
+            " deny ip any any",
+        ],
+    )
+    emulator.load_config(
+        "nxos", ["ip access-list SSH_ACCESS", "  10 permit ip 127.0.0.0/8 any"]
+    )
+    emulator.load_config("asa", ["ssh 127.0.0.0 255.0.0.0 mgmt"])
+
+
+# INVENTORY: Nornir inventory of the emulated devices (groups are the same as the test inventory)
+def emulator_inventory(
+    emulator: DeviceEmulator, inv_dir: str, runner: Dict[str, Any]
+) -> "Nornir":
+    emulator.write_inventory(os.path.join(inv_dir, "hosts.yml"))
+    shutil.copy(os.path.join(test_inventory, "groups.yml"), inv_dir)
+    nr_inv = InitNornir(
+        inventory={
+            "plugin": "SimpleInventory",
+            "options": {
+                "host_file": os.path.join(inv_dir, "hosts.yml"),
+                "group_file": os.path.join(inv_dir, "groups.yml"),
+            },
+        },
+        runner=runner,
+        logging={"enabled": False},
+    )
+    nr_inv.inventory.defaults.username = emulator.username
+    nr_inv.inventory.defaults.password = emulator.password
+    return nr_inv
+
+
+# ----------------------------------------------------------------------------
+# BENCHMARK: Renders the ACLs and runs config_engine (dry_run or apply) against all emulated devices
+# ----------------------------------------------------------------------------
+def run_benchmark(
+    emulator: DeviceEmulator,
+    nr_inv: "Nornir",
+    nr_task: NornirTask,
+    num_aces: int,
+    dry_run: bool,
+    seed: int = 1,
+) -> Dict[str, Any]:
+    nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(num_aces, seed)))
+    start = time.monotonic()
+    nr_task.config_engine(nr_inv, dry_run)
+    elapsed = time.monotonic() - start
+    return dict(
+        devices=len(nr_inv.inventory.hosts),
+        elapsed=round(elapsed, 2),
+        devices_per_min=round(len(nr_inv.inventory.hosts) / elapsed * 60, 1),
+        in_sync=len(nr_task.summary.get("in_sync", [])),
+        changed=len(nr_task.summary.get("changed", [])),
+        failed=len(nr_task.summary.get("failed", [])),
+        logins=sum(x.logins for x in emulator.devices.values()),
+        refused=sum(x.refused for x in emulator.devices.values()),
+    )
+
+
+# ASYNCIO: Imported when used as needs asyncssh
+def asyncio_runner(nr_task: NornirTask, max_sessions: int) -> Any:
+    from nornir_async import AsyncioRunner
+
+    return AsyncioRunner(nr_task, max_sessions=max_sessions)
+
+
+# PUSH: Full apply (whole ACLs pushed) of new ACLs with each push strategy, set as group data the same as groups.yml
+def push_benchmark(
+    emulator: DeviceEmulator,
+    nr_inv: "Nornir",
+    num_aces: int,
+    strategies: List[str],
+    max_sessions: int = None,
+) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for seed, each_strategy in enumerate(strategies, start=1):
+        for each_grp in ["ios", "iosxe", "nxos", "asa"]:
+            nr_inv.inventory.groups[each_grp].data["push_strategy"] = each_strategy
+        nr_task = NornirTask(batch_backup=True, delta_apply=False, verify="local")
+        each_nr = nr_inv
+        if max_sessions != None:
+            each_nr = nr_inv.with_runner(asyncio_runner(nr_task, max_sessions))
+        results[each_strategy] = run_benchmark(
+            emulator, each_nr, nr_task, num_aces, False, seed
+        )
+    return results
+
+
+def main() -> None:
+    args = argparse.ArgumentParser()
+    args.add_argument("--ios", type=int, default=100, help="Number of IOS devices")
+    args.add_argument("--nxos", type=int, default=50, help="Number of NXOS devices")
+    args.add_argument("--asa", type=int, default=50, help="Number of ASA devices")
+    args.add_argument("--aces", type=int, default=20, help="ACEs per ACL")
+    args.add_argument(
+        "--latency", type=float, default=0.0, help="Device delay (secs) per cmd"
+    )
+    args.add_argument("--workers", type=int, default=100, help="Runner workers")
+    args.add_argument("--adaptive", action="store_true", help="Use AdaptiveRunner")
+    args.add_argument("--asyncio", action="store_true", help="Use AsyncioRunner")
+    args.add_argument("--full", action="store_true", help="Disable delta_apply")
+    args.add_argument(
+        "-a", "--apply", action="store_false", help="Apply rather than dry_run"
+    )
+    args.add_argument(
+        "--push", nargs="+", help="Apply with each push strategy (line, bulk, file)"
+    )
+    args = args.parse_args()
+
+    rc = Console()
+    os.chdir(repo_dir)
+    emulator = DeviceEmulator(
+        dict(ios=args.ios, nxos=args.nxos, asa=args.asa), latency=args.latency
+    ).start()
+    base_config(emulator)
+    with tempfile.TemporaryDirectory() as inv_dir:
+        runner = dict(plugin="threaded", options=dict(num_workers=args.workers))
+        nr_inv = emulator_inventory(emulator, inv_dir, runner)
+        if args.adaptive:
+            nr_inv = nr_inv.with_runner(AdaptiveRunner(max_workers=args.workers))
+        nr_task = NornirTask(
+            batch_backup=True,
+            delta_apply=not args.full,
+            results_file=os.path.join(inv_dir, "results.jsonl"),
+        )
+        max_sessions = args.workers if args.asyncio else None
+        if args.asyncio:
+            nr_inv = nr_inv.with_runner(asyncio_runner(nr_task, args.workers))
+        if args.push:
+            result = push_benchmark(
+                emulator, nr_inv, args.aces, args.push, max_sessions
+            )
+        else:
+            result = run_benchmark(emulator, nr_inv, nr_task, args.aces, args.apply)
+        nr_inv.close_connections()
+    emulator.stop()
+    rc.print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,660 @@
+# Local SSH emulator of the IOS/IOS-XE, NXOS and ASA CLI used by this tool. Each emulated device listens on its own
+# localhost port with its own running config (ACLs, vty access-class or ASA ssh/http cmds). New SSH sessions are refused
+# if the device ACL does not permit the client address so the post-change SSH login test and rollback behave as on a
+# real device.
+from typing import Any, Dict, List
+import re
+import copy
+import time
+import socket
+import hashlib
+import logging
+import ipaddress
+import selectors
+import threading
+from datetime import datetime
+
+import paramiko
+import yaml
+
+INVALID = "% Invalid input detected at '^' marker."
+
+
+# CISCO_REGEX: Cisco regex '_' matches an underscore, space, comma, brace, bracket or the start or end of the line
+def cisco_regex(pattern: str) -> "re.Pattern":
+    pattern = pattern.strip().strip("'\"")
+    return re.compile(pattern.replace("_", r"(?:^|$|[_ ,{}()])"))
+
+
+# ----------------------------------------------------------------------------
+# DEVICE: Running config of an emulated device, shared by all its SSH sessions
+# ----------------------------------------------------------------------------
+class Device:
+    def __init__(self, name: str, platform: str, port: int, vty_acl: str) -> None:
+        self.name = name
+        self.platform = platform
+        self.port = port
+        self.lock = threading.Lock()
+        # ACLs are ordered lists of [seq, ace] (IOS remarks have no seq), ASA is the ssh and http cmds
+        self.acls: Dict[str, List[List[Any]]] = {}
+        self.vty_acl = vty_acl
+        self.asa: Dict[str, List[str]] = dict(ssh=[], http=[])
+        self.last_change = datetime.utcnow()
+        self.logins, self.refused = (0, 0)
+        # IOS flash files and NXOS checkpoints of the running config and the number of rollbacks to them
+        self.checkpoints: Dict[str, Dict[str, Any]] = {}
+        self.rollbacks = 0
+        # Files copied to the device (SCP) and the number of files merged into the running config
+        self.files: Dict[str, str] = {}
+        self.merges = 0
+
+    # ----------------------------------------------------------------------------
+    # ACCESS: Whether a new SSH session from the address is allowed (IOS/NXOS vty access-class, ASA ssh cmds)
+    # ----------------------------------------------------------------------------
+    def _ace_match(self, ace: str, addr: ipaddress.IPv4Address) -> bool:
+        words = ace.split()
+        if self.platform == "nxos":
+            return words[2] == "any" or addr in ipaddress.IPv4Network(
+                words[2], strict=False
+            )
+        if words[2] == "any":
+            return True
+        elif words[2] == "host":
+            return addr == ipaddress.IPv4Address(words[3])
+        return addr in ipaddress.IPv4Network(f"{words[2]}/{words[3]}", strict=False)
+
+    def permitted(self, client_ip: str) -> bool:
+        addr = ipaddress.IPv4Address(client_ip)
+        with self.lock:
+            if self.platform == "asa":
+                for each_cmd in self.asa["ssh"]:
+                    words = each_cmd.split()
+                    if addr in ipaddress.IPv4Network(
+                        f"{words[1]}/{words[2]}", strict=False
+                    ):
+                        return True
+                return False
+            # A vty access-class ACL that doesnt exist permits everything
+            if self.vty_acl == None or self.vty_acl not in self.acls:
+                return True
+            for seq, each_ace in self.acls[self.vty_acl]:
+                if each_ace.split()[0] in ["permit", "deny"]:
+                    try:
+                        if self._ace_match(each_ace, addr):
+                            return each_ace.startswith("permit")
+                    except (IndexError, ValueError):
+                        continue
+            return False
+
+    # ----------------------------------------------------------------------------
+    # ACL: Adds, inserts (by seq), removes and resequences ACEs
+    # ----------------------------------------------------------------------------
+    def _sequenced(self, entry: List[Any]) -> bool:
+        return entry[0] != None
+
+    def add_ace(self, acl_name: str, line: str) -> str:
+        acl = self.acls.setdefault(acl_name, [])
+        words = line.split()
+        if words[0] == "no":
+            if len(words) == 2 and words[1].isdigit():
+                acl[:] = [x for x in acl if x[0] != int(words[1])]
+            else:
+                acl[:] = [x for x in acl if x[1] != " ".join(words[1:])]
+            return ""
+        seq = int(words.pop(0)) if words[0].isdigit() else None
+        if words[0] not in ["remark", "permit", "deny"] or (
+            words[0] != "remark" and len(words) < 4
+        ):
+            return INVALID
+        ace = " ".join(words)
+        # IOS remarks are not sequenced, they belong to the next ACE
+        if self.platform != "nxos" and words[0] == "remark":
+            acl.append([None, ace])
+            return ""
+        if seq == None:
+            seq = max([x[0] for x in acl if self._sequenced(x)] or [0]) + 10
+        elif any(x[0] == seq for x in acl):
+            return f"% Duplicate sequence number"
+        # Goes before the first ACE with a higher seq (and before that ACEs remarks)
+        idx = len(acl)
+        for pos, entry in enumerate(acl):
+            if self._sequenced(entry) and entry[0] > seq:
+                idx = pos
+                while idx > 0 and not self._sequenced(acl[idx - 1]):
+                    idx -= 1
+                break
+        acl.insert(idx, [seq, ace])
+        return ""
+
+    def resequence(self, acl_name: str, start: int, step: int) -> None:
+        seq = start
+        for entry in self.acls.get(acl_name, []):
+            if self._sequenced(entry) or self.platform == "nxos":
+                entry[0] = seq
+                seq += step
+
+    # ----------------------------------------------------------------------------
+    # CHECKPOINT: Saves the running config and replaces it (one cmd, no per line changes) with a saved one
+    # ----------------------------------------------------------------------------
+    def save_checkpoint(self, name: str) -> None:
+        self.checkpoints[name] = copy.deepcopy(
+            dict(acls=self.acls, vty_acl=self.vty_acl, asa=self.asa)
+        )
+
+    def rollback(self, name: str) -> bool:
+        if name not in self.checkpoints:
+            return False
+        saved = copy.deepcopy(self.checkpoints[name])
+        self.acls, self.vty_acl, self.asa = (
+            saved["acls"],
+            saved["vty_acl"],
+            saved["asa"],
+        )
+        self.last_change = datetime.utcnow()
+        self.rollbacks += 1
+        return True
+
+    # ----------------------------------------------------------------------------
+    # FILES: File system (flash:, bootflash: or disk0:) listing of the copied files in the platforms dir format
+    # ----------------------------------------------------------------------------
+    def file_name(self, path: str) -> str:
+        return path.split(":", 1)[-1].lstrip("/")
+
+    def dir(self, path: str) -> str:
+        file_system, name = (path.split(":", 1)[0] + ":", self.file_name(path))
+        if name != "" and name not in self.files:
+            if self.platform == "nxos":
+                return "No such file or directory"
+            return f"%Error opening {file_system}/{name} (No such file or directory)"
+        listing = [
+            f"   {len(y)}    Jan 01 00:00:00 2024  {x}"
+            for x, y in self.files.items()
+            if name in ["", x]
+        ]
+        if self.platform == "nxos":
+            return "\n".join(
+                listing
+                + ["", "Usage for bootflash://sup-local", " 1000000 bytes used"]
+                + [" 6542245888 bytes free", " 7194652672 bytes total"]
+            )
+        return "\n".join(
+            [f"Directory of {file_system}/{name}", ""]
+            + listing
+            + ["", "7194652672 bytes total (6542245888 bytes free)"]
+        )
+
+    # ----------------------------------------------------------------------------
+    # SHOW: Running config and the show cmds this tool and nornir-validate use
+    # ----------------------------------------------------------------------------
+    def running_config(self) -> List[str]:
+        change = self.last_change.strftime("%H:%M:%S UTC %a %b %d %Y")
+        if self.platform == "asa":
+            return [
+                f"hostname {self.name}",
+                "ssh stricthostkeycheck",
+                *self.asa["ssh"],
+                "ssh timeout 5",
+                "ssh version 2",
+                "http server enable",
+                *self.asa["http"],
+            ]
+        elif self.platform == "nxos":
+            lines = [
+                "!Command: show running-config",
+                f"!Running configuration last done at: {self.last_change.strftime('%a %b %d %H:%M:%S %Y')}",
+                "",
+                f"hostname {self.name}",
+                "",
+            ]
+            for acl_name, aces in self.acls.items():
+                lines.append(f"ip access-list {acl_name}")
+                lines.extend(f"  {seq} {ace}" for seq, ace in aces)
+                lines.append("")
+            lines.extend(["line vty", f"  access-class {self.vty_acl} in", ""])
+            return lines
+        lines = ["!", f"! Last configuration change at {change} by admin", "!"]
+        lines.extend([f"hostname {self.name}", "!"])
+        for acl_name, aces in self.acls.items():
+            lines.append(f"ip access-list extended {acl_name}")
+            lines.extend(f" {ace}" for seq, ace in aces)
+            lines.append("!")
+        lines.extend(
+            [
+                "line vty 0 4",
+                f" access-class {self.vty_acl} in vrf-also",
+                " transport input ssh",
+                "!",
+                "end",
+            ]
+        )
+        return lines
+
+    # PIPE: 'show run | sec regex' returns whole sections (parent and child lines), 'show run | in regex' lines
+    def show_run(self, pipe: str) -> str:
+        lines = self.running_config()
+        if pipe == "":
+            return "\n".join(lines)
+        pipe_cmd, _, pattern = pipe.strip().partition(" ")
+        regex = cisco_regex(pattern)
+        if pipe_cmd.startswith("in"):
+            return "\n".join(x for x in lines if regex.search(x))
+        sections: List[List[str]] = []
+        for each_line in lines:
+            if each_line.startswith(" ") and len(sections) != 0:
+                sections[-1].append(each_line)
+            else:
+                sections.append([each_line])
+        return "\n".join(
+            "\n".join(x)
+            for x in sections
+            if any(regex.search(y) for y in x) and x[0] not in ["!", ""]
+        )
+
+    def show_access_lists(self) -> str:
+        lines = []
+        for acl_name, aces in self.acls.items():
+            if self.platform == "nxos":
+                lines.extend(["", f"IP access list {acl_name}"])
+                lines.extend(f"        {seq} {ace}" for seq, ace in aces)
+            else:
+                lines.append(f"Extended IP access list {acl_name}")
+                lines.extend(f"    {seq} {ace}" for seq, ace in aces if seq != None)
+        return "\n".join(lines)
+
+    def checksum(self) -> str:
+        digest = hashlib.md5("\n".join(self.running_config()).encode()).hexdigest()
+        return "Cryptochecksum: " + " ".join(digest[x : x + 8] for x in range(0, 32, 8))
+
+
+# ----------------------------------------------------------------------------
+# CLI: One SSH shell session, exec and config modes with the prompt showing the mode
+# ----------------------------------------------------------------------------
+class CliSession:
+    def __init__(self, device: Device) -> None:
+        self.device = device
+        self.mode = "exec"
+        self.acl_name = None
+        # Question waiting for an answer (IOS copy destination filename and overwrite confirm) and the file name
+        self.question: List[str] = None
+
+    def prompt(self) -> str:
+        if self.question != None:
+            return ""
+        sub_mode = dict(
+            exec="", config="(config)", line="(config-line)", acl="(config-ext-nacl)"
+        )[self.mode]
+        if self.mode == "acl" and self.device.platform == "nxos":
+            sub_mode = "(config-acl)"
+        return f"{self.device.name}{sub_mode}#"
+
+    def exec_cmd(self, cmd: str) -> str:
+        device = self.device
+        if cmd in [
+            "terminal length 0",
+            "terminal width 511",
+            "terminal pager 0",
+            "login",
+        ]:
+            return ""
+        elif cmd == "show curpriv":
+            return "Username : admin\nCurrent privilege level : 15\nCurrent Mode/s : P_PRIV"
+        elif cmd in ["configure terminal", "conf t"]:
+            self.mode = "config"
+            return ""
+        elif cmd == "show checksum" and device.platform == "asa":
+            return device.checksum()
+        elif cmd in ["show run ssh", "show run http"] and device.platform == "asa":
+            return "\n".join(
+                x
+                for x in device.running_config()
+                if x.startswith(cmd.split()[-1] + " ")
+            )
+        elif cmd.startswith("show run") or cmd.startswith("show running-config"):
+            return device.show_run(cmd.partition("|")[2])
+        elif cmd in ["show ip access-lists", "show access-lists"]:
+            return device.show_access_lists()
+        elif cmd.startswith("dir "):
+            return device.dir(cmd.split()[1])
+        elif cmd.startswith("copy ") and cmd.endswith(" running-config"):
+            name = device.file_name(cmd.split()[-2])
+            if name not in device.files:
+                return f"%Error opening {cmd.split()[-2]} (No such file or directory)"
+            # IOS asks for the destination, NXOS and ASA (/noconfirm) merge straight away
+            elif device.platform == "ios":
+                self.question = ["merge", name]
+                return "Destination filename [running-config]?"
+            return self.merge_file(name)
+        elif cmd.startswith("copy running-config flash:") and device.platform == "ios":
+            self.question = ["filename", cmd.split(":", 1)[1]]
+            return f"Destination filename [{self.question[1]}]?"
+        elif cmd.startswith("configure replace flash:") and device.platform == "ios":
+            name = cmd.split(":", 1)[1].split()[0]
+            if not device.rollback(name):
+                return f"%Error opening flash:{name} (No such file or directory)"
+            return "Total number of passes: 1\nRollback Done"
+        return self.nxos_checkpoint_cmd(cmd) if device.platform == "nxos" else INVALID
+
+    # NXOS: Named checkpoints, a name can only be used once
+    def nxos_checkpoint_cmd(self, cmd: str) -> str:
+        device, words = (self.device, cmd.split())
+        if words[:1] == ["checkpoint"] and len(words) == 2:
+            if words[1] in device.checkpoints:
+                return f"ERROR: Checkpoint name '{words[1]}' already exists"
+            device.save_checkpoint(words[1])
+            return "Done"
+        elif words[:2] == ["no", "checkpoint"] and len(words) == 3:
+            if device.checkpoints.pop(words[2], None) == None:
+                return f"ERROR: No checkpoint with name '{words[2]}'"
+            return ""
+        elif words[:3] == ["rollback", "running-config", "checkpoint"]:
+            if not device.rollback(words[3]):
+                return f"ERROR: No checkpoint with name '{words[3]}'"
+            return "Rollback completed successfully."
+        return INVALID
+
+    # MERGE: Each line of the file is run in config mode (a new session so this sessions mode is unchanged), the
+    # output is any rejected lines
+    def merge_file(self, name: str) -> str:
+        session, errors = (CliSession(self.device), [])
+        session.mode = "config"
+        for each_line in self.device.files[name].splitlines():
+            if session.mode == "exec":
+                break
+            elif each_line.strip() != "":
+                output = session.config_cmd(each_line.strip())
+                if output:
+                    errors.extend([each_line, output])
+        self.device.merges += 1
+        size = len(self.device.files[name])
+        return "\n".join(errors + [f"{size} bytes copied in 0.052 secs"])
+
+    # QUESTION: An empty answer is the default (file name in brackets or confirm), an existing file asks to overwrite
+    def answer(self, cmd: str) -> str:
+        device, (question, name) = (self.device, self.question)
+        self.question = None
+        if question == "merge":
+            return self.merge_file(name) if cmd in ["", "running-config"] else ""
+        elif question == "filename":
+            name = cmd or name
+            if name in device.checkpoints:
+                self.question = ["overwrite", name]
+                return "Do you want to over write? [confirm]"
+        elif cmd not in ["", "y"]:
+            return ""
+        device.save_checkpoint(name)
+        return "2048 bytes copied in 0.012 secs (170666 bytes/sec)"
+
+    # CONFIG: Global config cmds work from any config sub-mode, ACEs only in an ACL sub-mode
+    def config_cmd(self, cmd: str) -> str:
+        device, words = (self.device, cmd.split())
+        device.last_change = datetime.utcnow()
+        acl_cmd = ["ip", "access-list"] + (
+            ["extended"] if device.platform != "nxos" else []
+        )
+        if words[0] == "end":
+            self.mode = "exec"
+        elif words[0] == "exit":
+            self.mode = "config" if self.mode in ["acl", "line"] else "exec"
+        elif words[: len(acl_cmd)] == acl_cmd and len(words) == len(acl_cmd) + 1:
+            self.mode, self.acl_name = ("acl", words[-1])
+            device.acls.setdefault(self.acl_name, [])
+        elif words[: len(acl_cmd) + 1] == ["no"] + acl_cmd:
+            device.acls.pop(words[-1], None)
+        elif words[:3] in [
+            ["ip", "access-list", "resequence"],
+            ["resequence", "ip", "access-list"],
+        ]:
+            device.resequence(words[3], int(words[4]), int(words[5]))
+        elif words[:2] == ["line", "vty"]:
+            self.mode = "line"
+        elif self.mode == "line" and words[0] == "access-class":
+            device.vty_acl = words[1]
+        elif (
+            device.platform == "asa"
+            and words[-1] == "mgmt"
+            and words[0] in ["ssh", "http", "no"]
+        ):
+            return self.asa_cmd(words)
+        elif self.mode == "acl":
+            return device.add_ace(self.acl_name, cmd)
+        else:
+            return INVALID
+        return ""
+
+    # ASA: 'host x.x.x.x' is stored as a /32 mask the same as a real ASA
+    def asa_cmd(self, words: List[str]) -> str:
+        remove = words[0] == "no"
+        words = words[1:] if remove else words
+        if words[1] == "host":
+            words = [words[0], words[2], "255.255.255.255", words[3]]
+        cmd = " ".join(words)
+        cmds = self.device.asa[words[0]]
+        if remove and cmd in cmds:
+            cmds.remove(cmd)
+        elif not remove and cmd not in cmds:
+            cmds.append(cmd)
+        return ""
+
+    def run(self, cmd: str) -> str:
+        cmd = cmd.strip()
+        if self.question != None:
+            with self.device.lock:
+                return self.answer(cmd)
+        elif cmd == "":
+            return ""
+        with self.device.lock:
+            if self.mode == "exec":
+                return self.exec_cmd(cmd)
+            return self.config_cmd(cmd)
+
+
+# ----------------------------------------------------------------------------
+# SSH: Password auth and a shell channel, the CLI echos each cmd and returns its output and the prompt
+# ----------------------------------------------------------------------------
+class SshServer(paramiko.ServerInterface):
+    def __init__(self, username: str, password: str) -> None:
+        self.username = username
+        self.password = password
+        # Set once the client asks for a shell or runs a cmd (SCP), exec_cmd is the cmd
+        self.started = threading.Event()
+        self.exec_cmd: str = None
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if (username, password) == (self.username, self.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args: Any) -> bool:
+        return True
+
+    def check_channel_shell_request(self, channel: paramiko.Channel) -> bool:
+        self.started.set()
+        return True
+
+    def check_channel_exec_request(self, channel: paramiko.Channel, cmd: bytes) -> bool:
+        self.exec_cmd = cmd.decode(errors="ignore")
+        self.started.set()
+        return self.exec_cmd.startswith("scp -t ")
+
+
+# ----------------------------------------------------------------------------
+# EMULATOR: Runs many devices on localhost (one port each) from a single accept loop
+# ----------------------------------------------------------------------------
+class DeviceEmulator:
+    def __init__(
+        self,
+        num_devices: Dict[str, int],
+        username: str = "admin",
+        password: str = "admin",
+        latency: float = 0.0,
+        vty_acl: str = "SSH_ACCESS",
+        base_port: int = 0,
+    ) -> None:
+        self.username = username
+        self.password = password
+        # Delay (secs) before every cmd output (once for cmds sent together), login and file copy, emulates device CPU
+        # and network round trip time
+        self.latency = latency
+        self.host_key = paramiko.RSAKey.generate(1024)
+        # Clients closing sessions (such as the SSH login test) are logged as errors by the server transports
+        logging.getLogger("paramiko.transport").setLevel(logging.CRITICAL)
+        self.selector = selectors.DefaultSelector()
+        self.devices: Dict[str, Device] = {}
+        self.running = False
+        for platform, num in num_devices.items():
+            for idx in range(1, num + 1):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind(
+                    ("127.0.0.1", base_port + len(self.devices) if base_port else 0)
+                )
+                sock.listen(64)
+                sock.setblocking(False)
+                name = f"EMU-{platform.upper()}-{idx:04d}"
+                device = Device(
+                    name,
+                    "ios" if platform == "iosxe" else platform,
+                    sock.getsockname()[1],
+                    vty_acl,
+                )
+                self.devices[name] = device
+                self.selector.register(sock, selectors.EVENT_READ, device)
+
+    # ----------------------------------------------------------------------------
+    # CONFIG: Starting ACLs (or ASA ssh/http cmds) for all devices
+    # ----------------------------------------------------------------------------
+    def load_config(self, platform: str, config: List[str]) -> None:
+        for device in self.devices.values():
+            if device.platform == ("ios" if platform == "iosxe" else platform):
+                session = CliSession(device)
+                session.mode = "config"
+                for each_cmd in config:
+                    session.run(each_cmd)
+
+    # INVENTORY: Nornir SimpleInventory hosts file of the emulated devices
+    def write_inventory(self, host_file: str) -> None:
+        hosts = {}
+        for name, device in self.devices.items():
+            group = name.split("-")[1].lower()
+            hosts[name] = dict(hostname="127.0.0.1", port=device.port, groups=[group])
+        with open(host_file, "w") as file_content:
+            yaml.dump(hosts, file_content, default_flow_style=False)
+
+    # ----------------------------------------------------------------------------
+    # SESSION: Refuses the session if the device ACL doesnt permit the client, otherwise runs the CLI
+    # ----------------------------------------------------------------------------
+    def _session(self, sock: socket.socket, device: Device) -> None:
+        sock.setblocking(True)
+        client_ip = sock.getpeername()[0]
+        if not device.permitted(client_ip):
+            device.refused += 1
+            sock.close()
+            return
+        transport = paramiko.Transport(sock)
+        try:
+            transport.add_server_key(self.host_key)
+            time.sleep(self.latency)
+            server = SshServer(self.username, self.password)
+            transport.start_server(server=server)
+            # The SSH login test only authenticates, so stops waiting for a channel once the client has gone
+            channel, started = (None, time.monotonic())
+            while channel == None and transport.is_active():
+                channel = transport.accept(1)
+                if time.monotonic() - started > 30:
+                    return
+            if channel == None:
+                return
+            device.logins += 1
+            server.started.wait(10)
+            if server.exec_cmd != None:
+                self._scp(channel, device, server.exec_cmd)
+            else:
+                self._shell(channel, CliSession(device))
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+        finally:
+            transport.close()
+
+    # SCP: Sink side of 'scp -t <file>', each header (C<mode> <size> <name>) and file is acknowledged with a null
+    def _scp(self, channel: paramiko.Channel, device: Device, cmd: str) -> None:
+        name, data, size = (device.file_name(cmd.split()[-1]), b"", None)
+        channel.sendall(b"\0")
+        while self.running:
+            chunk = channel.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+            while size == None and b"\n" in data:
+                header, data = data.split(b"\n", 1)
+                if header[:1] == b"C":
+                    size = int(header.split()[1])
+                channel.sendall(b"\0")
+            if size != None and len(data) > size:
+                time.sleep(self.latency)
+                with device.lock:
+                    device.files[name] = data[:size].decode(errors="ignore")
+                data, size = (data[size + 1 :], None)
+                channel.sendall(b"\0")
+        channel.send_exit_status(0)
+        channel.close()
+
+    # SHELL: Cmds received together (pasted) are one round trip so only wait the latency once
+    def _shell(self, channel: paramiko.Channel, session: CliSession) -> None:
+        channel.sendall(f"\r\n{session.prompt()}".encode())
+        buffer, last = ("", "")
+        while self.running:
+            data = channel.recv(4096)
+            if not data:
+                return
+            waited = False
+            for char in data.decode(errors="ignore"):
+                # \r\n is one return
+                if char == "\n" and last == "\r":
+                    last = char
+                    continue
+                last = char
+                if char not in ["\r", "\n"]:
+                    buffer += char
+                    continue
+                if waited == False:
+                    time.sleep(self.latency)
+                    waited = True
+                output = session.run(buffer)
+                reply = buffer + "\r\n"
+                if output:
+                    reply += output.replace("\n", "\r\n")
+                    # Questions wait on the same line for the answer
+                    reply += "\r\n" if session.question == None else " "
+                channel.sendall((reply + session.prompt()).encode())
+                buffer = ""
+
+    # ACCEPT: Single thread accepts on all device ports, each session has its own thread
+    def _accept(self) -> None:
+        while self.running:
+            for key, events in self.selector.select(timeout=0.2):
+                try:
+                    sock, _ = key.fileobj.accept()
+                except BlockingIOError:
+                    continue
+                threading.Thread(
+                    target=self._session, args=(sock, key.data), daemon=True
+                ).start()
+
+    def start(self) -> "DeviceEmulator":
+        self.running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.running = False
+        for key in list(self.selector.get_map().values()):
+            self.selector.unregister(key.fileobj)
+            key.fileobj.close()
@@ -0,0 +1,173 @@
+import pytest
+import os
+import json
+import stat
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer
+
+from nornir import InitNornir
+from acl_daemon import AclDaemon, ApiHandler, ConnectionPool, api_token
+
+
+# ----------------------------------------------------------------------------
+# VARS: Inventory and stand-ins for the netmiko connection and orion runtime flags
+# ----------------------------------------------------------------------------
+test_inventory = os.path.join(os.path.dirname(__file__), "test_inventory")
+
+
+class FakeConnection:
+    def __init__(self, alive: bool) -> None:
+        self.alive = alive
+        self.connection = self
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def close(self) -> None:
+        pass
+
+
+class FakeOrion:
+    def add_arg_parser(self) -> argparse.ArgumentParser:
+        args = argparse.ArgumentParser()
+        args.add_argument("-g", "--group")
+        return args
+
+
+@pytest.fixture
+def nr_inv():
+    return InitNornir(
+        inventory={
+            "plugin": "SimpleInventory",
+            "options": {
+                "host_file": os.path.join(test_inventory, "hosts.yml"),
+                "group_file": os.path.join(test_inventory, "groups.yml"),
+            },
+        },
+        logging={"enabled": False},
+    )
+
+
+# ----------------------------------------------------------------------------
+# 1. POOL: Tests sessions are kept between jobs and dead, idle and least recently used sessions closed
+# ----------------------------------------------------------------------------
+class TestConnectionPool:
+    # 1a. Tests dead sessions are closed before a job and live ones kept
+    def test_prepare(self, nr_inv):
+        err_msg = "❌ ConnectionPool: Closing dead sessions failed"
+        host1, host2 = list(nr_inv.inventory.hosts.values())[:2]
+        host1.connections["netmiko"] = FakeConnection(True)
+        host2.connections["netmiko"] = FakeConnection(False)
+        pool = ConnectionPool(nr_inv)
+        pool.prepare(nr_inv)
+        assert "netmiko" in host1.connections, err_msg
+        assert "netmiko" not in host2.connections, err_msg
+
+    # 1b. Tests the least recently used sessions above max_sessions and idle sessions are closed
+    def test_release_reap(self, nr_inv):
+        err_msg = "❌ ConnectionPool: Closing {} sessions failed"
+        hosts = list(nr_inv.inventory.hosts.values())[:3]
+        for each_host in hosts:
+            each_host.connections["netmiko"] = FakeConnection(True)
+        pool = ConnectionPool(nr_inv, idle_timeout=0.1, max_sessions=2)
+        pool.release(nr_inv)
+        assert pool.stats()["sessions"] == 2, err_msg.format("least recently used")
+        time.sleep(0.2)
+        assert len(pool.reap()) == 2, err_msg.format("idle")
+        assert all("netmiko" not in x.connections for x in hosts), err_msg.format(
+            "idle"
+        )
+
+
+# ----------------------------------------------------------------------------
+# 2. DAEMON: Tests jobs are validated and queued
+# ----------------------------------------------------------------------------
+class TestAclDaemon:
+    # 2a. Tests runtime flags are parsed the same as the script and the input file is required
+    def test_submit(self, nr_inv):
+        err_msg = "❌ AclDaemon: Submitting a job failed"
+        acl_daemon = AclDaemon(
+            nr_inv, FakeOrion(), dict(idle_timeout=300, max_sessions=10)
+        )
+        job = acl_daemon.submit(["-f", "acl.yml", "-g", "ios"])
+        assert (job["id"], job["type"], job["status"]) == (
+            1,
+            "audit",
+            "queued",
+        ), err_msg
+        assert acl_daemon.submit(["-f", "acl.yml", "-a"])["type"] == "change", err_msg
+        with pytest.raises(ValueError):
+            acl_daemon.submit(["-g", "ios"])
+        with pytest.raises(SystemExit):
+            acl_daemon.submit(["--not-a-flag"])
+
+    # 2b. Tests only the last max_jobs finished jobs are kept and job IDs are not reused
+    def test_expire_jobs(self, nr_inv):
+        err_msg = "❌ AclDaemon: Expiring finished jobs failed"
+        acl_daemon = AclDaemon(
+            nr_inv, FakeOrion(), dict(idle_timeout=300, max_sessions=10), max_jobs=2
+        )
+        for _ in range(3):
+            acl_daemon.run_job(acl_daemon.submit(["-f", "acl.yml"])["id"])
+        queued = acl_daemon.submit(["-f", "acl.yml"])
+        acl_daemon.expire_jobs()
+        assert list(acl_daemon.jobs) == [2, 3, 4], err_msg
+        assert queued["id"] == 4 and queued["status"] == "queued", err_msg
+
+
+# ----------------------------------------------------------------------------
+# 3. API: Tests jobs are only accepted with the token and a JSON body
+# ----------------------------------------------------------------------------
+class TestApi:
+    def _request(self, url, token=None, content_type="application/json"):
+        req = urllib.request.Request(url, method="GET")
+        if content_type != None:
+            req = urllib.request.Request(
+                url, data=json.dumps(dict(args=["-f", "acl.yml"])).encode()
+            )
+            req.add_header("Content-Type", content_type)
+        if token != None:
+            req.add_header("X-Auth-Token", token)
+        try:
+            return urllib.request.urlopen(req, timeout=5).status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    # 3a. Tests requests without the token or a JSON content type are rejected, /health is open
+    def test_auth(self, nr_inv):
+        err_msg = "❌ ApiHandler: Rejecting an unauthorised job failed"
+        acl_daemon = AclDaemon(
+            nr_inv, FakeOrion(), dict(idle_timeout=300, max_sessions=10)
+        )
+        handler = type("Handler", (ApiHandler,), dict(daemon=acl_daemon, token="tkn"))
+        handler.log_message = lambda *args: None
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            assert self._request(url + "/jobs") == 401, err_msg
+            assert self._request(url + "/jobs", "wrong") == 401, err_msg
+            assert self._request(url + "/jobs", "tkn", "text/plain") == 415, err_msg
+            assert acl_daemon.jobs == {}, err_msg
+            assert self._request(url + "/jobs", "tkn") == 202, err_msg
+            assert self._request(url + "/jobs", None, None) == 401, err_msg
+            assert self._request(url + "/health", None, None) == 200, err_msg
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    # 3b. Tests a generated token is written only readable by the user
+    def test_api_token(self, tmp_path, monkeypatch):
+        err_msg = "❌ api_token: Writing the API token failed"
+        monkeypatch.delenv("ACL_DAEMON_TOKEN", raising=False)
+        token_file = str(tmp_path / "token")
+        token = api_token(token_file)
+        with open(token_file, "r") as file_content:
+            assert file_content.read() == token, err_msg
+        assert stat.S_IMODE(os.stat(token_file).st_mode) == 0o600, err_msg
+        monkeypatch.setenv("ACL_DAEMON_TOKEN", "from-env")
+        assert api_token(token_file) == "from-env", err_msg
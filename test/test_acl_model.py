@@ -0,0 +1,160 @@
+import pytest
+
+from acl_model import Ace, AclModel
+
+
+# ----------------------------------------------------------------------------
+# 1. ACE: Tests ACEs are parsed once and the platform address formats created from them
+# ----------------------------------------------------------------------------
+class TestAce:
+    # 1a. Tests address and prefix length are stored as integers
+    def test_parse(self):
+        err_msg = "❌ Ace: Parsing {} into integers failed"
+        ace = Ace("permit", "10.10.10.0/24")
+        assert (ace.network, ace.prefixlen) == (168430080, 24), err_msg.format("prefix")
+        ace = Ace("permit", "10.10.10.10")
+        assert ace.prefixlen == 32, err_msg.format("host")
+        ace = Ace("deny", "10.10.10.0/255.255.255.0")
+        assert ace.prefixlen == 24, err_msg.format("netmask")
+        for each_ace in [Ace("remark", "10.10.10.10"), Ace("deny", "any")]:
+            assert each_ace.network == None, err_msg.format("remark and any")
+
+    # 1b. Tests the prefix, mask and wildcard formats
+    def test_views(self):
+        err_msg = "❌ Ace: Creating {} address format failed"
+        ace, host, any_ace = (
+            Ace("permit", "172.17.10.0/24"),
+            Ace("deny", "10.1.1.1"),
+            Ace("permit", "any"),
+        )
+        assert (ace.prefix(), host.prefix()) == (
+            "172.17.10.0/24",
+            "10.1.1.1/32",
+        ), err_msg.format("prefix")
+        assert (ace.mask(), host.mask()) == (
+            "172.17.10.0 255.255.255.0",
+            "10.1.1.1 255.255.255.255",
+        ), err_msg.format("mask")
+        assert (ace.wcard(), host.wcard()) == (
+            "172.17.10.0 0.0.0.255",
+            "host 10.1.1.1",
+        ), err_msg.format("wildcard")
+        assert (any_ace.prefix(), any_ace.mask(), any_ace.wcard()) == (
+            "any",
+            "any",
+            "any",
+        ), err_msg.format("any")
+
+
+# ----------------------------------------------------------------------------
+# 2. MODEL: Tests the ACL_VARs are only created for the platforms that use them
+# ----------------------------------------------------------------------------
+class TestAclModel:
+    # 2a. Tests views are only created when first used
+    def test_lazy_views(self):
+        err_msg = "❌ AclModel: Lazy creation of ACL_VARs failed"
+        acl = AclModel(
+            {
+                "acl": [
+                    {
+                        "name": "SSH_ACCESS",
+                        "ace": [{"remark": "MGMT"}, {"permit": "10.1.1.0/24"}],
+                    }
+                ]
+            }
+        )
+        assert list(acl.keys()) == ["name"], err_msg
+        desired_result = {
+            "acl": [
+                {
+                    "name": "SSH_ACCESS",
+                    "ace": [{"remark": "MGMT"}, {"permit": "10.1.1.0 0.0.0.255"}],
+                }
+            ]
+        }
+        assert acl["wcard"] == desired_result, err_msg
+        assert list(acl.keys()) == ["name", "wcard"], err_msg
+        with pytest.raises(KeyError):
+            acl["not_a_view"]
+
+    # 2b. Tests shadowed and redundant ACEs are removed, adjacent prefixes merged and remarks kept
+    def test_optimise(self):
+        err_msg = "❌ AclModel: Optimising the ACL {}"
+        acl = AclModel(
+            {
+                "acl": [
+                    {
+                        "name": "SSH_ACCESS",
+                        "ace": [
+                            {"remark": "MGMT"},
+                            {"permit": "10.1.80.0/24"},
+                            {"permit": "10.1.80.5"},
+                            {"permit": "10.1.81.0/24"},
+                            {"remark": "SERVERS"},
+                            {"deny": "10.10.10.10"},
+                            {"permit": "10.10.10.0/24"},
+                            {"deny": "10.20.20.20"},
+                            {"deny": "10.20.0.0/16"},
+                        ],
+                    }
+                ]
+            }
+        )
+        acl["prefix"]
+        removed = acl.optimise()
+        assert removed == {
+            "SSH_ACCESS": [
+                "permit 10.1.80.5/32 (shadowed by permit 10.1.80.0/24)",
+                "deny 10.20.20.20/32 (redundant as followed by deny 10.20.0.0/16)",
+                "permit 10.1.80.0/24, 10.1.81.0/24 (merged into 10.1.80.0/23)",
+            ]
+        }, err_msg.format("removed ACEs")
+        assert "prefix" not in acl, err_msg.format("old views")
+        assert acl["prefix"]["acl"][0]["ace"] == [
+            {"remark": "MGMT"},
+            {"permit": "10.1.80.0/23"},
+            {"remark": "SERVERS"},
+            {"deny": "10.10.10.10/32"},
+            {"permit": "10.10.10.0/24"},
+            {"deny": "10.20.0.0/16"},
+        ], err_msg.format("ACEs")
+
+    # 2c. Tests site then host overlay ACEs are prepended and hosts with the same overlays share a model
+    def test_effective(self):
+        err_msg = "❌ AclModel: Effective ACL with overlays {}"
+        acl = AclModel(
+            {
+                "acl": [
+                    {"name": "SSH_ACCESS", "ace": [{"deny": "any"}]},
+                    {"name": "SNMP_ACCESS", "ace": [{"permit": "any"}]},
+                ],
+                "overlay": {
+                    "site": {
+                        "HME": [{"name": "SSH_ACCESS", "ace": [{"permit": "10.1.1.1"}]}]
+                    },
+                    "host": {
+                        "HME-SWI-01": [
+                            {"name": "SSH_ACCESS", "ace": [{"permit": "10.2.2.2"}]}
+                        ]
+                    },
+                },
+            }
+        )
+        assert acl.effective("DC", "DC-SWI-01") is acl, err_msg.format("no overlay")
+        assert acl.effective("HME", "HME-SWI-02") is acl.effective(
+            "HME", "HME-SWI-03"
+        ), err_msg.format("same site")
+        assert acl.effective("HME", "HME-SWI-01")["prefix"] == {
+            "acl": [
+                {
+                    "name": "SSH_ACCESS",
+                    "ace": [
+                        {"permit": "10.1.1.1/32"},
+                        {"permit": "10.2.2.2/32"},
+                        {"deny": "any"},
+                    ],
+                },
+                {"name": "SNMP_ACCESS", "ace": [{"permit": "any"}]},
+            ]
+        }, err_msg.format("ACEs")
+        assert "prefix" not in acl, err_msg.format("base views")
@@ -0,0 +1,61 @@
+import pytest
+import os
+import shutil
+
+from acl_render import AclRender
+from .test_inputs import acl_vars
+
+
+# ----------------------------------------------------------------------------
+# VARS: Template and ACL_VARs used for testing
+# ----------------------------------------------------------------------------
+template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+acl = acl_vars.acl
+desired_result = (
+    "ip access-list extended UTEST_SSH_ACCESS\n"
+    " remark MGMT Access - VLAN810\n"
+    " permit ip 172.17.10.0 0.0.0.255 any\n"
+    " remark Citrix Access\n"
+    " permit ip host 10.10.109.10 any\n"
+    " deny ip any any\n"
+    "\n"
+    "ip access-list extended UTEST_SNMP_ACCESS\n"
+    " deny ip host 10.10.209.11 any\n"
+    " permit ip any any\n"
+    "\n"
+)
+
+
+# ----------------------------------------------------------------------------
+# 1. RENDER: Tests the compiled template renders the same as nornir-template and is memoised
+# ----------------------------------------------------------------------------
+class TestAclRender:
+    # 1a. Tests rendered config is the same as the nornir-template task
+    def test_render(self):
+        err_msg = "❌ AclRender: Rendering the template failed"
+        render = AclRender(path=template_dir)
+        assert render.render("ios/iosxe", acl["wcard"]) == desired_result, err_msg
+
+    # 1b. Tests config rendered in a previous run is used and a changed template or ACL_VARs are rendered again
+    def test_memoise(self, tmp_path):
+        err_msg = "❌ AclRender: Memoising rendered config {} failed"
+        tmpl_dir, cache_dir = (tmp_path / "templates", str(tmp_path / "cache"))
+        shutil.copytree(template_dir, tmpl_dir)
+        AclRender(path=str(tmpl_dir), cache_dir=cache_dir).render("nxos", acl["prefix"])
+        cfg_files = [x for x in os.listdir(cache_dir) if x.endswith(".cfg")]
+        assert len(cfg_files) == 1, err_msg.format("to disk")
+        with open(os.path.join(cache_dir, cfg_files[0]), "w") as file_content:
+            file_content.write("CACHED")
+        render = AclRender(path=str(tmpl_dir), cache_dir=cache_dir)
+        assert render.render("nxos", acl["prefix"]) == "CACHED", err_msg.format(
+            "across runs"
+        )
+        assert render.render("nxos", acl["wcard"]) != "CACHED", err_msg.format(
+            "changed ACL_VARs"
+        )
+        with open(tmpl_dir / "cfg_acl_tmpl.j2", "a") as file_content:
+            file_content.write("\n")
+        render = AclRender(path=str(tmpl_dir), cache_dir=cache_dir)
+        assert render.render("nxos", acl["prefix"]) != "CACHED", err_msg.format(
+            "changed template"
+        )
@@ -0,0 +1,183 @@
+import pytest
+import os
+import json
+import timeit
+import random
+from typing import Any, Callable, Dict, List
+
+from update_mgmt_acl import InputValidate
+from nornir_tasks import NornirTask
+from acl_model import AclModel
+from acl_render import AclRender
+
+
+# ----------------------------------------------------------------------------
+# VARS: Opt-in (ACL_BENCHMARK=1 compares, ACL_BENCHMARK=save refreshes the committed baseline), fails if slower than the
+# baseline by more than the tolerance (ACL_BENCHMARK_TOLERANCE, default 0.25) or if there is no baseline to compare to
+# ----------------------------------------------------------------------------
+benchmark = os.environ.get("ACL_BENCHMARK")
+tolerance = float(os.environ.get("ACL_BENCHMARK_TOLERANCE", 0.25))
+baseline_file = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+pytestmark = pytest.mark.skipif(
+    not benchmark, reason="benchmarks are opt-in, set ACL_BENCHMARK=1"
+)
+# Total number of ACEs and the number of ACLs they are split across
+SIZES = [(10, 1), (1000, 5), (50000, 20)]
+
+
+# ----------------------------------------------------------------------------
+# GENERATORS: Synthetic (seeded) input file ACLs, device ACLs and ASA show run ssh/http outputs
+# ----------------------------------------------------------------------------
+def gen_acl_vars(num_aces: int, num_acls: int, seed: int = 1) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    acls = []
+    for acl_idx in range(num_acls):
+        aces: List[Dict[str, str]] = []
+        for ace_idx in range(num_aces // num_acls):
+            if ace_idx % 10 == 0:
+                aces.append({"remark": f"SITE {acl_idx}-{ace_idx}"})
+                continue
+            addr = f"10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}"
+            aces.append(
+                rnd.choice(
+                    [
+                        {"permit": f"{addr}.0/24"},
+                        {"permit": f"{addr}.{rnd.randint(1, 254)}"},
+                        {"deny": f"{addr}.0/26"},
+                    ]
+                )
+            )
+        aces.append({"deny": "any"})
+        acls.append(dict(name=f"BENCH_ACL_{acl_idx}", ace=aces))
+    return dict(acl=acls)
+
+
+# Device ACLs with roughly 5% of ACEs changed from the templated ACLs (with NXOS sequence numbers)
+def gen_device_acls(tmpl_acls: List[str], seed: int = 1) -> List[str]:
+    rnd = random.Random(seed)
+    sw_acls = []
+    for each_acl in tmpl_acls:
+        lines = each_acl.splitlines()
+        for idx in rnd.sample(range(1, len(lines)), max(1, len(lines) // 20)):
+            lines[idx] = f"  {idx * 10} permit ip 192.168.{idx % 255}.0/24 any"
+        sw_acls.append("\n".join(lines))
+    return sw_acls
+
+
+def gen_asa_show(num_aces: int, seed: int = 1) -> List[str]:
+    rnd = random.Random(seed)
+    show_output = []
+    for cmd in ["ssh", "http"]:
+        lines = [f"{cmd} stricthostkeycheck", f"{cmd} timeout 5", f"{cmd} version 2"]
+        for _ in range(num_aces):
+            lines.append(
+                f"{cmd} 10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.0 255.255.255.0 mgmt"
+            )
+        show_output.append("\n".join(lines))
+    return show_output
+
+
+# ----------------------------------------------------------------------------
+# FIXTURES: Times a function (best of several runs) relative to a reference workload and compares it to the baseline
+# ----------------------------------------------------------------------------
+@pytest.fixture(scope="module")
+def baseline():
+    results: Dict[str, float] = {}
+    saved: Dict[str, float] = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file, "r") as file_content:
+            saved = json.load(file_content)
+    elif benchmark != "save":
+        pytest.fail(
+            f"❌ No benchmark baseline ({baseline_file}), save one with ACL_BENCHMARK=save"
+        )
+    yield dict(saved=saved, results=results)
+    # Only saving writes the baseline, the benchmarks run replace their saved results
+    if benchmark == "save":
+        saved.update(results)
+        with open(baseline_file, "w") as file_content:
+            json.dump(saved, file_content, indent=2, sort_keys=True)
+            file_content.write("\n")
+
+
+# Fixed pure-python workload, benchmarks are stored relative to it so a busier or faster machine doesnt fail them
+def reference() -> None:
+    sorted(str(x) for x in range(2000))
+
+
+@pytest.fixture
+def bench(baseline, request):
+    def run(func: Callable[[], Any], repeat: int = 5) -> float:
+        # Same as timeit (gc disabled, loops enough for 0.2 secs), reference and benchmark runs are interleaved
+        timer, ref_timer = (timeit.Timer(func), timeit.Timer(reference))
+        loops, ref_loops = (timer.autorange()[0], ref_timer.autorange()[0])
+        best, ref_best = (float("inf"), float("inf"))
+        for _ in range(repeat):
+            best = min(best, timer.timeit(loops) / loops)
+            ref_best = min(ref_best, ref_timer.timeit(ref_loops) / ref_loops)
+        name = request.node.name
+        baseline["results"][name] = round(best / ref_best, 4)
+        saved = baseline["saved"].get(name)
+        if benchmark == "save":
+            return best
+        assert (
+            saved != None
+        ), f"❌ {name}: Not in the benchmark baseline, save it with ACL_BENCHMARK=save"
+        assert baseline["results"][name] <= saved * (1 + tolerance), (
+            f"❌ {name}: {baseline['results'][name]}x the reference workload is more than {tolerance:.0%} "
+            f"slower than the baseline {saved}x"
+        )
+        return best
+
+    return run
+
+
+# ----------------------------------------------------------------------------
+# 1. BENCHMARK: Input file validation and parsing, rendering, diff and config formatting
+# ----------------------------------------------------------------------------
+@pytest.mark.parametrize("num_aces, num_acls", SIZES)
+class TestBenchmark:
+    # 1a. Parses the input file ACEs and creates all the views
+    def test_format_input_vars(self, bench, num_aces, num_acls):
+        acl_vars = gen_acl_vars(num_aces, num_acls)
+        validate = InputValidate(os.path.dirname(__file__))
+
+        def format_input_vars():
+            acl = validate.format_input_vars(acl_vars)
+            [acl[x] for x in acl.views]
+
+        bench(format_input_vars)
+
+    # 1b. Validates every ACE
+    def test_assert_ace(self, bench, num_aces, num_acls):
+        aces = [y for x in gen_acl_vars(num_aces, num_acls)["acl"] for y in x["ace"]]
+        validate = InputValidate(os.path.dirname(__file__))
+        bench(lambda: [validate._assert_ace(x) for x in aces])
+
+    # 1c. Renders the NXOS template (compiled template, memoisation bypassed)
+    def test_render(self, bench, num_aces, num_acls):
+        acl = AclModel(gen_acl_vars(num_aces, num_acls))
+        render = AclRender(path=template_dir)
+        bench(lambda: render.template.render(os_type="nxos", acl_vars=acl["prefix"]))
+
+    # 1d. Finds the differences between the device and templated ACLs
+    def test_get_difference(self, bench, num_aces, num_acls):
+        acl = AclModel(gen_acl_vars(num_aces, num_acls))
+        render = AclRender(path=template_dir)
+        tmpl_acl = render.render("nxos", acl["prefix"]).rstrip().split("\n\n")
+        sw_acl = gen_device_acls(tmpl_acl)
+        nr_task = NornirTask()
+        bench(lambda: nr_task.diff_acl(sw_acl, tmpl_acl))
+
+    # 1e. Formats the ASA ssh/http backup and creates the delete and config cmds
+    def test_asa_cmds(self, bench, num_aces, num_acls):
+        show_output = gen_asa_show(num_aces)
+        nr_task = NornirTask()
+
+        def asa_cmds():
+            backup = nr_task.format_asa(show_output)
+            nr_task.asa_del(backup)
+            nr_task.list_of_cmds(backup)
+
+        bench(asa_cmds)
@@ -0,0 +1,61 @@
+import pytest
+import os
+
+from change_cache import ChangeCache
+
+
+# ----------------------------------------------------------------------------
+# VARS: Change markers and rendered config used for testing
+# ----------------------------------------------------------------------------
+marker = "! Last configuration change at 10:01:12 UTC Mon Nov 28 2022 by test_user"
+config = [
+    "ip access-list extended UTEST_SSH_ACCESS\n permit ip 172.17.10.0 0.0.0.255 any",
+    "ip access-list extended UTEST_SNMP_ACCESS\n permit ip any any",
+]
+
+
+# ----------------------------------------------------------------------------
+# 1. CACHE: Tests in-sync hosts are cached and saved across runs
+# ----------------------------------------------------------------------------
+class TestChangeCache:
+    # 1a. Tests host only in-sync if both change marker and config are unchanged
+    def test_in_sync(self, tmp_path):
+        err_msg = "❌ ChangeCache: {} in-sync check failed"
+        cache = ChangeCache(os.path.join(tmp_path, "cache.json"))
+        assert cache.in_sync("TEST_DEVICE", marker, config) == False, err_msg.format(
+            "Empty cache"
+        )
+        cache.update("TEST_DEVICE", marker, config, True)
+        assert cache.in_sync("TEST_DEVICE", marker, config) == True, err_msg.format(
+            "Unchanged"
+        )
+        assert (
+            cache.in_sync("TEST_DEVICE", marker.replace("10:01", "11:01"), config)
+            == False
+        ), err_msg.format("Changed device")
+        assert (
+            cache.in_sync("TEST_DEVICE", marker, config[:1]) == False
+        ), err_msg.format("Changed ACL")
+        assert cache.in_sync("TEST_DEVICE", "", config) == False, err_msg.format(
+            "No marker"
+        )
+
+    # 1b. Tests host is removed from cache when it is no longer in-sync
+    def test_update_not_in_sync(self, tmp_path):
+        err_msg = "❌ ChangeCache: Removing host no longer in-sync failed"
+        cache = ChangeCache(os.path.join(tmp_path, "cache.json"))
+        cache.update("TEST_DEVICE", marker, config, True)
+        cache.update("TEST_DEVICE", marker, config, False)
+        assert cache.in_sync("TEST_DEVICE", marker, config) == False, err_msg
+
+    # 1c. Tests cache is saved and loaded on the next run and a corrupt cache is ignored
+    def test_save(self, tmp_path):
+        err_msg = "❌ ChangeCache: Saving and loading the cache file failed"
+        cache_file = os.path.join(tmp_path, "cache.json")
+        cache = ChangeCache(cache_file)
+        cache.update("TEST_DEVICE", marker, config, True)
+        cache.save()
+        assert ChangeCache(cache_file).in_sync("TEST_DEVICE", marker, config), err_msg
+        with open(cache_file, "w") as file_content:
+            file_content.write("{not json")
+        assert ChangeCache(cache_file).cache == {}, err_msg
@@ -0,0 +1,151 @@
+import pytest
+import os
+
+from nornir_tasks import NornirTask
+from acl_model import AclModel
+from .device_emulator import DeviceEmulator
+from .benchmark_emulator import acl_input, base_config, emulator_inventory
+
+
+# ----------------------------------------------------------------------------
+# FIXTURES: Emulated IOS, NXOS and ASA device and a Nornir inventory of them
+# ----------------------------------------------------------------------------
+@pytest.fixture
+def emulator():
+    emulator = DeviceEmulator(dict(ios=1, nxos=1, asa=1)).start()
+    base_config(emulator)
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def nr_inv(emulator, tmp_path):
+    runner = dict(plugin="threaded", options=dict(num_workers=10))
+    nr_inv = emulator_inventory(emulator, str(tmp_path), runner)
+    yield nr_inv
+    nr_inv.close_connections()
+
+
+# ----------------------------------------------------------------------------
+# 1. END_TO_END: Tests config_engine against the emulated devices
+# ----------------------------------------------------------------------------
+class TestDeviceEmulator:
+    # 1a. Tests ACLs are applied (delta and full) and the devices are then in-sync
+    @pytest.mark.parametrize("delta_apply", [True, False])
+    def test_apply(self, emulator, nr_inv, delta_apply):
+        err_msg = "❌ DeviceEmulator: Applying ACLs to emulated devices failed"
+        nr_task = NornirTask(batch_backup=True, delta_apply=delta_apply)
+        nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(5, 1)))
+        nr_task.config_engine(nr_inv, False)
+        assert len(nr_task.summary["changed"]) == 3, err_msg
+        nr_task.config_engine(nr_inv, True)
+        assert len(nr_task.summary["in_sync"]) == 3, err_msg
+        ios = emulator.devices["EMU-IOS-0001"]
+        assert len(ios.acls["SSH_ACCESS"]) == 8, err_msg
+
+    # 1b. Tests each push strategy (set per group) applies the ACLs, file copies the config to the device and merges it
+    @pytest.mark.parametrize("push_strategy", ["line", "bulk", "file"])
+    def test_push_strategy(self, emulator, nr_inv, push_strategy):
+        err_msg = f"❌ DeviceEmulator: Applying ACLs with the {push_strategy} push strategy failed"
+        for grp in ["ios", "nxos", "asa"]:
+            nr_inv.inventory.groups[grp].data["push_strategy"] = push_strategy
+        nr_task = NornirTask(batch_backup=True, delta_apply=False, verify="local")
+        nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(5, 1)))
+        nr_task.config_engine(nr_inv, False)
+        assert len(nr_task.summary["changed"]) == 3, err_msg
+        nr_task.config_engine(nr_inv, True)
+        assert len(nr_task.summary["in_sync"]) == 3, err_msg
+        merges = [x.merges for x in emulator.devices.values()]
+        assert merges == [int(push_strategy == "file")] * 3, err_msg
+
+    # 1c. Tests a bulk or file push with a rejected line is rolled back and an unknown strategy fails before any change
+    @pytest.mark.parametrize("push_strategy", ["bulk", "file"])
+    def test_push_rejected(self, emulator, nr_inv, push_strategy):
+        err_msg = "❌ DeviceEmulator: Rolling back a push with rejected lines failed"
+        nr_task = NornirTask(push_strategy=push_strategy)
+        ios = nr_inv.filter(name="EMU-IOS-0001")
+        ios.inventory.hosts["EMU-IOS-0001"]["push_file"] = dict(
+            file_system="flash:",
+            dest_file="mgmt_acl_push.cfg",
+            copy_cmd="copy flash:/mgmt_acl_push.cfg running-config",
+        )
+        acl_config = ["ip access-list extended SSH_ACCESS", " permit ip"]
+        backup_config = ["ip access-list extended SSH_ACCESS", " deny ip any any"]
+        result = ios.run(
+            task=nr_task.apply_acl, acl_config=acl_config, backup_config=backup_config
+        )
+        assert (
+            result["EMU-IOS-0001"][0].result
+            == "❌  ACL update rolled back as the push failed"
+        ), err_msg
+        ios.data.reset_failed_hosts()
+        nr_task.push_strategy = "paste"
+        result = ios.run(
+            task=nr_task.apply_acl, acl_config=acl_config, backup_config=backup_config
+        )
+        assert "Unknown push_strategy 'paste'" in result["EMU-IOS-0001"][0].result
+        assert len(result["EMU-IOS-0001"]) == 1, err_msg
+
+    # 1d. Tests the applied ACLs are verified locally from the show cmd output (all platforms)
+    def test_verify_local(self, emulator, nr_inv):
+        err_msg = "❌ DeviceEmulator: Verifying the applied ACLs locally failed"
+        nr_task = NornirTask(batch_backup=True, delta_apply=True, verify="local")
+        nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(5, 1)))
+        nr_task.config_engine(nr_inv, False)
+        assert len(nr_task.summary["changed"]) == 3, err_msg
+        result = nr_inv.run(task=nr_task.verify_acl)
+        assert result.failed == False, err_msg
+        assert all(x[0].result["complies"] for x in result.values()), err_msg
+
+    # 1e. Tests a change that locks out SSH access is rolled back (checkpoint is one cmd on IOS and NXOS), ios
+    # enables the checkpoint for only the ios group
+    @pytest.mark.parametrize("checkpoint", [True, False, "ios"])
+    def test_lockout_rollback(self, emulator, nr_inv, checkpoint):
+        err_msg = "❌ DeviceEmulator: Rolling back an ACL that breaks SSH failed"
+        if checkpoint == "ios":
+            nr_inv.inventory.groups["ios"].data["checkpoint"] = True
+        nr_task = NornirTask(
+            batch_backup=True, delta_apply=True, checkpoint=checkpoint == True
+        )
+        lockout = dict(acl=[dict(name="SSH_ACCESS", ace=[{"permit": "10.1.1.0/24"}])])
+        nr_task.generate_acl_engine(nr_inv, AclModel(lockout))
+        nr_task.config_engine(nr_inv, False)
+        assert len(nr_task.summary["failed"]) == 3, err_msg
+        assert sum(x.refused for x in emulator.devices.values()) != 0, err_msg
+        assert emulator.devices["EMU-IOS-0001"].permitted("127.0.0.1"), err_msg
+        assert emulator.devices["EMU-NXOS-0001"].permitted("127.0.0.1"), err_msg
+        assert emulator.devices["EMU-ASA-0001"].permitted("127.0.0.1"), err_msg
+        rollbacks = {x: y.rollbacks for x, y in emulator.devices.items()}
+        assert rollbacks == {
+            "EMU-IOS-0001": int(checkpoint != False),
+            "EMU-NXOS-0001": int(checkpoint == True),
+            "EMU-ASA-0001": 0,
+        }, err_msg
+
+    # 1f. Tests an existing checkpoint is overwritten (IOS) or replaced (NXOS) by the next change
+    def test_checkpoint_rerun(self, emulator, nr_inv):
+        err_msg = "❌ DeviceEmulator: Re-taking the on-box checkpoint failed"
+        nr_task = NornirTask(batch_backup=True, delta_apply=True, checkpoint=True)
+        for num_aces in [5, 6]:
+            nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(num_aces, 1)))
+            nr_task.config_engine(nr_inv, False)
+            assert len(nr_task.summary["changed"]) == 3, err_msg
+        ios = emulator.devices["EMU-IOS-0001"]
+        nxos = emulator.devices["EMU-NXOS-0001"]
+        assert list(ios.checkpoints) == ["mgmt_acl_rollback.cfg"], err_msg
+        assert list(nxos.checkpoints) == ["mgmt_acl_rollback"], err_msg
+        assert (
+            len(ios.checkpoints["mgmt_acl_rollback.cfg"]["acls"]["SSH_ACCESS"]) == 8
+        ), err_msg
+
+    # 1g. Tests a dry run after an apply keeps the apply journal, so the apply can still be resumed
+    def test_journal_dry_run(self, emulator, nr_inv, tmp_path):
+        err_msg = "❌ DeviceEmulator: A dry run wiped the journal of the last apply"
+        journal_file = str(tmp_path / "journal.jsonl")
+        nr_task = NornirTask(batch_backup=True, journal_file=journal_file)
+        nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(5, 1)))
+        nr_task.config_engine(nr_inv, False)
+        nr_task.config_engine(nr_inv, True)
+        assert len(nr_task.summary["in_sync"]) == 3, err_msg
+        completed = nr_task.journal.completed(nr_inv, False)
+        assert sorted(completed) == sorted(emulator.devices), err_msg
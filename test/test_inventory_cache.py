@@ -0,0 +1,154 @@
+import pytest
+import os
+import re
+import time
+
+from nornir import InitNornir
+from inventory_cache import InventoryCache
+
+
+# ----------------------------------------------------------------------------
+# VARS: NPM settings and an OrionInventory stand-in that loads the test inventory (with credentials) from files
+# ----------------------------------------------------------------------------
+test_inventory = os.path.join(os.path.dirname(__file__), "test_inventory")
+npm = dict(
+    server="orion-svr01",
+    user="test_user",
+    pword="L00K_pa$$w0rd",
+    select=["IOSVersion"],
+    where="Vendor = 'Cisco'",
+)
+groups = [dict(group="ios", type="switch", filter=["Catalyst"], netmiko="cisco_ios")]
+
+
+class Orion:
+    def __init__(self) -> None:
+        self.npm_loads = 0
+        self.wheres = []
+        # Host IOSVersions changed in NPM
+        self.versions = {}
+
+    def load_static_inventory(self, host_file: str, group_file: str) -> "Nornir":
+        return InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {"host_file": host_file, "group_file": group_file},
+            },
+            logging={"enabled": False},
+        )
+
+    def test_npm_creds(self, npm: dict) -> None:
+        pass
+
+    # NodeIDs are the host position in the inventory (from 1), a NodeID IN where only loads those nodes
+    def load_inventory(self, npm: dict, groups: list) -> "Nornir":
+        self.npm_loads += 1
+        self.wheres.append(npm["where"])
+        nr_inv = self.load_static_inventory(
+            os.path.join(test_inventory, "hosts.yml"),
+            os.path.join(test_inventory, "groups.yml"),
+        )
+        node_ids = re.search(r"NodeID IN \((.*)\)", npm["where"])
+        for idx, host_name in enumerate(list(nr_inv.inventory.hosts), 1):
+            if node_ids and str(idx) not in node_ids.group(1).split(", "):
+                nr_inv.inventory.hosts.pop(host_name)
+        nr_inv.inventory.defaults.password = npm["pword"]
+        for host_name, host in nr_inv.inventory.hosts.items():
+            host.username, host.password = ("test_user", npm["pword"])
+            if host_name in self.versions:
+                host.data["IOSVersion"] = self.versions[host_name]
+        return nr_inv
+
+    # DELTA: Each NodeID with its IP and a checksum (the IOSVersion is enough to see a change)
+    def nodes(self) -> dict:
+        nr_inv = self.load_inventory(npm, groups)
+        self.npm_loads -= 1
+        self.wheres.pop()
+        return {
+            str(idx): dict(ip=host.hostname, checksum=host.data.get("IOSVersion"))
+            for idx, host in enumerate(nr_inv.inventory.hosts.values(), 1)
+        }
+
+
+# ----------------------------------------------------------------------------
+# 1. CACHE: Tests when the cached inventory is used rather than loading it from NPM
+# ----------------------------------------------------------------------------
+class TestInventoryCache:
+    # 1a. Tests the inventory is cached without credentials and used within the TTL
+    def test_ttl(self, tmp_path, monkeypatch):
+        err_msg = "❌ InventoryCache: Caching the Orion inventory {} failed"
+        orion = Orion()
+        inv_cache = InventoryCache(str(tmp_path), ttl=3600)
+        monkeypatch.setattr(inv_cache, "delta_check", lambda npm: orion.nodes())
+        nr_inv = inv_cache.load(orion, npm, groups)
+        cached_inv = inv_cache.load(orion, npm, groups)
+        assert orion.npm_loads == 1, err_msg.format("within TTL")
+        assert list(cached_inv.inventory.hosts) == list(
+            nr_inv.inventory.hosts
+        ), err_msg.format("hosts")
+        host = list(nr_inv.inventory.hosts)[0]
+        assert (
+            cached_inv.inventory.hosts[host].data == nr_inv.inventory.hosts[host].data
+        ), err_msg.format("host data")
+        with open(inv_cache.host_file, "r") as file_content:
+            assert npm["pword"] not in file_content.read(), err_msg.format(
+                "without credentials"
+            )
+        inv_cache.load(orion, dict(npm, where="Vendor = 'Juniper'"), groups)
+        assert orion.npm_loads == 2, err_msg.format("changed NPM query")
+
+    # 1b. Tests after the TTL the cache is used if the NPM nodes are unchanged (without restarting the TTL), else
+    # only the changed nodes are loaded from NPM and merged into the cache
+    def test_delta(self, tmp_path, monkeypatch):
+        err_msg = "❌ InventoryCache: NPM delta check {} failed"
+        orion = Orion()
+        inv_cache = InventoryCache(str(tmp_path), ttl=0)
+        monkeypatch.setattr(inv_cache, "delta_check", lambda npm: nodes)
+        nodes = orion.nodes()
+        nr_inv = inv_cache.load(orion, npm, groups)
+        synced = inv_cache._load_meta()["synced"]
+        inv_cache.load(orion, npm, groups)
+        assert orion.npm_loads == 1, err_msg.format("unchanged nodes")
+        assert inv_cache._load_meta()["synced"] == synced, err_msg.format("TTL")
+        # A changed node is the only one loaded from NPM
+        hosts = list(nr_inv.inventory.hosts)
+        orion.versions[hosts[1]] = "17.3.4a"
+        nodes = orion.nodes()
+        cached_inv = inv_cache.load(orion, npm, groups)
+        assert orion.npm_loads == 2, err_msg.format("changed node")
+        assert orion.wheres[-1].endswith("Nodes.NodeID IN (2)"), err_msg.format(
+            "changed NodeID"
+        )
+        assert list(cached_inv.inventory.hosts) == hosts, err_msg.format("merge")
+        version = cached_inv.inventory.hosts[hosts[1]].data["IOSVersion"]
+        assert version == "17.3.4a", err_msg.format("changed host")
+        assert inv_cache._load_meta()["synced"] > synced, err_msg.format("TTL restart")
+        # A removed node is removed from the cache without an NPM load
+        del nodes["3"]
+        cached_inv = inv_cache.load(orion, npm, groups)
+        assert orion.npm_loads == 2, err_msg.format("removed node")
+        assert hosts[2] not in cached_inv.inventory.hosts, err_msg.format(
+            "removed host"
+        )
+        assert len(cached_inv.inventory.hosts) == len(hosts) - 1, err_msg.format(
+            "removed host"
+        )
+
+    # 1c. Tests the cache is used if NPM is slow or fails, without a cache the error is raised
+    def test_npm_fallback(self, tmp_path, monkeypatch):
+        err_msg = "❌ InventoryCache: Falling back to the cache {} failed"
+        orion = Orion()
+        inv_cache = InventoryCache(str(tmp_path), ttl=0, npm_timeout=0.2)
+
+        def slow_npm(npm):
+            time.sleep(1)
+
+        monkeypatch.setattr(inv_cache, "delta_check", slow_npm)
+        with pytest.raises(Exception):
+            inv_cache.load(orion, npm, groups)
+        monkeypatch.setattr(inv_cache, "delta_check", lambda npm: orion.nodes())
+        inv_cache.load(orion, npm, groups)
+        monkeypatch.setattr(inv_cache, "delta_check", slow_npm)
+        nr_inv = inv_cache.load(orion, npm, groups)
+        assert orion.npm_loads == 1, err_msg.format("when slow")
+        assert len(nr_inv.inventory.hosts) != 0, err_msg.format("inventory")
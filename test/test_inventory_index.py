@@ -0,0 +1,93 @@
+import pytest
+import os
+
+from nornir import InitNornir
+from inventory_index import InventoryIndex
+
+
+# ----------------------------------------------------------------------------
+# VARS: Test inventory and its index
+# ----------------------------------------------------------------------------
+test_inventory = os.path.join(os.path.dirname(__file__), "test_inventory")
+
+
+@pytest.fixture(scope="module")
+def nr_inv():
+    return InitNornir(
+        inventory={
+            "plugin": "SimpleInventory",
+            "options": {
+                "host_file": os.path.join(test_inventory, "hosts.yml"),
+                "group_file": os.path.join(test_inventory, "groups.yml"),
+            },
+        },
+        logging={"enabled": False},
+    )
+
+
+# Linear scan of every host (what the index replaces) for hosts whose attribute contains any of the values
+def scan(nr_inv, attr, values):
+    hosts = set()
+    for name, host in nr_inv.inventory.hosts.items():
+        if attr == "name":
+            host_values = [name, host.hostname]
+        elif attr == "groups":
+            host_values = [x.name for x in host.groups]
+        else:
+            host_values = [host.get(attr)]
+        if any(x.lower() in str(y).lower() for x in values for y in host_values if y):
+            hosts.add(name)
+    return hosts
+
+
+# ----------------------------------------------------------------------------
+# 1. INDEX: Tests the indexes find the same hosts as scanning every host
+# ----------------------------------------------------------------------------
+class TestInventoryIndex:
+    # 1a. Tests each filter flag on its own
+    @pytest.mark.parametrize(
+        "flag, attr, values",
+        [
+            ("hostname", "name", ["WAN01", "dc-"]),
+            ("hostname", "name", ["10.10.10"]),
+            ("hostname", "name", ["SW"]),
+            ("group", "groups", ["nxos"]),
+            ("location", "Infra_Location", ["DC"]),
+            ("logical", "Infra_Logical_Location", ["core", "WAN"]),
+            ("type", "type", ["firewall"]),
+            ("version", "IOSVersion", ["16.9"]),
+        ],
+    )
+    def test_filter(self, nr_inv, flag, attr, values):
+        err_msg = f"❌ InventoryIndex: Indexed {flag} filter failed"
+        index = InventoryIndex(nr_inv)
+        assert index.candidates({flag: values}) == scan(nr_inv, attr, values), err_msg
+
+    # 1b. Tests flags are combined (AND), group aliases and no flags is the whole inventory
+    def test_combined(self, nr_inv):
+        err_msg = "❌ InventoryIndex: {} failed"
+        index = InventoryIndex(nr_inv)
+        assert index.candidates(
+            dict(group="iosxe", location=["DC"], hostname=None)
+        ) == scan(nr_inv, "groups", ["iosxe"]) & scan(
+            nr_inv, "Infra_Location", ["DC"]
+        ), err_msg.format(
+            "Combining flags"
+        )
+        assert index.candidates(dict(group="asa")) == scan(
+            nr_inv, "groups", ["asa", "ftd"]
+        ), err_msg.format("Group alias")
+        assert index.narrow(dict(show=True)) is nr_inv, err_msg.format("No filters")
+
+    # 1c. Tests the narrowed inventory keeps the inventory order and shares the groups and defaults
+    def test_narrow(self, nr_inv):
+        err_msg = "❌ InventoryIndex: Narrowing the inventory {} failed"
+        narrowed = InventoryIndex(nr_inv).narrow(dict(location="HME"))
+        hosts = scan(nr_inv, "Infra_Location", ["HME"])
+        assert list(narrowed.inventory.hosts) == [
+            x for x in nr_inv.inventory.hosts if x in hosts
+        ], err_msg.format("order")
+        assert narrowed.inventory.groups is nr_inv.inventory.groups, err_msg.format(
+            "groups"
+        )
+        assert narrowed.runner is nr_inv.runner, err_msg.format("runner")
@@ -0,0 +1,108 @@
+import pytest
+import time
+import asyncio
+from types import SimpleNamespace
+
+from nornir.core.inventory import Host
+from nornir_tasks import NornirTask
+from acl_model import AclModel
+from .device_emulator import DeviceEmulator
+from .benchmark_emulator import acl_input, base_config, emulator_inventory
+
+asyncssh = pytest.importorskip("asyncssh")
+from nornir_async import AsyncCli, AsyncioRunner, AsyncTaskEngine
+
+
+# ----------------------------------------------------------------------------
+# FIXTURES: Emulated IOS, NXOS and ASA devices and a Nornir inventory of them
+# ----------------------------------------------------------------------------
+@pytest.fixture
+def emulator():
+    emulator = DeviceEmulator(dict(ios=2, nxos=2, asa=2)).start()
+    base_config(emulator)
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def nr_inv(emulator, tmp_path):
+    runner = dict(plugin="threaded", options=dict(num_workers=10))
+    nr_inv = emulator_inventory(emulator, str(tmp_path), runner)
+    yield nr_inv
+    nr_inv.close_connections()
+
+
+# ----------------------------------------------------------------------------
+# 1. ASYNCIO: Tests the task_engine run by the asyncio runner against the emulated devices
+# ----------------------------------------------------------------------------
+class TestAsyncioRunner:
+    # 1a. Tests ACLs are applied with each push strategy, verified and the devices are then in-sync
+    @pytest.mark.parametrize("push_strategy", ["line", "bulk", "file"])
+    def test_apply(self, emulator, nr_inv, push_strategy):
+        err_msg = f"❌ AsyncioRunner: Applying ACLs with the {push_strategy} push strategy failed"
+        for grp in ["ios", "nxos", "asa"]:
+            nr_inv.inventory.groups[grp].data["push_strategy"] = push_strategy
+        nr_task = NornirTask(batch_backup=True, delta_apply=True, verify="local")
+        nr_inv = nr_inv.with_runner(
+            AsyncioRunner(nr_task, max_sessions=4, max_connects=2)
+        )
+        nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(5, 1)))
+        nr_task.config_engine(nr_inv, False)
+        assert len(nr_task.summary["changed"]) == 6, err_msg
+        nr_task.config_engine(nr_inv, True)
+        assert len(nr_task.summary["in_sync"]) == 6, err_msg
+        ios = emulator.devices["EMU-IOS-0001"]
+        assert len(ios.acls["SSH_ACCESS"]) == 8, err_msg
+        merges = [x.merges for x in emulator.devices.values()]
+        assert merges == [int(push_strategy == "file")] * 6, err_msg
+
+    # 1b. Tests a change that locks out SSH access is rolled back (checkpoint or backup config)
+    @pytest.mark.parametrize("checkpoint", [True, False])
+    def test_lockout_rollback(self, emulator, nr_inv, checkpoint):
+        err_msg = "❌ AsyncioRunner: Rolling back an ACL that breaks SSH failed"
+        nr_task = NornirTask(
+            batch_backup=True,
+            delta_apply=True,
+            checkpoint=checkpoint,
+            ssh_probe=dict(timeout=5, retries=1, jitter=0.1),
+        )
+        nr_inv = nr_inv.with_runner(AsyncioRunner(nr_task))
+        lockout = dict(acl=[dict(name="SSH_ACCESS", ace=[{"permit": "10.1.1.0/24"}])])
+        nr_task.generate_acl_engine(nr_inv, AclModel(lockout))
+        nr_task.config_engine(nr_inv, False)
+        assert len(nr_task.summary["failed"]) == 6, err_msg
+        for device in emulator.devices.values():
+            assert device.permitted("127.0.0.1"), err_msg
+        rollbacks = [x.rollbacks for x in emulator.devices.values()]
+        assert rollbacks == [int(checkpoint)] * 4 + [0] * 2, err_msg
+
+    # 1c. Tests the phases (connect included) are timed and tasks without an async version run in threads
+    def test_metrics_and_fallback(self, emulator, nr_inv, tmp_path):
+        err_msg = "❌ AsyncioRunner: Phase metrics or the threaded fallback failed"
+        metrics = dict(prom_file=str(tmp_path / "acl.prom"))
+        nr_task = NornirTask(batch_backup=True, metrics=metrics)
+        nr_inv = nr_inv.with_runner(AsyncioRunner(nr_task))
+        nr_task.generate_acl_engine(nr_inv, AclModel(acl_input(5, 1)))
+        nr_task.config_engine(nr_inv, True)
+        assert len(nr_task.summary["changed"]) == 6, err_msg
+        prom = (tmp_path / "acl.prom").read_text()
+        assert 'phase="connect"' in prom and 'phase="backup"' in prom, err_msg
+        result = nr_inv.run(task=lambda task: task.host.name)
+        assert result.failed == False, err_msg
+        hosts = set(x[0].result for x in result.values())
+        assert hosts == set(emulator.devices), err_msg
+
+    # 1d. Tests the SSH login test deadline includes waiting for a login slot (all slots taken by other hosts)
+    def test_ssh_probe_deadline(self):
+        err_msg = "❌ AsyncioRunner: SSH login test deadline whilst waiting for a login slot failed"
+        engine = AsyncTaskEngine(NornirTask(dict(timeout=1, retries=5, jitter=0)))
+
+        async def probe():
+            host = Host("EMU-IOS-0001", hostname="127.0.0.1", port=22)
+            cli = AsyncCli(host, connects=asyncio.Semaphore(0))
+            return await engine.ssh_probe(SimpleNamespace(host=host, cli=cli))
+
+        start = time.monotonic()
+        result = asyncio.run(probe()).result
+        assert result["ssh"] == False, err_msg
+        assert time.monotonic() - start < 3, err_msg
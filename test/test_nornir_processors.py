@@ -0,0 +1,254 @@
+import pytest
+import os
+import json
+import logging
+
+from rich.console import Console
+from nornir.core.inventory import Host
+from nornir.core.task import AggregatedResult, MultiResult, Result, Task
+from nornir import InitNornir
+from nornir.core.filter import F
+from nornir_processors import PhaseMetrics, RunJournal, StreamResult
+
+
+# ----------------------------------------------------------------------------
+# VARS: Inventory and host results as returned by task_engine
+# ----------------------------------------------------------------------------
+test_inventory = os.path.join(os.path.dirname(__file__), "test_inventory")
+
+
+def host_result(name: str, diff: str, failed: bool = False) -> MultiResult:
+    host = Host(name)
+    result = MultiResult("task_engine")
+    result.append(Result(host=host, name="task_engine", result=None))
+    result.append(
+        Result(
+            host=host,
+            name="backup_acl",
+            result="Backing up current ACL configurations",
+            severity_level=logging.DEBUG,
+        )
+    )
+    result.append(
+        Result(host=host, name="ACL differences (- remove, + add)", result=diff)
+    )
+    if failed == True:
+        result.append(
+            Result(
+                host=host,
+                name="apply_acl",
+                failed=True,
+                result="❌  ACL update rolled back as it broke SSH access",
+            )
+        )
+    return result
+
+
+# ----------------------------------------------------------------------------
+# 1. STREAM: Tests each hosts outcome is printed and written as soon as the host finishes
+# ----------------------------------------------------------------------------
+class TestStreamResult:
+    # 1a. Tests host outcome, JSONL record and summary
+    def test_stream(self, tmp_path, capsys):
+        err_msg = "❌ StreamResult: Streaming host results {} failed"
+        results_file = os.path.join(tmp_path, "results.jsonl")
+        stream = StreamResult(Console(), "task_engine", results_file)
+        task = Task(
+            lambda task: None,
+            nornir=None,
+            global_dry_run=True,
+            processors=[],
+            name="task_engine",
+        )
+        stream.task_started(task)
+        for name, diff, failed in [
+            ("HOST1", "✅  No differences between configurations", False),
+            ("HOST2", "-   10 permit ip 10.10.10.10/32 any", False),
+            ("HOST3", "+   10 permit ip 10.10.10.10/32 any", True),
+        ]:
+            stream.task_instance_completed(
+                task, Host(name), host_result(name, diff, failed)
+            )
+        stream.task_completed(task, AggregatedResult("task_engine"))
+        assert stream.summary == dict(
+            in_sync=["HOST1"], changed=["HOST2"], failed=["HOST3"]
+        ), err_msg.format("outcome")
+        output = capsys.readouterr().out
+        assert "-   10 permit ip 10.10.10.10/32 any" in output, err_msg.format("print")
+        assert "Backing up" not in output, err_msg.format("DEBUG results")
+        with open(results_file, "r") as file_content:
+            records = [json.loads(x) for x in file_content]
+        assert [(x["host"], x["outcome"]) for x in records] == [
+            ("HOST1", "in_sync"),
+            ("HOST2", "changed"),
+            ("HOST3", "failed"),
+        ], err_msg.format("JSONL")
+        assert records[2]["results"][3]["name"] == "apply_acl", err_msg.format(
+            "JSONL results"
+        )
+        stream.print_summary(dry_run=True)
+        assert (
+            "3 hosts, 1 in-sync, 1 would change, 1 failed" in capsys.readouterr().out
+        ), err_msg.format("summary")
+
+    # 1b. Tests subtasks and other tasks are not streamed
+    def test_other_task(self, capsys):
+        err_msg = "❌ StreamResult: Only streaming the main task failed"
+        stream = StreamResult(Console(), "task_engine")
+        task = Task(
+            lambda task: None,
+            nornir=None,
+            global_dry_run=True,
+            processors=[],
+            name="generate_acl_config",
+        )
+        stream.task_instance_completed(task, Host("HOST1"), host_result("HOST1", ""))
+        assert stream.summary == dict(in_sync=[], changed=[], failed=[]), err_msg
+        assert capsys.readouterr().out == "", err_msg
+
+
+# ----------------------------------------------------------------------------
+# VARS: Tasks named the same as the task_engine phases (netmiko task names are used to count bytes)
+# ----------------------------------------------------------------------------
+def netmiko_send_command(task: Task, command_string: str) -> Result:
+    return Result(host=task.host, result="x" * 100)
+
+
+def backup_acl(task: Task) -> Result:
+    task.run(task=netmiko_send_command, command_string="show run")
+    return Result(host=task.host, result="Backing up current ACL configurations")
+
+
+def netmiko_connect(task: Task) -> Result:
+    return Result(host=task.host, result=dict(latency=0.1))
+
+
+def task_engine(task: Task) -> Result:
+    task.run(task=netmiko_connect)
+    task.run(task=backup_acl)
+    task.run(
+        name="ACL differences (- remove, + add)",
+        task=lambda task: Result(host=task.host, result="diff"),
+    )
+
+
+# ----------------------------------------------------------------------------
+# 2. METRICS: Tests per-phase timings, bytes, percentiles and exports
+# ----------------------------------------------------------------------------
+class TestPhaseMetrics:
+    # 2a. Tests a span per host, phase and connection (timed by the task, the processor never connects) and their bytes
+    def test_spans(self, tmp_path):
+        err_msg = "❌ PhaseMetrics: Recording {} failed"
+        nr = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {
+                    "host_file": os.path.join(test_inventory, "hosts.yml"),
+                    "group_file": os.path.join(test_inventory, "groups.yml"),
+                },
+            },
+            logging={"enabled": False},
+        )
+        nr = nr.filter(F(groups__any=["ios", "iosxe"]))
+        metrics = PhaseMetrics(
+            Console(),
+            "task_engine",
+            os.path.join(tmp_path, "metrics.prom"),
+            os.path.join(tmp_path, "spans.jsonl"),
+        )
+        nr.with_processors([metrics]).run(task=task_engine)
+        num_hosts = len(nr.inventory.hosts)
+        names = sorted(x["name"] for x in metrics.spans)
+        assert names == sorted(
+            ["task_engine", "connect", "backup", "diff"] * num_hosts
+        ), err_msg.format("spans")
+        backup = [x for x in metrics.spans if x["name"] == "backup"][0]
+        assert backup["attributes"]["bytes_sent"] == len("show run"), err_msg.format(
+            "bytes sent"
+        )
+        assert backup["attributes"]["bytes_received"] == 100, err_msg.format(
+            "bytes received"
+        )
+        connect = [x for x in metrics.spans if x["name"] == "connect"][0]
+        host_span = [x for x in metrics.spans if x["name"] == "task_engine"][0]
+        assert connect["parentSpanId"] == host_span["spanId"], err_msg.format("parent")
+        connections = [x.connections for x in nr.inventory.hosts.values()]
+        assert all(len(x) == 0 for x in connections), err_msg.format("no connect")
+
+        stats = metrics.export()
+        group = list(stats.keys())[0][0]
+        assert stats[(group, "backup")]["count"] != 0, err_msg.format("stats")
+        with open(os.path.join(tmp_path, "metrics.prom"), "r") as file_content:
+            prom = file_content.read()
+        assert (
+            f'acl_phase_bytes{{group="{group}",phase="backup",direction="received"}}'
+            in prom
+        ), err_msg.format("prometheus textfile")
+        with open(os.path.join(tmp_path, "spans.jsonl"), "r") as file_content:
+            assert len(file_content.readlines()) == len(metrics.spans), err_msg.format(
+                "spans file"
+            )
+
+    # 2b. Tests nearest rank percentiles
+    def test_percentile(self):
+        err_msg = "❌ PhaseMetrics: Percentile calculation failed"
+        metrics = PhaseMetrics(Console(), "task_engine")
+        values = [float(x) for x in range(1, 101)]
+        assert [metrics._percentile(values, x) for x in [0.5, 0.9, 0.99]] == [
+            50.0,
+            90.0,
+            99.0,
+        ], err_msg
+
+
+# ----------------------------------------------------------------------------
+# VARS: task_engine that fails on one host
+# ----------------------------------------------------------------------------
+def journal_engine(task: Task, dry_run: bool, failed_host: str) -> Result:
+    task.run(task=backup_acl)
+    task.run(
+        name="ACL differences (- remove, + add)",
+        task=lambda task: Result(
+            host=task.host, result="✅  No differences between configurations"
+        ),
+    )
+    if task.host.name == failed_host:
+        raise Exception("SSH session dropped")
+
+
+# ----------------------------------------------------------------------------
+# 3. JOURNAL: Tests each hosts phases and outcome are journaled and which hosts a resumed run skips
+# ----------------------------------------------------------------------------
+class TestRunJournal:
+    def test_journal(self, tmp_path):
+        err_msg = "❌ RunJournal: Journaling {} failed"
+        nr = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {
+                    "host_file": os.path.join(test_inventory, "hosts.yml"),
+                    "group_file": os.path.join(test_inventory, "groups.yml"),
+                },
+            },
+            logging={"enabled": False},
+        )
+        hosts = list(nr.inventory.hosts.keys())
+        journal = RunJournal(os.path.join(tmp_path, "journal.jsonl"), "task_engine")
+        journal.new_run()
+        nr.with_processors([journal]).run(
+            task=journal_engine, name="task_engine", dry_run=False, failed_host=hosts[0]
+        )
+        # A write cut short by the interruption is ignored
+        with open(journal.journal_file, "a") as file_content:
+            file_content.write('{"host": "HOST1", "out')
+        with open(journal.journal_file, "r") as file_content:
+            phases = [json.loads(x).get("phase") for x in file_content.readlines()[:-1]]
+        assert phases.count("backup") == len(hosts), err_msg.format("phases")
+        assert sorted(journal.completed(nr, False)) == sorted(
+            hosts[1:]
+        ), err_msg.format("completed hosts")
+        assert journal.completed(nr, True) == [], err_msg.format("dry_run mode")
+        nr.inventory.hosts[hosts[1]].data["config"] = ["ip access-list SSH_ACCESS"]
+        assert hosts[1] not in journal.completed(nr, False), err_msg.format(
+            "changed ACLs"
+        )
@@ -0,0 +1,102 @@
+import pytest
+import os
+import time
+
+from nornir import InitNornir
+from nornir.core.task import Task, Result
+from netmiko.exceptions import NetmikoTimeoutException
+from nornir_runner import AdaptiveRunner
+
+
+# ----------------------------------------------------------------------------
+# VARS: Directories that store files used for testing
+# ----------------------------------------------------------------------------
+test_inventory = os.path.join(os.path.dirname(__file__), "test_inventory")
+
+
+# ----------------------------------------------------------------------------
+# TASKS: Tasks that mimic fast, timing out and slow devices
+# ----------------------------------------------------------------------------
+def fast_task(task: Task) -> Result:
+    return Result(host=task.host, result="fast")
+
+
+def timeout_task(task: Task) -> Result:
+    raise NetmikoTimeoutException("TCP connection to device failed")
+
+
+def netmiko_connect(task: Task, latency: float) -> Result:
+    return Result(host=task.host, result=dict(latency=latency))
+
+
+def slow_connect_task(task: Task, slow_host: str) -> Result:
+    latency = 2.0 if task.host.name == slow_host else 0.1
+    task.run(task=netmiko_connect, latency=latency)
+    return Result(host=task.host, result="done")
+
+
+def busy_task(task: Task, slow_host: str) -> Result:
+    task.run(task=netmiko_connect, latency=0.1)
+    if task.host.name == slow_host:
+        time.sleep(0.5)
+    return Result(host=task.host, result="done")
+
+
+# ----------------------------------------------------------------------------
+# FIXTURES: Run to setup the test environment
+# ----------------------------------------------------------------------------
+# Fixture to initialise Nornir and load inventory against
+@pytest.fixture(scope="session", autouse=True)
+def setup_nr_inv():
+    global nr_inv
+    nr_inv = InitNornir(
+        inventory={
+            "plugin": "SimpleInventory",
+            "options": {
+                "host_file": os.path.join(test_inventory, "hosts.yml"),
+                "group_file": os.path.join(test_inventory, "groups.yml"),
+            },
+        },
+        logging={"enabled": False},
+    )
+
+
+# ----------------------------------------------------------------------------
+# 1. ADAPTIVE: Tests the AIMD concurrency controller of the adaptive runner
+# ----------------------------------------------------------------------------
+class TestAdaptiveRunner:
+    # 1a. Tests concurrency ramps up (additive) whilst devices respond quickly
+    def test_ramp_up(self):
+        err_msg = "❌ AdaptiveRunner: Ramp up of concurrency with fast devices failed"
+        runner = AdaptiveRunner(min_workers=2, max_workers=10, start_workers=2)
+        result = nr_inv.with_runner(runner).run(task=fast_task)
+        nr_inv.data.reset_failed_hosts()
+        assert len(result) == len(nr_inv.inventory.hosts), err_msg
+        assert runner.stats()["concurrency"] == 10, err_msg
+        assert runner.stats()["congested"] == 0, err_msg
+
+    # 1b. Tests concurrency backs off (multiplicative) on netmiko timeouts, but not below min_workers
+    def test_back_off(self):
+        err_msg = "❌ AdaptiveRunner: Back off of concurrency on timeouts failed"
+        runner = AdaptiveRunner(min_workers=2, max_workers=20, start_workers=16)
+        result = nr_inv.with_runner(runner).run(task=timeout_task)
+        nr_inv.data.reset_failed_hosts()
+        assert result.failed == True, err_msg
+        assert runner.stats()["congested"] == len(nr_inv.inventory.hosts), err_msg
+        assert 2 <= runner.stats()["concurrency"] < 16, err_msg
+
+    # 1c. Tests a connect much slower than the average is congestion, a host that runs longer (more work) is not
+    def test_slow_host(self):
+        err_msg = "❌ AdaptiveRunner: Detection of slow device failed"
+        slow_host = list(nr_inv.inventory.hosts.keys())[-1]
+        runner = AdaptiveRunner(
+            min_workers=1, max_workers=1, start_workers=1, slow_min=0.2
+        )
+        nr_inv.with_runner(runner).run(task=slow_connect_task, slow_host=slow_host)
+        assert runner.stats()["congested"] == 1, err_msg
+        assert runner.stats()["in_flight"] == 0, err_msg
+        runner = AdaptiveRunner(
+            min_workers=1, max_workers=1, start_workers=1, slow_min=0.2
+        )
+        nr_inv.with_runner(runner).run(task=busy_task, slow_host=slow_host)
+        assert runner.stats()["congested"] == 0, err_msg
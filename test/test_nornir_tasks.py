@@ -1,14 +1,16 @@
 import pytest
 import sys
 import os
+import socket
 
-from nornir.core.task import Task, Result
+from nornir.core.task import Task, Result, AggregatedResult, MultiResult
 from nornir_netmiko.tasks import netmiko_send_command, netmiko_send_config
 from dotmap import DotMap
 from nornir_rich.functions import print_result
 from nornir import InitNornir
 from nornir.core.filter import F
 from nornir_tasks import NornirTask
+from acl_model import AclModel
 from .test_inputs import acl_vars
 
 
@@ -201,6 +203,84 @@ class TestNornirTemplate:
             pass
         assert capsys.readouterr().out == desired_result, err_msg
 
+    # 1d. Tests hosts are partitioned into platforms in one pass and the result reused for the same inventory
+    def test_partition_inventory(self):
+        err_msg = (
+            "❌ partition_inventory: Partitioning inventory into platforms {} failed"
+        )
+        platform_nr = nr_task.partition_inventory(nr_inv)
+        for os_type, groups in [("ios/iosxe", ["ios", "iosxe"]), ("nxos", ["nxos"])]:
+            desired_result = nr_inv.filter(F(groups__any=groups)).inventory.hosts
+            assert list(platform_nr[os_type].inventory.hosts) == list(
+                desired_result
+            ), err_msg.format(os_type)
+        assert nr_task.partition_inventory(nr_inv) is platform_nr, err_msg.format(
+            "cache"
+        )
+        tmp_nr_inv = nr_inv.filter(F(groups__any=["wlc"]))
+        assert (
+            nr_task.partition_inventory(tmp_nr_inv) is not platform_nr
+        ), err_msg.format("new inventory")
+
+    # 1e. Tests hosts with site or host overlays get their own config, rendered once per distinct overlay
+    def test_generate_overlay_config(self):
+        err_msg = "❌ generate_overlay_config: Overlay {} failed"
+        tmp_nr_task = NornirTask()
+        tmp_nr_inv = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {
+                    "host_file": os.path.join(test_inventory, "hosts.yml"),
+                    "group_file": os.path.join(test_inventory, "groups.yml"),
+                },
+            },
+            logging={"enabled": False},
+        ).filter(F(groups__any=["ios", "iosxe"]))
+        hosts = tmp_nr_inv.inventory.hosts
+        dc_hosts = [x for x, y in hosts.items() if y.get("Infra_Location") == "DC"]
+        hme_host = [x for x, y in hosts.items() if y.get("Infra_Location") == "HME"][0]
+        overlay_acl = AclModel(
+            {
+                "acl": [{"name": "UTEST_SSH_ACCESS", "ace": [{"deny": "any"}]}],
+                "overlay": {
+                    "site": {
+                        "DC": [
+                            {
+                                "name": "UTEST_SSH_ACCESS",
+                                "ace": [{"permit": "10.1.1.1"}],
+                            }
+                        ]
+                    },
+                    "host": {
+                        hme_host: [
+                            {
+                                "name": "UTEST_SSH_ACCESS",
+                                "ace": [{"permit": "10.2.2.2"}],
+                            }
+                        ]
+                    },
+                },
+            }
+        )
+        tmp_nr_task.generate_acl_engine(tmp_nr_inv, overlay_acl)
+        assert len(tmp_nr_task.render.memo) == 3, err_msg.format("render per overlay")
+        assert hosts[dc_hosts[0]]["config"] == [
+            "ip access-list extended UTEST_SSH_ACCESS\n permit ip host 10.1.1.1 any\n deny ip any any"
+        ], err_msg.format("site config")
+        assert (
+            hosts[dc_hosts[0]]["config"] is hosts[dc_hosts[-1]]["config"]
+        ), err_msg.format("shared site config")
+        assert hosts[hme_host]["config"] == [
+            "ip access-list extended UTEST_SSH_ACCESS\n permit ip host 10.2.2.2 any\n deny ip any any"
+        ], err_msg.format("host config")
+        other_host = [x for x in hosts if x not in dc_hosts + [hme_host]][0]
+        assert "config" not in hosts[other_host].data, err_msg.format("no overlay")
+        assert hosts[dc_hosts[0]]["acl_val"]["groups"] == {
+            hosts[dc_hosts[0]]
+            .groups[0]
+            .name: overlay_acl.effective("DC", None)["prefix"]
+        }, err_msg.format("validation ACL")
+
 
 # ----------------------------------------------------------------------------
 # 2. FORMAT_DIFF: Tests formatting of config lists and checking the diff between ACL configs
@@ -301,6 +381,165 @@ class TestFormatAcl:
         ]
         actual_result = nr_task.format_config(dm_task, acl_config, acl_config)
         assert actual_result == desired_result, err_msg
+        # ASA delete cmds are from the config being replaced, so differ for the acl and backup config
+        tmp_task = DotMap()
+        tmp_task.host.delete_cmd = None
+        sw_asa, tmpl_asa = (
+            ["ssh 10.1.1.0 255.255.255.0 mgmt"],
+            ["ssh 10.2.2.0 255.255.255.0 mgmt"],
+        )
+        assert nr_task.format_config(tmp_task, sw_asa, tmpl_asa) == [
+            "no " + sw_asa[0],
+            tmpl_asa[0],
+        ], err_msg
+        assert nr_task.format_config(tmp_task, tmpl_asa, sw_asa) == [
+            "no " + tmpl_asa[0],
+            sw_asa[0],
+        ], err_msg
+
+    # 2d. Test delta cmds only remove and insert changed ACEs using sequence numbers
+    def test_delta_cmds(self):
+        err_msg = "❌ delta_cmds: {} delta command creation failed"
+        sw_acl = "ip access-list extended TEST2\n deny   ip 10.100.108.224 0.0.0.31 any\n permit ip any any"
+        tmpl_acl = "ip access-list extended TEST2\n permit ip host 10.1.1.1 any\n permit ip any any"
+        desired_result = [
+            "ip access-list resequence TEST2 10 10",
+            "ip access-list extended TEST2",
+            " no 10",
+            " 10 permit ip host 10.1.1.1 any",
+        ]
+        assert (
+            nr_task.delta_cmds("ios/iosxe", sw_acl, tmpl_acl) == desired_result
+        ), err_msg.format("IOS")
+        sw_acl = "ip access-list TEST1\n  10 remark TEST\n  20 permit ip any any"
+        tmpl_acl = "ip access-list TEST1\n  10 remark TEST\n  20 deny ip 10.1.1.1/32 any\n  30 permit ip any any"
+        desired_result = [
+            "resequence ip access-list TEST1 10 10",
+            "ip access-list TEST1",
+            " 15 deny ip 10.1.1.1/32 any",
+        ]
+        assert (
+            nr_task.delta_cmds("nxos", sw_acl, tmpl_acl) == desired_result
+        ), err_msg.format("NXOS")
+        assert nr_task.delta_cmds("nxos", sw_acl, sw_acl) == [], err_msg.format(
+            "No change"
+        )
+
+    # 2e. Test falls back (None) to full ACL if ACL is new, IOS remarks change or no free sequence numbers
+    def test_delta_cmds_fallback(self):
+        err_msg = "❌ delta_cmds: Fallback to full ACL for {} failed"
+        tmpl_acl = "ip access-list extended TEST1\n remark TEST\n permit ip any any"
+        assert nr_task.delta_cmds("ios/iosxe", "", tmpl_acl) == None, err_msg.format(
+            "new ACL"
+        )
+        sw_acl = "ip access-list extended TEST1\n remark OLD\n permit ip any any"
+        assert (
+            nr_task.delta_cmds("ios/iosxe", sw_acl, tmpl_acl) == None
+        ), err_msg.format("IOS remark")
+        sw_acl = (
+            "ip access-list TEST1\n  10 permit ip 10.1.1.1/32 any\n  20 deny ip any any"
+        )
+        tmpl_acl = "ip access-list TEST1\n" + "\n".join(
+            [f"  permit ip 10.1.1.{x}/32 any" for x in range(1, 12)]
+            + ["  deny ip any any"]
+        )
+        assert nr_task.delta_cmds("nxos", sw_acl, tmpl_acl) == None, err_msg.format(
+            "no free sequence numbers"
+        )
+
+    # 2f. Test formatting delta config, ACLs that cant use delta are deleted and re-added
+    def test_format_delta_config(self):
+        err_msg = (
+            "❌ format_delta_config: Formatting of delta config ready to apply failed"
+        )
+        tmp_task = DotMap()
+        tmp_task.host.os_type = "ios/iosxe"
+        tmp_task.host.delete_cmd = [
+            "no ip access-list extended TEST1",
+            "no ip access-list extended TEST2",
+        ]
+        sw_config = ["", acl_config[1].replace("deny", "permit", 1)]
+        desired_result = [
+            "no ip access-list extended TEST1",
+            "ip access-list extended TEST1",
+            " remark TEST",
+            " permit ip host 172.25.24.168 any",
+            "ip access-list resequence TEST2 10 10",
+            "ip access-list extended TEST2",
+            " no 10",
+            " 10 deny ip 10.100.108.224 0.0.0.31 any",
+        ]
+        actual_result = nr_task.format_delta_config(tmp_task, sw_config, acl_config)
+        assert actual_result == desired_result, err_msg
+
+    # 2g. Test ACE normalisation removes sequence numbers and extra whitespace
+    def test_normalise_ace(self):
+        err_msg = "❌ normalise_ace: Normalising ACE failed"
+        assert (
+            nr_task.normalise_ace("  10 deny   ip any any ") == "deny ip any any"
+        ), err_msg
+        assert nr_task.normalise_ace(" remark MGMT 10") == "remark MGMT 10", err_msg
+
+    # 2h. Test diff ignores sequence number and whitespace differences, moved ACEs are removed and re-added
+    def test_diff_acl(self):
+        err_msg = "❌ diff_acl: Finding {} differences between ACLs failed"
+        sw_acl = [
+            "ip access-list TEST1\n  10 deny   ip 10.10.10.10/32 any\n  20 permit ip any any"
+        ]
+        tmpl_acl = [
+            "ip access-list TEST1\n  10 deny ip 10.10.10.10/32 any\n  20 permit ip any any"
+        ]
+        assert nr_task.diff_acl(sw_acl, tmpl_acl) == [], err_msg.format("no")
+        tmpl_acl = [
+            "ip access-list TEST1\n  10 permit ip any any\n  20 deny ip 10.10.10.10/32 any"
+        ]
+        desired_result = [
+            "ip access-list TEST1\n-   10 deny ip 10.10.10.10/32 any\n+   20 deny ip 10.10.10.10/32 any\n"
+        ]
+        assert nr_task.diff_acl(sw_acl, tmpl_acl) == desired_result, err_msg.format(
+            "moved ACE"
+        )
+
+    # 2i. Test aligning large ACLs keeps the ACEs in order and only matches identical ACEs
+    def test_align_aces(self):
+        err_msg = "❌ align_aces: Aligning ACEs failed"
+        sw_aces = [f"permit ip host 10.1.{x // 256}.{x % 256} any" for x in range(5000)]
+        tmpl_aces = (
+            sw_aces[:100] + ["deny ip any any"] + sw_aces[101:4000] + ["remark X"]
+        )
+        matched = nr_task.align_aces(sw_aces, tmpl_aces)
+        assert len(matched) == 3999, err_msg
+        assert all(sw_aces[x] == tmpl_aces[y] for x, y in matched), err_msg
+        assert matched == sorted(matched, key=lambda x: x[1]), err_msg
+
+    # 2j. Test creating of batched show commands (one per device rather than per ACL)
+    def test_show_del_cmd_batch(self):
+        err_msg = "❌ show_del_cmd: {} batched show command formatting failed"
+        batch_task = NornirTask(batch_backup=True)
+        assert batch_task.show_del_cmd("ios/iosxe", acl["name"])["show"] == [
+            "show run | sec ip access-list extended"
+        ], err_msg.format("IOS/IOS-XE")
+        assert batch_task.show_del_cmd("nxos", acl["name"])["show"] == [
+            "show run | sec 'ip access-list'"
+        ], err_msg.format("NXOS")
+        assert batch_task.show_del_cmd("asa", acl["name"])["show"] == [
+            "show run ssh",
+            "show run http",
+        ], err_msg.format("ASA")
+
+    # 2k. Test splitting batched backup output into a list of ACLs
+    def test_split_acl(self):
+        err_msg = "❌ split_acl: Splitting batched backup into per-ACL list failed"
+        backup_output = (
+            "ip access-list extended OTHER_ACL\n permit ip any any\n"
+            "ip access-list extended UTEST_SNMP_ACCESS\n deny ip host 10.10.209.11 any\n"
+            " permit ip any any\n"
+        )
+        desired_result = [
+            "",
+            "ip access-list extended UTEST_SNMP_ACCESS\n deny ip host 10.10.209.11 any\n permit ip any any",
+        ]
+        assert nr_task.split_acl(backup_output, acl["name"]) == desired_result, err_msg
 
 
 # ----------------------------------------------------------------------------
@@ -441,3 +680,105 @@ class TestNornirCfg:
         result = nr_host.run(task=nr_task.task_engine, dry_run=False)
         nr_host.data.reset_failed_hosts()
         assert result["TEST_DEVICE"][2].result == desired_result2, err_msg
+
+
+# ----------------------------------------------------------------------------
+# 4. SSH_PROBE: Tests the post-change SSH login test against local sockets
+# ----------------------------------------------------------------------------
+class TestSshProbe:
+    # 4a. Test SSH probe fails (after all retries) when nothing is listening on the port
+    def test_ssh_probe_refused(self):
+        err_msg = "❌ ssh_probe: SSH login test against a closed port failed"
+        tmp_sock = socket.socket()
+        tmp_sock.bind(("127.0.0.1", 0))
+        tmp_task = DotMap()
+        tmp_task.host.hostname, tmp_task.host.port = tmp_sock.getsockname()
+        tmp_sock.close()
+        probe_task = NornirTask(dict(timeout=5, retries=2, jitter=0))
+        result = probe_task.ssh_probe(tmp_task).result
+        assert result["ssh"] == False, err_msg
+        assert result["attempts"] == 3, err_msg
+
+    # 4b. Test SSH probe gives up at the deadline when the device accepts TCP but never sends an SSH banner
+    def test_ssh_probe_deadline(self):
+        err_msg = "❌ ssh_probe: SSH login test deadline against a silent device failed"
+        tmp_sock = socket.socket()
+        tmp_sock.bind(("127.0.0.1", 0))
+        tmp_sock.listen(5)
+        tmp_task = DotMap()
+        tmp_task.host.hostname, tmp_task.host.port = tmp_sock.getsockname()
+        probe_task = NornirTask(dict(timeout=1, retries=5, jitter=0))
+        result = probe_task.ssh_probe(tmp_task).result
+        tmp_sock.close()
+        assert result["ssh"] == False, err_msg
+        assert result["latency"] < 3, err_msg
+
+
+# ----------------------------------------------------------------------------
+# 5. ROLLOUT: Tests splitting hosts into waves and counting the failed changes of a wave
+# ----------------------------------------------------------------------------
+class TestRollout:
+    # 5a. Test splitting hosts into canary and growing waves with remaining hosts as the last wave
+    def test_get_waves(self):
+        err_msg = "❌ get_waves: Splitting hosts into rollout waves failed"
+        hosts = [f"host{x}" for x in range(15)]
+        desired_result = [["host0"], hosts[1:11], hosts[11:]]
+        assert nr_task.get_waves(hosts, [1, 10, 100]) == desired_result, err_msg
+        assert nr_task.get_waves(hosts[:3], [1, 10, 100]) == [
+            ["host0"],
+            ["host1", "host2"],
+        ], err_msg
+        assert nr_task.get_waves(hosts[:3], []) == [hosts[:3]], err_msg
+
+    # 5b. Test only rolled back or failed validation hosts are counted as failed changes
+    def test_failed_change_hosts(self):
+        err_msg = "❌ failed_change_hosts: Finding rolled back or failed validation hosts failed"
+        result = AggregatedResult("task_engine")
+        for host, failed_task in [
+            ("rollback", "apply_acl"),
+            ("invalid", "validate_task"),
+            ("unreachable", "backup_acl"),
+            ("good", None),
+        ]:
+            result[host] = MultiResult("task_engine")
+            for each_task in [
+                "task_engine",
+                "backup_acl",
+                "apply_acl",
+                "validate_task",
+            ]:
+                result[host].append(
+                    Result(host=None, name=each_task, failed=each_task == failed_task)
+                )
+        assert nr_task.failed_change_hosts(result) == ["rollback", "invalid"], err_msg
+
+
+# ----------------------------------------------------------------------------
+# 6. VERIFY: Tests the local compliance report of the applied ACLs
+# ----------------------------------------------------------------------------
+class TestVerify:
+    # 6a. Test the local compliance report ignores sequence numbers and whitespace and finds missing and extra ACEs
+    def test_compliance_report(self):
+        err_msg = "❌ compliance_report: Local validation of {} failed"
+        sw_acl = [
+            "ip access-list TEST1\n  10 deny   ip 10.10.10.10/32 any\n  20 permit ip any any",
+            "ssh 10.10.10.0 255.255.255.0 mgmt\nssh 10.20.10.0 255.255.255.0 mgmt\n",
+        ]
+        tmpl_acl = [
+            "ip access-list TEST1\n  10 deny ip 10.10.10.10/32 any\n  20 permit ip any any",
+            "ssh 10.10.10.0 255.255.255.0 mgmt\nssh 10.20.10.0 255.255.255.0 mgmt",
+        ]
+        report = nr_task.compliance_report(sw_acl, tmpl_acl)
+        assert report["complies"] == True, err_msg.format("compliant ACLs")
+        assert list(report["acl"]) == ["TEST1", "ssh"], err_msg.format("ACL names")
+        tmpl_acl[
+            0
+        ] = "ip access-list TEST1\n  10 deny ip 10.10.10.11/32 any\n  20 permit ip any any"
+        report = nr_task.compliance_report(sw_acl, tmpl_acl)
+        assert report["complies"] == False, err_msg.format("non-compliant ACLs")
+        assert report["acl"]["TEST1"] == dict(
+            complies=False,
+            missing=["deny ip 10.10.10.11/32 any"],
+            extra=["deny ip 10.10.10.10/32 any"],
+        ), err_msg.format("missing and extra ACEs")
+        assert report["acl"]["ssh"]["complies"] == True, err_msg.format("ASA cmds")
@@ -166,7 +166,26 @@ class TestValidateFile:
             pass
         assert capsys.readouterr().out == desired_result, err_msg
 
-    # 1g. Validates well formated ACL with no errors is returned back
+    # 1g. Validates overlay ACLs must be ACLs in the top level 'acl' list
+    def test_assert_overlay(self, capsys):
+        err_msg = "❌ _assert_overlay: Unit test for overlay ACL names failed"
+        desired_result = "❌ OverlayError: Site 'DC' overlay ACL 'NOT_AN_ACL' is not in the ACLs to be \nconfigured\n"
+        try:
+            validate._assert_overlay(
+                {
+                    "acl": [{"name": "SSH_ACCESS", "ace": [{"permit": "any"}]}],
+                    "overlay": {
+                        "site": {
+                            "DC": [{"name": "NOT_AN_ACL", "ace": [{"permit": "any"}]}]
+                        }
+                    },
+                }
+            )
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out == desired_result, err_msg
+
+    # 1h. Validates well formated ACL with no errors is returned back
     def test_valid_acl(self):
         desired_result = {
             "acl": [
@@ -193,7 +212,7 @@ class TestValidateFile:
         assert output == desired_result, err_msg
 
     # ----------------------------------------------------------------------------
-    # 1h. Validates well formated ACL with no errors is returned back
+    # 1i. Validates well formated ACL with no errors is returned back
     # ----------------------------------------------------------------------------
     @pytest.mark.usefixtures("load_acl_vars")
     def test_format_input_vars(self):
@@ -0,0 +1,59 @@
+import pytest
+import os
+import sys
+import subprocess
+
+import validate_acl
+
+
+# ----------------------------------------------------------------------------
+# VARS: Input files used for testing
+# ----------------------------------------------------------------------------
+test_input_dir = os.path.join(os.path.dirname(__file__), "test_inputs")
+repo_dir = os.path.dirname(os.path.dirname(__file__))
+
+
+# ----------------------------------------------------------------------------
+# 1. VALIDATE: Tests the input file is validated and rendered without loading nornir
+# ----------------------------------------------------------------------------
+class TestValidateAcl:
+    # 1a. Tests the configs of the selected platforms are rendered
+    def test_render(self, capsys):
+        err_msg = "❌ validate_acl: Rendering the input file {} failed"
+        configs = validate_acl.main(
+            [
+                "-f",
+                os.path.join(test_input_dir, "test_acl_input_data.yml"),
+                "-r",
+                "nxos",
+                "asa",
+            ]
+        )
+        assert list(configs.keys()) == ["nxos", "asa"], err_msg.format("platforms")
+        assert "  20 permit ip 172.17.10.0/24 any" in configs["nxos"], err_msg.format(
+            "config"
+        )
+        assert "is valid (2 ACLs)" in capsys.readouterr().out, err_msg.format("output")
+
+    # 1b. Tests an invalid file exits
+    def test_invalid(self):
+        with pytest.raises(SystemExit):
+            validate_acl.main(["-f", os.path.join(test_input_dir, "acl_is_list.yml")])
+
+    # 1c. Tests nornir, netmiko and Orion are not imported (run in a new interpreter as pytest has already loaded them)
+    def test_no_nornir(self):
+        err_msg = "❌ validate_acl: Validating the input file imported {}"
+        script = (
+            "import sys, validate_acl; "
+            f"validate_acl.main(['-f', {os.path.join(test_input_dir, 'test_acl_input_data.yml')!r}, '-r', 'nxos']); "
+            "print([x for x in sys.modules if x.split('.')[0] in "
+            "['nornir', 'netmiko', 'paramiko', 'nornir_orion', 'nornir_tasks']])"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=repo_dir,
+            capture_output=True,
+            text=True,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        )
+        assert output.stdout.splitlines()[-1] == "[]", err_msg.format(output.stdout)
@@ -8,8 +8,9 @@ from collections import defaultdict
 from rich.console import Console
 from rich.theme import Theme
 
-from nornir_orion import orion_inv
-from nornir_tasks import NornirTask
+from acl_model import AclModel
+
+# Nornir, netmiko and Orion are only imported by the functions that use them (validating the input file doesnt need them)
 
 
 # ----------------------------------------------------------------------------
@@ -19,6 +20,62 @@ from nornir_tasks import NornirTask
 no_orion = True
 # Location where the ACL variable file is stored, by default current directory
 directory = os.path.dirname(__file__)
+# SSH_PROBE: Post-change SSH login test deadline (secs), number of retries and max random jitter (secs) between retries
+ssh_probe = dict(timeout=10, retries=2, jitter=1)
+# BATCH_BACKUP: Backup all ACLs with one show cmd per device (split locally) rather than one show cmd per ACL
+batch_backup = False
+# ROLLOUT: Canary and wave sizes that changes are applied in (remaining hosts are the last wave), a wave with a failure
+# rate (0-1) of rollbacks or validation failures above halt_rate stops the rollout. By default waves is [] so all hosts
+# are changed at once, to stage the rollout set waves to the sizes such as [1, 10, 100]
+rollout = dict(waves=[], halt_rate=0.2)
+# RUNNER: 'threaded' uses num_workers from config.yml, 'adaptive' changes the number of in-flight devices (between min and
+# max workers) backing off on timeouts, auth failures or slow connects and ramping up whilst devices log in quickly.
+# 'asyncio' runs all devices in one event loop over asyncssh (up to max_sessions at once with max_connects of them
+# logging in), set by async_options
+runner = dict(
+    plugin="threaded",
+    options=dict(min_workers=5, max_workers=100, start_workers=10),
+    async_options=dict(
+        max_sessions=1000, max_connects=100, connect_timeout=30, read_timeout=60
+    ),
+)
+# CHANGE_CACHE: File to cache in-sync hosts, if the device change marker and rendered ACLs are unchanged the backup and
+# diff are skipped. Opt-in as the IOS/NXOS marker is a show run scan (an extra cmd per host that only saves time on hosts
+# with many or large ACLs), such as os.path.join(directory, ".acl_cache.json"). None always checks every host
+change_cache = None
+# DELTA_APPLY: IOS/IOS-XE and NXOS ACLs are resequenced and only changed ACEs removed or inserted (by sequence number),
+# if not possible (such as changed IOS remarks) the ACL is deleted and re-added. ASA always uses the full config
+delta_apply = False
+# RENDER_CACHE: Directory for the compiled template bytecode and rendered configs (keyed by template, ACL_VARs and
+# platform) so unchanged ACLs are not re-rendered. Set to None to render every run
+render_cache = os.path.join(directory, ".render_cache")
+# RESULTS_FILE: Each hosts results are appended as a JSON line as soon as the host finishes (outcome is shown on screen
+# as it happens with a summary at the end). Set to None to only print the results
+results_file = os.path.join(directory, "acl_results.jsonl")
+# METRICS: Per-host and per-phase (connect, backup, diff, apply, etc) timings and bytes, percentiles per platform are
+# written to a Prometheus textfile (prom_file) and each timing as an OpenTelemetry style span (spans_file). None disables
+metrics = dict(
+    prom_file=os.path.join(directory, "acl_metrics.prom"),
+    spans_file=os.path.join(directory, "acl_spans.jsonl"),
+)
+
+# JOURNAL_FILE: Each hosts completed phases and outcome are appended as it runs, the -r (resume) flag only runs against
+# hosts that did not complete (or failed) in the last run. Set to None to disable
+journal_file = os.path.join(directory, "acl_journal.jsonl")
+# VERIFY: Post-change validation, 'nornir_validate' runs nornir-validate or 'local' (opt-in) checks the applied ACLs
+# from one show cmd over the same session (same normalising as the diff)
+verify = "nornir_validate"
+# CHECKPOINT: Saves the running config on-box before a change (IOS/IOS-XE flash:mgmt_acl_rollback.cfg, NXOS checkpoint
+# mgmt_acl_rollback) so a rollback is a single configure replace or rollback cmd. ASAs are always rolled back line by line.
+# Opt-in, either for all devices or per group with checkpoint: True in the group data (inventory/groups.yml)
+checkpoint = False
+# PUSH_STRATEGY: How configs are pushed to groups that dont set push_strategy in their group data (inventory/groups.yml),
+# 'line' (each line echo verified), 'bulk' (pasted and checked for rejected lines at the end) or 'file' (SCP and copy)
+push_strategy = "line"
+# INV_CACHE: Orion inventory (no credentials) is cached in cache_dir, each run checks the NPM nodes and only reloads the
+# ones that changed (checksum of their inventory columns). If NPM takes more than npm_timeout secs the cache is used.
+# A ttl (secs) skips the NPM check whilst the cache is younger than it, so added or removed nodes are not seen until then
+inv_cache = dict(cache_dir=os.path.join(directory, ".inv_cache"), ttl=0, npm_timeout=10)
 
 
 # ----------------------------------------------------------------------------
@@ -96,6 +153,41 @@ class InputValidate:
             )
             return acl_errors
 
+    # OVERLAY: Site and host overlays are lists of ACLs (same format as 'acl') that must also be in 'acl'
+    def _assert_overlay(self, acl_vars: Dict[str, Any]) -> Dict[str, Any]:
+        overlay_errors: Dict[str, Any] = {}
+        overlay = acl_vars.get("overlay")
+        if overlay == None:
+            return overlay_errors
+        acl_names = [x.get("name") for x in acl_vars["acl"] if isinstance(x, dict)]
+        if not isinstance(overlay, dict) or not set(overlay).issubset(["site", "host"]):
+            self.rc.print(
+                ":x: [b]OverlayError:[/b] [i]'overlay'[/i] must be a dictionary of [i]'site'[/i] and/or [i]'host'[/i]"
+            )
+            sys.exit(1)
+        for each_type, each_overlay in overlay.items():
+            if not isinstance(each_overlay, dict):
+                self.rc.print(
+                    f":x: [b]OverlayError:[/b] Overlay [i]'{each_type}'[/i] must be a dictionary of {each_type} names"
+                )
+                sys.exit(1)
+            for name, overlay_acls in each_overlay.items():
+                if not isinstance(overlay_acls, list):
+                    self.rc.print(
+                        f":x: [b]OverlayError:[/b] {each_type.capitalize()} [i]'{name}'[/i] overlay is not a list of ACLs"
+                    )
+                    sys.exit(1)
+                for each_acl in overlay_acls:
+                    for acl_name, err in self._assert_acl(each_acl).items():
+                        overlay_errors[f"{name} {acl_name}"] = err
+                        if acl_name not in acl_names:
+                            self.rc.print(
+                                f":x: [b]OverlayError:[/b] {each_type.capitalize()} [i]'{name}'[/i] overlay ACL "
+                                f"[i]'{acl_name}'[/i] is not in the ACLs to be configured"
+                            )
+                            sys.exit(1)
+        return overlay_errors
+
     # ----------------------------------------------------------------------------
     # 1a. Adds additional arguments to the OrionInventory parser arguments
     # ----------------------------------------------------------------------------
@@ -111,6 +203,18 @@ class InputValidate:
             action="store_false",
             help="Apply changes to devices, by default only 'dry run'",
         )
+        args.add_argument(
+            "-o",
+            "--optimise",
+            action="store_true",
+            help="Remove shadowed/redundant ACEs and merge adjacent prefixes before templating",
+        )
+        args.add_argument(
+            "-r",
+            "--resume",
+            action="store_true",
+            help="Only run against hosts not completed (or failed) in the last run's journal",
+        )
         return args
 
     # ----------------------------------------------------------------------------
@@ -127,10 +231,12 @@ class InputValidate:
             assert isinstance(acl_vars["acl"], list)
             for each_acl in acl_vars["acl"]:
                 errors.update(self._assert_acl(each_acl))
+            errors.update(self._assert_overlay(acl_vars))
         except Exception:
             self.rc.print(
                 ":x: [b]AclError:[/b] Top level dict [i]'acl'[/i] does not exist or is not a list"
             )
+            sys.exit(1)
         # Print any ACE errors and exit
         for acl_name, err in errors.items():
             if len(err) != 0:
@@ -144,63 +250,31 @@ class InputValidate:
         return acl_vars
 
     # ----------------------------------------------------------------------------
-    # 2. ACL_FMT: Creates show and delete cmds as well as VARs for wildcard ACLs (convert prefix to wildcard)
+    # 2. ACL_FMT: Parses ACEs once, VARs for wildcard, mask and prefix ACLs are only created for platforms used
     # ----------------------------------------------------------------------------
-    def format_input_vars(self, acl_vars: Dict[str, Any]) -> Dict[str, Any]:
-        acl_name: List = []
-        mask_acl_vars: Dict[str, List] = dict(acl=[])
-        wcard_acl_vars: Dict[str, List] = dict(acl=[])
-
-        for each_acl in acl_vars["acl"]:
-            acl_name.append(each_acl["name"])
-            mask_ace = []  # uses subnet rather than prefix
-            wcard_ace = []  # uses wildcards rather than prefix
-            for each_ace in each_acl["ace"]:
-                if list(each_ace.keys())[0] == "remark":
-                    wcard_ace.append(each_ace)
-                    mask_ace.append(each_ace)
-                else:
-                    try:
-                        # 2a. If no mask is defined this line makes it a /32
-                        each_ace[list(each_ace.keys())[0]] = str(
-                            ipaddress.IPv4Interface(list(each_ace.values())[0])
-                        )
-                        # 2b. Prepare IP, MASK and WCARD to then build acl_vars from
-                        ip_mask: str = ipaddress.IPv4Interface(
-                            list(each_ace.values())[0]
-                        ).with_netmask
-                        ip_wcard: str = ipaddress.IPv4Interface(
-                            list(each_ace.values())[0]
-                        ).with_hostmask
-                        ip: str = ip_mask.split("/")[0]
-                        mask: str = ip_mask.split("/")[1]
-                        wcard: str = ip_wcard.split("/")[1]
-                        # 2c. Formats the subnet mask
-                        if mask == "255.255.255.255":
-                            mask_ace.append({list(each_ace.keys())[0]: ip + " " + mask})
-                            wcard_ace.append({list(each_ace.keys())[0]: "host " + ip})
-                        else:
-                            mask_ace.append({list(each_ace.keys())[0]: ip + " " + mask})
-                            wcard_ace.append(
-                                {list(each_ace.keys())[0]: ip + " " + wcard}
-                            )
-                    except:
-                        mask_ace.append(each_ace)
-                        wcard_ace.append(each_ace)
-            mask_acl_vars["acl"].append(dict(name=each_acl["name"], ace=mask_ace))
-            wcard_acl_vars["acl"].append(dict(name=each_acl["name"], ace=wcard_ace))
-        return dict(
-            name=acl_name,
-            wcard=wcard_acl_vars,
-            mask=mask_acl_vars,
-            prefix=acl_vars,
-        )
+    def format_input_vars(self, acl_vars: Dict[str, Any]) -> AclModel:
+        return AclModel(acl_vars)
+
+    # ----------------------------------------------------------------------------
+    # 3. ACL_OPT: Removes ACEs that never match or make no difference and merges adjacent prefixes (keeps remarks)
+    # ----------------------------------------------------------------------------
+    def optimise_acl(self, acl: AclModel) -> AclModel:
+        for acl_name, removed in acl.optimise().items():
+            if len(removed) != 0:
+                self.rc.print(
+                    f":scissors: [b]AclOptimise:[/b] [i]'{acl_name}'[/i] has had the following ACEs removed or merged:"
+                )
+                for each_ace in removed:
+                    self.rc.print(f"-{each_ace}")
+        return acl
 
 
 # ----------------------------------------------------------------------------
 # ENGINE: Runs the methods from the script
 # ----------------------------------------------------------------------------
 def main(inv_settings: str, no_orion: bool = no_orion):
+    from nornir_orion import orion_inv
+
     orion = orion_inv.OrionInventory()
     input_val = InputValidate(directory)
     inv_validate = orion_inv.LoadValInventorySettings()
@@ -213,11 +287,17 @@ def main(inv_settings: str, no_orion: bool = no_orion):
 
     # 3. Initialise the Validate Class to check input file
     if args.get("filename") != None:
-        acl_vars = input_val.validate_file(args)
-        acl = input_val.format_input_vars(acl_vars)
+        acl = load_acl(input_val, args)
 
-    # 3a. Tests username and password against orion
-    if no_orion == False:
+    # 3b. Tests username and password against orion
+    if no_orion == False and inv_cache != None:
+        from inventory_cache import InventoryCache
+
+        # 3b. Cached inventory unless it is out of date, NPM creds are only tested if the inventory is reloaded
+        nr_inv = InventoryCache(**inv_cache).load(
+            orion, inv_settings["npm"], inv_settings["groups"]
+        )
+    elif no_orion == False:
         orion.test_npm_creds(inv_settings["npm"])
         # 3b. Initialise Nornir inventory
         nr_inv = orion.load_inventory(inv_settings["npm"], inv_settings["groups"])
@@ -226,17 +306,66 @@ def main(inv_settings: str, no_orion: bool = no_orion):
         nr_inv = orion.load_static_inventory(
             "inventory/hosts.yml", "inventory/groups.yml"
         )
-    # 4. Filter the inventory based on the runtime flags
+    # 4. Filter the inventory based on the runtime flags (one-off run so not indexed, acl_daemon.py indexes it once)
     nr_inv = orion.filter_inventory(args, nr_inv)
     # 5. add username and password to defaults
     nr_inv = orion.inventory_defaults(nr_inv, inv_settings["device"])
 
+    # 6 & 7. Render the config, add as a group_var and apply the config
+    run_acl(nr_inv, build_nornir_task(), acl, args)
+
+
+# ----------------------------------------------------------------------------
+# JOB: Steps shared by main and the daemon (acl_daemon.py) which keeps the inventory and connections between jobs
+# ----------------------------------------------------------------------------
+# ACL: Validates the input file, parses the ACEs and optionally optimises the ACLs
+def load_acl(input_val: InputValidate, args: Dict[str, Any]) -> AclModel:
+    acl_vars = input_val.validate_file(args)
+    acl = input_val.format_input_vars(acl_vars)
+    # 3a. Optionally optimises the ACLs before they are templated
+    if args.get("optimise") == True:
+        acl = input_val.optimise_acl(acl)
+    return acl
+
+
+# TASK: NornirTask using the user defined variables
+def build_nornir_task() -> "NornirTask":
+    from nornir_tasks import NornirTask
+
+    return NornirTask(
+        ssh_probe,
+        batch_backup,
+        rollout,
+        change_cache,
+        delta_apply,
+        render_cache,
+        results_file,
+        metrics,
+        journal_file,
+        verify,
+        checkpoint,
+        push_strategy,
+    )
+
+
+# RUN: Renders the config (adds as a group_var) and applies it (or dry_run) to the already filtered inventory
+def run_acl(
+    nr_inv: "Nornir", nr_task: "NornirTask", acl: AclModel, args: Dict[str, Any]
+) -> Dict[str, Any]:
+    # 5a. Swaps the threaded runner for one that adapts the number of in-flight devices
+    if runner["plugin"] == "adaptive":
+        from nornir_runner import AdaptiveRunner
+
+        nr_inv = nr_inv.with_runner(AdaptiveRunner(**runner["options"]))
+    # 5b. Or one that runs the task_engine of all devices on asyncio (imported when used as needs asyncssh)
+    elif runner["plugin"] == "asyncio":
+        from nornir_async import AsyncioRunner
+
+        nr_inv = nr_inv.with_runner(AsyncioRunner(nr_task, **runner["async_options"]))
     # 6. Render the config and adds as a group_var
-    nr_task = NornirTask()
     nr_inv = nr_task.generate_acl_engine(nr_inv, acl)
-
     # 7. Apply the config
-    nr_task.config_engine(nr_inv, args.get("apply"))
+    return nr_task.config_engine(nr_inv, args.get("apply"), args.get("resume", False))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+from typing import Any, Dict, List
+import os
+import sys
+import argparse
+
+from update_mgmt_acl import InputValidate, load_acl, directory
+from acl_platforms import PLATFORMS
+
+# Only imports what validating and rendering the input file needs (no nornir, netmiko or Orion) so is quick to start,
+# for CI or pre-commit hooks. Exits 1 if the input file is invalid
+# python validate_acl.py -f acl_input_data.yml -r nxos asa --site HME
+
+
+# ----------------------------------------------------------------------------
+# ARGS: Input file, optimise and the platforms to render (and the site or host overlay to render them for)
+# ----------------------------------------------------------------------------
+def add_arg_parser() -> argparse.ArgumentParser:
+    args = argparse.ArgumentParser(
+        description="Validates (and optionally renders) the ACL input file without connecting to any devices"
+    )
+    args.add_argument(
+        "-f",
+        "--filename",
+        required=True,
+        help="Name of the Yaml file containing ACL variables",
+    )
+    args.add_argument(
+        "-o",
+        "--optimise",
+        action="store_true",
+        help="Remove shadowed/redundant ACEs and merge adjacent prefixes before templating",
+    )
+    args.add_argument(
+        "-r",
+        "--render",
+        nargs="+",
+        choices=list(PLATFORMS.keys()),
+        default=[],
+        help="Print the rendered config of these platforms",
+    )
+    args.add_argument("--site", help="Render with the overlay of this site")
+    args.add_argument("--host", help="Render with the overlay of this host")
+    return args
+
+
+# ----------------------------------------------------------------------------
+# RENDER: Config of each platform for the effective ACL (base plus any site and host overlay)
+# ----------------------------------------------------------------------------
+def render_acl(acl: "AclModel", args: Dict[str, Any]) -> Dict[str, str]:
+    from acl_render import AclRender
+
+    render = AclRender(path=os.path.join(directory, "templates"))
+    effective = acl.effective(args.get("site"), args.get("host"))
+    configs = {}
+    for os_type in args.get("render", []):
+        configs[os_type] = render.render(os_type, effective[PLATFORMS[os_type]["view"]])
+    return configs
+
+
+def main(argv: List[str] = None) -> Dict[str, str]:
+    args = vars(add_arg_parser().parse_args(argv))
+    input_val = InputValidate(directory)
+    acl = load_acl(input_val, args)
+    configs = render_acl(acl, args)
+    for os_type, config in configs.items():
+        input_val.rc.print(
+            f"[dark_blue][b]{os_type.upper()} configuration[/b][/dark_blue]"
+        )
+        input_val.rc.print(config, highlight=False)
+    input_val.rc.print(
+        f":white_check_mark: [i]'{args['filename']}'[/i] is valid ({len(acl['name'])} ACLs)"
+    )
+    return configs
+
+
+if __name__ == "__main__":
+    main()